@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measures the cost of converting records between Python and Avro for a
+wide record schema, reported per record and per field.
+
+    python benchmarks/bench_convert.py [records] [fields]
+"""
+
+import sys
+import time
+
+import quickavro
+
+
+def make_schema(fields):
+    types = ["string", "int", "long", "double", "boolean", ["null", "string"]]
+    return {
+        "type": "record",
+        "name": "Wide",
+        "fields": [
+            {"name": "field_{0}".format(i), "type": types[i % len(types)]}
+            for i in range(fields)
+        ]
+    }
+
+
+def make_record(schema, i):
+    values = {
+        "string": "value-{0}".format(i),
+        "int": i,
+        "long": i * 1000,
+        "double": i * 0.25,
+        "boolean": bool(i % 2),
+    }
+    record = {}
+    for field in schema["fields"]:
+        t = field["type"]
+        record[field["name"]] = values["string"] if isinstance(t, list) else values[t]
+    return record
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    fields = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    schema = make_schema(fields)
+    records = [make_record(schema, i) for i in range(n)]
+    with quickavro.BinaryEncoder(schema) as encoder:
+        start = time.time()
+        count, data = encoder.write_many(records)
+        write_time = time.time() - start
+
+        start = time.time()
+        for record in encoder.iter_read(data):
+            pass
+        read_time = time.time() - start
+
+    for name, elapsed in (("write", write_time), ("read", read_time)):
+        print("{0:6} {1:.3f}s  {2:.2f}us/record  {3:.1f}ns/field".format(
+            name, elapsed, elapsed / n * 1e6, elapsed / (n * fields) * 1e9))
+
+
+if __name__ == '__main__':
+    main()
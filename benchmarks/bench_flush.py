@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compares the write time, file size, number of blocks and read time of
+files written with different flush policies and codecs.
+
+    python benchmarks/bench_flush.py [records]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import quickavro
+
+from quickavro.compression import supported_codecs
+from quickavro.flush import BytesPolicy, CompressedSizePolicy, CountPolicy
+
+
+SCHEMA = {
+    "type": "record",
+    "name": "Person",
+    "fields": [
+        {"name": "name", "type": "string"},
+        {"name": "age", "type": ["int", "null"]},
+        {"name": "score", "type": "double"},
+        {"name": "tags", "type": {"type": "array", "items": "string"}},
+    ]
+}
+
+POLICIES = [
+    ("bytes 16K", lambda: BytesPolicy()),
+    ("bytes 1M", lambda: BytesPolicy(1024 * 1024)),
+    ("count 1000", lambda: CountPolicy(1000)),
+    ("compressed 64K", lambda: CompressedSizePolicy(64 * 1024)),
+]
+
+
+def records(n):
+    for i in range(n):
+        yield {
+            "name": "name-{0}".format(i),
+            "age": i % 100,
+            "score": i * 0.5,
+            "tags": ["a", "b", "c"],
+        }
+
+
+def write_file(path, n, codec, policy):
+    with quickavro.FileWriter(path, codec=codec, flush_policy=policy) as writer:
+        writer.schema = SCHEMA
+        writer.write_records(records(n))
+
+
+def read_file(path):
+    with quickavro.FileReader(path) as reader:
+        for record in reader.records():
+            pass
+
+
+def timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    tmpdir = tempfile.mkdtemp()
+    for codec in supported_codecs():
+        for name, policy in POLICIES:
+            path = os.path.join(tmpdir, "bench-{0}.avro".format(codec))
+            w = timed(lambda: write_file(path, n, codec, policy()))
+            with quickavro.FileReader(path) as reader:
+                stats = reader.stats()
+            r = timed(lambda: read_file(path))
+            print("{0:10} {1:15} write: {2:.3f}s  size: {3:10d}  blocks: {4:6d}  read: {5:.3f}s".format(
+                codec, name, w, stats["file_size"], stats["blocks"], r))
+            os.remove(path)
+    os.rmdir(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compares reading the same Avro file several times serially against
+reading it concurrently from a pool of threads.
+
+    python benchmarks/bench_threads.py [records] [threads]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import quickavro
+
+
+SCHEMA = {
+    "type": "record",
+    "name": "Person",
+    "fields": [
+        {"name": "name", "type": "string"},
+        {"name": "age", "type": ["int", "null"]},
+        {"name": "score", "type": "double"},
+        {"name": "tags", "type": {"type": "array", "items": "string"}},
+    ]
+}
+
+
+def write_file(path, n, codec):
+    with quickavro.FileWriter(path, codec=codec) as writer:
+        writer.schema = SCHEMA
+        for i in range(n):
+            writer.write_record({
+                "name": "name-{0}".format(i),
+                "age": i % 100,
+                "score": i * 0.5,
+                "tags": ["a", "b", "c"],
+            })
+
+
+def read_file(path):
+    with quickavro.FileReader(path) as reader:
+        for record in reader.records():
+            pass
+
+
+def timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+
+def serial(path, count):
+    for _ in range(count):
+        read_file(path)
+
+
+def threaded(path, count):
+    threads = [threading.Thread(target=read_file, args=(path,)) for _ in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    tmpdir = tempfile.mkdtemp()
+    for codec in ("null", "deflate", "snappy"):
+        path = os.path.join(tmpdir, "bench-{0}.avro".format(codec))
+        write_file(path, n, codec)
+        s = timed(lambda: serial(path, count))
+        t = timed(lambda: threaded(path, count))
+        print("{0:8} serial: {1:.3f}s  threads({2}): {3:.3f}s  speedup: {4:.2f}x".format(
+            codec, s, count, t, s / t))
+        os.remove(path)
+    os.rmdir(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
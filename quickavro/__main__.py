@@ -6,11 +6,44 @@ import sys
 from .reader import FileReader
 
 
+USAGE = """usage: quickavro FILE
+       quickavro stats [--exact] FILE...
+"""
+
+STATS_FIELDS = (
+    "codec",
+    "records",
+    "blocks",
+    "header_size",
+    "file_size",
+    "compressed_size",
+    "uncompressed_size",
+)
+
+
+def stats(args):
+    exact = "--exact" in args
+    paths = [arg for arg in args if arg != "--exact"]
+    if not paths:
+        sys.stderr.write(USAGE)
+        sys.exit(2)
+    for path in paths:
+        with FileReader(path) as reader:
+            result = reader.stats(exact=exact)
+        print(path)
+        for field in STATS_FIELDS:
+            value = result[field]
+            print("  {0:<18} {1}".format(field, "unknown" if value is None else value))
+
+
 def main():
     if not len(sys.argv) > 1:
         sys.stderr.write("Missing arguments\n")
         sys.exit(0)
     try:
+        if sys.argv[1] == "stats":
+            stats(sys.argv[2:])
+            return
         with FileReader(sys.argv[1]) as reader:
             for record in reader.records():
                 print(record)
@@ -30,7 +30,11 @@ if PY3:
             return s.decode(default_encoding)
         else:
             return s
+
+    izip = zip
 else:
+    from itertools import izip
+
     range = xrange
 
     ensure_bytes = lambda s: s
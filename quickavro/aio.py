@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+
+"""
+asyncio interface to Avro files. Requires Python 3.6 or later and is not
+imported by the :mod:`quickavro` package itself.
+
+Files are read and written a block at a time. ``f`` can be an
+:class:`asyncio.StreamReader` or :class:`asyncio.StreamWriter`, any object
+whose ``read`` or ``write`` method is a coroutine, a regular file object,
+whose I/O is then run in the default executor, or the path of a file.
+
+Decoding, encoding and compressing blocks is done on the event loop by
+default. With ``offload`` it is run in an executor instead, while the
+next block is read, so that the loop stays responsive.
+
+Example:
+
+.. code-block:: python
+
+    from quickavro.aio import AsyncFileReader, AsyncFileWriter
+
+    async def copy(reader_stream, writer_stream):
+        async with AsyncFileReader(reader_stream, offload=True) as reader:
+            async with AsyncFileWriter(writer_stream, codec="deflate") as writer:
+                writer.schema = reader.schema
+                async for record in reader:
+                    await writer.write_record(record)
+"""
+
+import asyncio
+import functools
+import inspect
+
+from .buffer import ReadBuffer
+from .constants import *
+from .encoder import BinaryEncoder
+from .errors import *
+
+
+def _executor(offload):
+    """
+    Returns the executor CPU work is offloaded to, None meaning the
+    default executor of the loop.
+    """
+    if offload is True:
+        return None
+    return offload
+
+
+async def _run(offload, func, *args):
+    """
+    Calls func on the event loop, or in an executor if offload is set.
+    """
+    if not offload:
+        return func(*args)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(_executor(offload), functools.partial(func, *args))
+
+
+async def _io(method, *args):
+    """
+    Calls a read or write method of a file object, awaiting it if it is a
+    coroutine and running it in the default executor otherwise.
+    """
+    if inspect.iscoroutinefunction(method):
+        return await method(*args)
+    loop = asyncio.get_event_loop()
+    result = await loop.run_in_executor(None, functools.partial(method, *args))
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+class AsyncFileReader(ReadBuffer, BinaryEncoder):
+    """
+    Reads Avro files from an asyncio stream, see :class:`quickavro.FileReader`.
+    Records are read with ``async for``. The header is read by ``async
+    with`` or :meth:`open`, and otherwise before the first record.
+
+    :param f: Stream, file-like object or path of file to read from.
+    :param buffer_size: (optional) Minimum number of bytes requested from
+        f each time the internal buffer is refilled.
+    :param reader_schema: (optional) Schema records are resolved to.
+    :param record_type: (optional) ``"dict"``, ``"tuple"`` or ``"slots"``.
+    :param offload: (optional) Decompress and decode blocks in an executor
+        while the next block is read. True uses the default executor of
+        the loop, an :class:`concurrent.futures.Executor` can also be
+        given.
+    """
+
+    def __init__(self, f, buffer_size=DEFAULT_BUFFER_SIZE, reader_schema=None, record_type=None,
+                 offload=False):
+        super(AsyncFileReader, self).__init__()
+        if isinstance(f, str):
+            self.f = open(f, 'rb')
+        else:
+            self.f = f
+        self.buffer_size = buffer_size
+        self.offload = offload
+        self.reset_buffer()
+        self._done = False
+        self._opened = False
+        self._reader_schema_option = reader_schema
+        self._record_type_option = record_type
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_tb):
+        await self.close()
+
+    def __aiter__(self):
+        return self.records()
+
+    async def open(self):
+        """
+        Reads the header of the file.
+        """
+        if self._opened:
+            return self
+        header = None
+        while header is None:
+            await self.fill(self.buffered() + INITIAL_HEADER_SIZE)
+            header = self.parse_header()
+        self.apply_header(header, self._reader_schema_option, self._record_type_option)
+        self._opened = True
+        return self
+
+    async def close(self):
+        if hasattr(self.f, "close"):
+            await _io(self.f.close)
+
+    async def fill(self, size):
+        """
+        Ensures at least size bytes are available in the internal buffer.
+        Returns the number of bytes available, which is only less than
+        size at end of file.
+        """
+        chunks = []
+        wanted = self.wanted(size, chunks)
+        while wanted:
+            chunks.append(await _io(self.f.read, wanted))
+            wanted = self.wanted(size, chunks)
+        return self.extend(chunks)
+
+    async def read_bytes(self, size):
+        await self.fill(size)
+        return self.take(size)
+
+    async def next_long(self):
+        await self.fill(MAX_VARINT_SIZE)
+        return self.take_long()
+
+    async def next_block(self):
+        """
+        Reads the compressed data of the next block. Returns None at end
+        of file and after a block followed by an invalid sync marker.
+        """
+        if self._done or not await self.fill(1):
+            return None
+        await self.next_long()
+        block_length = await self.next_long()
+        data = await self.read_bytes(block_length)
+        if not data:
+            return None
+        # Like FileReader, reading stops after a block followed by an
+        # invalid sync marker.
+        await self.fill(SYNC_SIZE)
+        self._done = not self.take_sync()
+        self.block_count += 1
+        return data
+
+    def decode_block(self, data):
+        """
+        Decompresses and decodes a block into a list of records.
+
+        :param data: Compressed block data.
+        """
+        return list(self.iter_read(self.decompress(data)))
+
+    async def records(self):
+        """
+        Returns an asynchronous iterator over all records in the file.
+        """
+        await self.open()
+        data = await self.next_block()
+        while data is not None:
+            if self.offload:
+                decoding = asyncio.ensure_future(_run(self.offload, self.decode_block, data))
+                try:
+                    data = await self.next_block()
+                    records = await decoding
+                except BaseException:
+                    decoding.cancel()
+                    raise
+            else:
+                records = self.decode_block(data)
+                data = None
+            for record in records:
+                yield record
+            records = None
+            if data is None:
+                data = await self.next_block()
+
+    async def read_all(self):
+        """
+        Returns a list of all records in the file.
+        """
+        return [record async for record in self.records()]
+
+
+class AsyncFileWriter(BinaryEncoder):
+    """
+    Writes Avro files to an asyncio stream, see :class:`quickavro.FileWriter`.
+    Blocks are written when the flush policy ends them and when the
+    writer is closed, which must be awaited.
+
+    :param f: Stream, file-like object or path of file to write into.
+    :param codec: (optional) Compression codec.
+    :param level: (optional) Compression level of the codec.
+    :param offload: (optional) Encode batches of records and compress
+        blocks in an executor. True uses the default executor of the
+        loop, an :class:`concurrent.futures.Executor` can also be given.
+    :param flush_policy: (optional) Policy deciding when blocks end, see
+        :mod:`quickavro.flush`.
+    """
+
+    def __init__(self, f, codec="null", level=None, offload=False, flush_policy=None):
+        super(AsyncFileWriter, self).__init__(codec=codec, level=level, flush_policy=flush_policy)
+        if isinstance(f, str):
+            self.f = open(f, 'wb')
+        else:
+            self.f = f
+        self.offload = offload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_tb):
+        await self.close()
+
+    async def write_bytes(self, data):
+        if isinstance(self.f, asyncio.StreamWriter):
+            self.f.write(data)
+            await self.f.drain()
+        else:
+            await _io(self.f.write, data)
+
+    async def write_record(self, record):
+        if self.flush_policy.should_flush(self):
+            await self.flush()
+        super(AsyncFileWriter, self).write_record(record)
+
+    async def write_records(self, records):
+        """
+        Writes all records of an iterable, serializing them in batches
+        directly into block payloads.
+
+        :param records: Iterable of records.
+        """
+        records = iter(records)
+        while True:
+            if self.flush_policy.should_flush(self):
+                await self.flush()
+            if not await _run(self.offload, self.fill_block, records):
+                break
+
+    async def flush_if_due(self):
+        """
+        Writes the current block if the flush policy says it should end,
+        see :meth:`quickavro.FileWriter.flush_if_due`.
+        """
+        if not self.block or not self.flush_policy.should_flush(self):
+            return False
+        await self.flush()
+        return True
+
+    async def flush(self):
+        """
+        Writes the current block, preceded by the header if it has not
+        been written yet.
+        """
+        if self.block_count == 0:
+            await self.write_bytes(self.header)
+            self.block_count += 1
+        await self.write_bytes(await _run(self.offload, self.write_block))
+
+    async def close(self):
+        if self.block:
+            await self.flush()
+        if isinstance(self.f, asyncio.StreamWriter):
+            self.f.close()
+            if hasattr(self.f, "wait_closed"):
+                await self.f.wait_closed()
+        elif hasattr(self.f, "close"):
+            await _io(self.f.close)
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+
+"""
+Conversion between Avro files and Apache Arrow tables. Requires pyarrow.
+
+Each Avro block is read as one Arrow record batch. Fields decoded natively
+by :meth:`quickavro.BinaryEncoder.read_columnar` are wrapped as Arrow
+arrays without copying their values: numbers as primitive arrays,
+strings and bytes as large string and binary arrays sharing the offsets
+and data buffers, and enums as dictionary arrays. Nested records map to
+structs, arrays to lists, maps to maps and unions of null and another
+type to nullable columns.
+
+Example:
+
+.. code-block:: python
+
+    from quickavro import arrow
+
+    table = arrow.read_table("test.avro")
+    arrow.write_table(table, "copy.avro", codec="deflate")
+"""
+
+from .constants import *
+from .errors import *
+from .reader import FileReader
+from .schema import fullname, named_types
+from .writer import FileWriter
+
+from ._compat import *
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for quickavro.arrow.")
+
+
+def _resolve(schema, types, namespace):
+    if isinstance(schema, basestring):
+        if schema in types:
+            return types[schema], schema.rpartition(".")[0] or None
+        name = fullname(schema, namespace)
+        if name in types:
+            return types[name], name.rpartition(".")[0] or None
+        return {"type": schema}, namespace
+    if isinstance(schema, dict) and isinstance(schema.get("type"), (dict, list)):
+        return _resolve(schema["type"], types, namespace)
+    return schema, namespace
+
+
+def _nullable(schema):
+    """
+    Returns the non-null branch of a union of null and one other type,
+    or None.
+    """
+    if isinstance(schema, list) and len(schema) == 2 and "null" in schema:
+        return schema[1 - schema.index("null")]
+    return None
+
+
+def arrow_type(schema, types=None, namespace=None):
+    """
+    Returns the Arrow type of values of an Avro schema.
+
+    :param schema: Avro schema.
+    :param types: (optional) Dictionary of named type definitions keyed by
+        full name.
+    :param namespace: (optional) Enclosing namespace.
+    """
+    require_pyarrow()
+    if types is None:
+        types = named_types(schema)
+    if isinstance(schema, list):
+        branch = _nullable(schema)
+        if branch is None:
+            raise InvalidSchemaError("Only unions of null and one other type can be converted to Arrow.")
+        return arrow_type(branch, types, namespace)
+    schema, namespace = _resolve(schema, types, namespace)
+    t = schema["type"]
+    if t in ("record", "error"):
+        namespace = fullname(schema["name"], schema.get("namespace", namespace)).rpartition(".")[0] or None
+        return pa.struct([
+            pa.field(field["name"], arrow_type(field["type"], types, namespace),
+                     nullable=_nullable(field["type"]) is not None or field["type"] == "null")
+            for field in schema["fields"]
+        ])
+    if t == "array":
+        return pa.list_(arrow_type(schema["items"], types, namespace))
+    if t == "map":
+        return pa.map_(pa.large_string(), arrow_type(schema["values"], types, namespace))
+    if t == "fixed":
+        return pa.binary(int(schema["size"]))
+    if t == "enum":
+        return pa.dictionary(pa.int32(), pa.large_string())
+    primitives = {
+        "null": pa.null(),
+        "boolean": pa.bool_(),
+        "int": pa.int32(),
+        "long": pa.int64(),
+        "float": pa.float32(),
+        "double": pa.float64(),
+        "bytes": pa.large_binary(),
+        "string": pa.large_string(),
+    }
+    if t not in primitives:
+        raise InvalidSchemaError("Avro type {0} cannot be converted to Arrow.".format(t))
+    return primitives[t]
+
+
+def arrow_schema(schema):
+    """
+    Returns the Arrow schema of the record batches read from files with an
+    Avro record schema.
+
+    :param schema: Avro record schema.
+    """
+    return pa.schema(list(arrow_type(schema)))
+
+
+def _bitmap(mask):
+    """
+    Packs a byte per value mask into an Arrow validity bitmap.
+    """
+    if numpy is not None:
+        return pa.py_buffer(numpy.packbits(numpy.asarray(mask, dtype=bool), bitorder="little").tobytes())
+    bits = bytearray((len(mask) + 7) // 8)
+    for i, valid in enumerate(mask):
+        if valid:
+            bits[i >> 3] |= 1 << (i & 7)
+    return pa.py_buffer(bytes(bits))
+
+
+def _to_arrow_value(value, t):
+    """
+    Converts a decoded value to the Python form pyarrow expects for t,
+    which only differs for maps.
+    """
+    if value is None:
+        return None
+    if pa.types.is_map(t):
+        return [(k, _to_arrow_value(v, t.item_type)) for k, v in value.items()]
+    if pa.types.is_struct(t):
+        return dict((f.name, _to_arrow_value(value.get(f.name), f.type)) for f in t)
+    if pa.types.is_list(t):
+        return [_to_arrow_value(v, t.value_type) for v in value]
+    return value
+
+
+def column_to_arrow(column, t):
+    """
+    Returns an Arrow array for a :class:`quickavro.columnar.Column`.
+    Native columns share their buffers with the array.
+
+    :param column: Decoded column.
+    :param t: Arrow type of the column.
+    """
+    if column.typecode == "O":
+        return pa.array([_to_arrow_value(v, t) for v in column.values], type=t)
+    length = len(column)
+    validity = None
+    null_count = 0
+    if column.validity is not None:
+        null_count = length - int(sum(column.validity))
+        if null_count:
+            validity = _bitmap(column.validity)
+    if column.typecode in ("s", "y"):
+        return pa.Array.from_buffers(t, length, [validity, pa.py_buffer(column.offsets), pa.py_buffer(column.values)],
+                                     null_count=null_count)
+    if column.typecode == "?":
+        return pa.Array.from_buffers(t, length, [validity, _bitmap(column.values)], null_count=null_count)
+    if column.typecode == "e":
+        indices = pa.Array.from_buffers(pa.int32(), length, [validity, pa.py_buffer(column.values)],
+                                        null_count=null_count)
+        return pa.DictionaryArray.from_arrays(indices, pa.array(column.symbols, type=pa.large_string()))
+    return pa.Array.from_buffers(t, length, [validity, pa.py_buffer(column.values)], null_count=null_count)
+
+
+def _open(path, fields):
+    reader = FileReader(path)
+    if fields is not None:
+        reader.project(fields)
+    return reader, arrow_schema(reader.reader_schema or reader.schema)
+
+
+def _batches(reader, schema):
+    for columns in reader.read_columns():
+        arrays = [column_to_arrow(columns[f.name], f.type) for f in schema]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_batches(path, fields=None):
+    """
+    Returns an iterator over the Avro file at path as one Arrow record
+    batch per block.
+
+    :param path: Path of the Avro file.
+    :param fields: (optional) Names of the fields to read.
+    """
+    require_pyarrow()
+    reader, schema = _open(path, fields)
+    with reader:
+        for batch in _batches(reader, schema):
+            yield batch
+
+
+def read_table(path, fields=None):
+    """
+    Reads the Avro file at path into an Arrow table.
+
+    :param path: Path of the Avro file.
+    :param fields: (optional) Names of the fields to read.
+    """
+    require_pyarrow()
+    reader, schema = _open(path, fields)
+    with reader:
+        return pa.Table.from_batches(list(_batches(reader, schema)), schema=schema)
+
+
+def avro_type(t, name):
+    """
+    Returns the Avro schema of values of an Arrow type.
+
+    :param t: Arrow type.
+    :param name: Name used for the records generated for structs.
+    """
+    require_pyarrow()
+    if pa.types.is_struct(t):
+        return {
+            "type": "record",
+            "name": name,
+            "fields": [avro_field(f, "{0}_{1}".format(name, f.name)) for f in t]
+        }
+    if pa.types.is_map(t):
+        return {"type": "map", "values": avro_type(t.item_type, name + "_value")}
+    if pa.types.is_list(t) or pa.types.is_large_list(t):
+        return {"type": "array", "items": avro_type(t.value_type, name + "_item")}
+    if pa.types.is_dictionary(t):
+        return avro_type(t.value_type, name)
+    if pa.types.is_fixed_size_binary(t):
+        return {"type": "fixed", "name": name, "size": t.byte_width}
+    if pa.types.is_boolean(t):
+        return "boolean"
+    if pa.types.is_integer(t):
+        return "int" if t.bit_width < 32 or t.bit_width == 32 and pa.types.is_signed_integer(t) else "long"
+    if pa.types.is_float16(t) or pa.types.is_float32(t):
+        return "float"
+    if pa.types.is_float64(t):
+        return "double"
+    if pa.types.is_string(t) or pa.types.is_large_string(t):
+        return "string"
+    if pa.types.is_binary(t) or pa.types.is_large_binary(t):
+        return "bytes"
+    if pa.types.is_null(t):
+        return "null"
+    raise InvalidSchemaError("Arrow type {0} cannot be converted to Avro.".format(t))
+
+
+def avro_field(f, name):
+    schema = avro_type(f.type, name)
+    if f.nullable and schema != "null":
+        return {"name": f.name, "type": ["null", schema], "default": None}
+    return {"name": f.name, "type": schema}
+
+
+def avro_schema(schema, name="Record"):
+    """
+    Returns the Avro record schema of the rows of an Arrow schema.
+
+    :param schema: Arrow schema.
+    :param name: (optional) Name of the record.
+    """
+    return {
+        "type": "record",
+        "name": name,
+        "fields": [avro_field(f, "{0}_{1}".format(name, f.name)) for f in schema]
+    }
+
+
+def _from_arrow_value(value, t):
+    """
+    Converts a value from Array.to_pylist to the form quickavro writes,
+    which only differs for maps.
+    """
+    if value is None:
+        return None
+    if pa.types.is_map(t):
+        return dict((k, _from_arrow_value(v, t.item_type)) for k, v in value)
+    if pa.types.is_struct(t):
+        return dict((f.name, _from_arrow_value(value.get(f.name), f.type)) for f in t)
+    if pa.types.is_list(t) or pa.types.is_large_list(t):
+        return [_from_arrow_value(v, t.value_type) for v in value]
+    return value
+
+
+def column_from_arrow(array):
+    """
+    Returns a column for :meth:`quickavro.FileWriter.write_columns` from
+    an Arrow array. Numeric arrays without nulls are passed as numpy
+    views of their buffers.
+
+    :param array: Arrow array.
+    """
+    t = array.type
+    if array.null_count == 0 and numpy is not None and (
+            pa.types.is_integer(t) or pa.types.is_floating(t)) and not pa.types.is_float16(t):
+        return array.to_numpy(zero_copy_only=True)
+    if pa.types.is_dictionary(t):
+        array = array.cast(t.value_type)
+        t = array.type
+    values = array.to_pylist()
+    if pa.types.is_map(t) or pa.types.is_struct(t) or pa.types.is_list(t) or pa.types.is_large_list(t):
+        values = [_from_arrow_value(v, t) for v in values]
+    return values
+
+
+def write_table(table, path, codec="null", schema=None):
+    """
+    Writes an Arrow table or record batch to an Avro file.
+
+    :param table: Arrow table or record batch.
+    :param path: Path of the Avro file.
+    :param codec: (optional) Compression codec.
+    :param schema: (optional) Avro record schema of the rows. Derived
+        from the Arrow schema by default.
+    """
+    require_pyarrow()
+    if isinstance(table, pa.RecordBatch):
+        batches = [table]
+    else:
+        batches = table.to_batches()
+    with FileWriter(path, codec) as writer:
+        writer.schema = schema or avro_schema(table.schema)
+        for batch in batches:
+            writer.write_columns(dict(
+                (name, column_from_arrow(batch.column(i)))
+                for i, name in enumerate(batch.schema.names)
+            ))
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from .constants import *
+from .encoder import read_header
+from .errors import *
+
+from ._compat import *
+from . import _quickavro
+
+
+class ReadBuffer(object):
+    """
+    Internal buffer and block framing shared by :class:`quickavro.FileReader`
+    and :class:`quickavro.aio.AsyncFileReader`.
+
+    No I/O is done here: readers refill the buffer by reading the number
+    of bytes returned by :meth:`wanted` and passing the chunks read to
+    :meth:`extend`, synchronously or not. Everything else parses bytes
+    that are already buffered.
+    """
+
+    def reset_buffer(self, offset=0):
+        """
+        Empties the internal buffer, whose next byte is at offset in the
+        underlying file.
+        """
+        self._buffer = b""
+        self._pos = 0
+        self._offset = offset
+        self._eof = False
+
+    def buffered(self):
+        """
+        Returns the number of bytes available in the internal buffer.
+        """
+        return len(self._buffer) - self._pos
+
+    def wanted(self, size, chunks):
+        """
+        Returns the number of bytes to read next so that at least size
+        bytes are available once chunks, the data read so far, are added
+        to the internal buffer. Returns 0 when no read is needed, or at end
+        of file, which is signalled by an empty chunk.
+
+        :param size: Number of bytes needed.
+        :param chunks: List of the chunks read so far.
+        """
+        if self._eof or (chunks and not chunks[-1]):
+            return 0
+        available = self.buffered() + sum(len(chunk) for chunk in chunks)
+        if available >= size:
+            return 0
+        return max(self.buffer_size, size - available)
+
+    def extend(self, chunks):
+        """
+        Appends chunks read from the underlying file to the internal
+        buffer, dropping the bytes already consumed. Returns the number of
+        bytes available.
+
+        :param chunks: List of chunks, see :meth:`wanted`.
+        """
+        if chunks:
+            if not chunks[-1]:
+                self._eof = True
+            self._offset += self._pos
+            self._buffer = b"".join([self._buffer[self._pos:]] + chunks)
+            self._pos = 0
+        return self.buffered()
+
+    def take(self, size):
+        """
+        Consumes and returns up to size buffered bytes.
+        """
+        data = self._buffer[self._pos:self._pos+size]
+        self._pos += len(data)
+        return data
+
+    def take_long(self):
+        """
+        Consumes and returns a buffered variable-length integer.
+        """
+        l, offset = _quickavro.Encoder.read_long(self, self._buffer[self._pos:self._pos+MAX_VARINT_SIZE])
+        self._pos += offset
+        return l
+
+    def take_sync(self):
+        """
+        Consumes a buffered sync marker. Returns whether it matches the
+        sync marker of the file.
+        """
+        return self.take(SYNC_SIZE) == self.sync_marker
+
+    def parse_header(self):
+        """
+        Parses the file header from the buffered bytes. Returns None if
+        more bytes must be read first.
+        """
+        if self._eof and self.buffered() == 0:
+            raise InvalidSchemaError("end of file, unable to find avro header")
+        try:
+            header, offset = read_header(self._buffer[self._pos:])
+        except _quickavro.ReadError:
+            if self._eof:
+                raise InvalidSchemaError("end of file, unable to find avro header")
+            return None
+        self._pos += offset
+        return header
+
+    def apply_header(self, header, reader_schema=None, record_type=None):
+        """
+        Sets the schema, codec and sync marker given by a parsed header.
+
+        :param header: Header returned by :meth:`parse_header`.
+        :param reader_schema: (optional) Schema records are resolved to.
+        :param record_type: (optional) Type of the records read.
+        """
+        metadata = header.get('meta')
+        self.schema = json.loads(ensure_str(metadata.get('avro.schema')))
+        self.codec = ensure_str(metadata.get('avro.codec', 'null'))
+        self.sync_marker = header.get('sync')
+        if reader_schema:
+            self.reader_schema = reader_schema
+        if record_type:
+            self.record_type = record_type
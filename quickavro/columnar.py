@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""
+Columnar decoding of Avro blocks.
+
+Records of a block are decoded straight into one column per field of the
+record schema without building a dictionary per record. Numeric and
+boolean fields are held in :mod:`numpy` arrays, or :class:`array.array`
+when numpy is not installed, strings and bytes in an offsets array and a
+data buffer, enums as symbol indexes and unions of null and another type
+with an additional validity mask. Other fields are converted to Python
+objects as usual.
+"""
+
+import array
+import copy
+
+from ._compat import *
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+NUMPY_DTYPES = {
+    "i": "<i4",
+    "q": "<i8",
+    "f": "<f4",
+    "d": "<f8",
+    "?": "?",
+    "e": "<i4",
+    "B": "u1",
+}
+
+ARRAY_TYPECODES = {
+    "i": "i",
+    "q": "q",
+    "f": "f",
+    "d": "d",
+    "?": "B",
+    "e": "i",
+    "B": "B",
+}
+
+if PY2:
+    # array.array has no 64-bit typecode on Python 2
+    ARRAY_TYPECODES["q"] = "l"
+
+
+def to_array(data, typecode, use_numpy=None):
+    """
+    Returns the native array of typecode backed by data.
+
+    :param data: Buffer of fixed width values.
+    :param typecode: Column type code of the values.
+    :param use_numpy: (optional) Return a numpy array. Defaults to True
+        when numpy is installed.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    if use_numpy:
+        return numpy.frombuffer(data, dtype=NUMPY_DTYPES[typecode])
+    values = array.array(ARRAY_TYPECODES[typecode])
+    if PY2:
+        values.fromstring(data)
+    else:
+        values.frombytes(data)
+    return values
+
+
+class Column(object):
+    """
+    A column of decoded values.
+
+    :param name: Name of the field.
+    :param typecode: ``i``, ``q``, ``f``, ``d`` and ``?`` for fixed width
+        values, ``s`` for strings, ``y`` for bytes, ``e`` for enums and
+        ``O`` for Python objects.
+    :param values: Array of fixed width values or enum indexes, buffer of
+        the concatenated strings or bytes, or list of Python objects.
+    :param offsets: (optional) Array of the offsets of each string in
+        values, followed by the size of values.
+    :param validity: (optional) Array that is 0 for null values.
+    :param symbols: (optional) Symbols of enums.
+    """
+
+    def __init__(self, name, typecode, values, offsets=None, validity=None, symbols=None):
+        self.name = name
+        self.typecode = typecode
+        self.values = values
+        self.offsets = offsets
+        self.validity = validity
+        self.symbols = symbols
+
+    def __len__(self):
+        if self.offsets is not None:
+            return len(self.offsets) - 1
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if self.validity is not None and not self.validity[i]:
+            return None
+        if self.offsets is not None:
+            value = bytes(self.values[self.offsets[i]:self.offsets[i+1]])
+            if self.typecode == "s":
+                value = value.decode("utf-8")
+            return value
+        value = self.values[i]
+        if self.symbols is not None:
+            return self.symbols[value]
+        if self.typecode == "?":
+            return bool(value)
+        return value.item() if hasattr(value, "item") else value
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return "<Column {0!r} typecode={1!r} length={2}>".format(self.name, self.typecode, len(self))
+
+    def to_list(self):
+        """
+        Returns the values of the column as a list of Python objects.
+        """
+        if self.typecode == "O":
+            return list(self.values)
+        return list(self)
+
+
+def make_columns(count, raw, use_numpy=None):
+    """
+    Returns an ordered list of :class:`Column` from the output of
+    :meth:`quickavro.BinaryEncoder.read_columnar`.
+
+    :param count: Number of records decoded.
+    :param raw: List of (name, typecode, data, offsets, validity, symbols)
+        tuples.
+    :param use_numpy: (optional) Use numpy arrays. Defaults to True when
+        numpy is installed.
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    columns = []
+    for name, typecode, data, offsets, validity, symbols in raw:
+        if typecode in ("s", "y"):
+            values = numpy.frombuffer(data, dtype="u1") if use_numpy else data
+            offsets = to_array(offsets, "q", use_numpy)
+        elif typecode != "O":
+            values = to_array(data, typecode, use_numpy)
+        else:
+            values = data
+        if validity is not None:
+            validity = to_array(validity, "B", use_numpy)
+        columns.append(Column(name, typecode, values, offsets, validity, symbols))
+    return columns
+
+
+def default_column(name, count, value):
+    """
+    Returns a :class:`Column` of count copies of the default value of a
+    field missing from the writer schema.
+    """
+    if isinstance(value, (dict, list)):
+        values = [copy.deepcopy(value) for i in range(count)]
+    else:
+        values = [value] * count
+    return Column(name, "O", values)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+"""
+Block compression codecs.
+
+Every codec of the Avro specification is supported: ``null``, ``deflate``,
+``snappy``, ``zstandard``, ``xz`` and ``bzip2``. The first four are
+implemented by :class:`quickavro._quickavro.Codec`, which compresses into
+scratch buffers it keeps between blocks and returns :class:`memoryview`
+objects of them, and computes the snappy CRC32 checksum itself. ``xz``
+requires :mod:`lzma` (``backports.lzma`` on Python 2) and ``bzip2`` uses
+:mod:`bz2`.
+"""
+
+import bz2
+import zlib
+
+from .errors import *
+from .utils import *
+
+from . import _quickavro
+from ._compat import *
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+
+CODECS = ("null", "deflate", "snappy", "zstandard", "xz", "bzip2")
+NATIVE_CODECS = ("null", "deflate", "snappy", "zstandard")
+
+# Default compression level of each codec that has levels.
+DEFAULT_LEVELS = {
+    "deflate": zlib.Z_DEFAULT_COMPRESSION,
+    "zstandard": 3,
+    "xz": 6,
+    "bzip2": 9,
+}
+
+# Number of bytes at the start of a block that are enough to read the
+# uncompressed length of snappy and zstandard blocks.
+LENGTH_HEADER_SIZE = 18
+
+
+def supported_codecs():
+    """
+    Returns the codecs that can be used in this environment.
+    """
+    return tuple(codec for codec in CODECS if codec != "xz" or lzma is not None)
+
+
+def level_range(codec):
+    """
+    Returns the lowest and highest compression level of codec, or None if
+    it has no levels.
+    """
+    if codec == "deflate":
+        return (-1, 9)
+    if codec == "zstandard":
+        return _quickavro.Zstd.levels()
+    if codec == "xz":
+        return (0, 9)
+    if codec == "bzip2":
+        return (1, 9)
+    return None
+
+
+def check_codec(codec, level=None):
+    """
+    Raises :class:`quickavro.CodecNotSupported` if codec cannot be used and
+    ValueError if level is not a valid compression level of codec. The
+    level of codecs without levels is ignored.
+    """
+    if codec not in supported_codecs():
+        if codec == "xz":
+            raise CodecNotSupported("Codec xz requires the lzma module.")
+        raise CodecNotSupported("Codec {0} is not supported.".format(codec))
+    levels = level_range(codec)
+    if level is None or levels is None:
+        return
+    if not levels[0] <= level <= levels[1]:
+        raise ValueError("Compression level of {0} must be between {1} and {2}.".format(codec, *levels))
+
+
+class LibraryCodec(object):
+    """
+    Codec implemented with a compression module of the standard library,
+    with the same interface as :class:`quickavro._quickavro.Codec`.
+
+    :param codec: ``xz`` or ``bzip2``.
+    :param level: (optional) Compression level.
+    """
+
+    def __init__(self, codec, level=None):
+        self.codec = codec
+        self.level = DEFAULT_LEVELS[codec] if level is None else level
+
+    def compress(self, data):
+        if self.codec == "xz":
+            return lzma.compress(data, format=lzma.FORMAT_XZ, preset=self.level)
+        return bz2.compress(data, self.level)
+
+    def decompress(self, data):
+        if self.codec == "xz":
+            return lzma.decompress(data)
+        return bz2.decompress(data)
+
+
+def get_codec(codec, level=None):
+    """
+    Returns the object compressing and decompressing blocks with codec.
+
+    :param codec: Compression codec.
+    :param level: (optional) Compression level. Defaults to the default
+        level of codec.
+    """
+    check_codec(codec, level)
+    if codec in NATIVE_CODECS:
+        return _quickavro.Codec(codec, level)
+    return LibraryCodec(codec, level)
+
+
+def compress(codec, data, level=None):
+    """
+    Compresses block data. The result may be a :class:`memoryview`.
+
+    :param codec: Compression codec.
+    :param data: Serialized records of a block.
+    :param level: (optional) Compression level. Defaults to the default
+        level of codec.
+    """
+    return get_codec(codec, level).compress(data)
+
+
+def decompress(codec, data):
+    """
+    Decompresses block data. The result may be a :class:`memoryview`.
+
+    :param codec: Compression codec.
+    :param data: Compressed block data.
+    """
+    return get_codec(codec).decompress(data)
+
+
+def uncompressed_length(codec, data, block_length):
+    """
+    Returns the uncompressed length of a block from its first
+    :data:`LENGTH_HEADER_SIZE` bytes, or None if the codec does not
+    record it.
+
+    :param codec: Compression codec.
+    :param data: Start of the compressed block data.
+    :param block_length: Length of the compressed block data.
+    """
+    if codec == "null":
+        return block_length
+    if codec == "snappy":
+        return snappy_uncompressed_length(data)
+    if codec == "zstandard":
+        return zstd_uncompressed_length(data)
+    return None
@@ -17,3 +17,7 @@ HEADER_SCHEMA = {
 
 MAX_VARINT_SIZE = 10
 INITIAL_HEADER_SIZE = 8192
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+DEFAULT_SCHEMA_CACHE_SIZE = 128
+DEFAULT_PREFETCH_BYTES = 64 * 1024 * 1024
+PREFETCH_CLOSE_TIMEOUT = 1.0
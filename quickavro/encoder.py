@@ -1,28 +1,52 @@
 # -*- coding: utf-8 -*-
 
 import os
+import itertools
 import json
-import zlib
+import threading
+import time
 
-from ._quickavro import Encoder
+from collections import OrderedDict
+
+from ._quickavro import Encoder, WriteError
 
 from .constants import *
 from .errors import *
+from .columnar import default_column, make_columns
+from .compression import get_codec
+from .flush import flush_policy
+from .records import RECORD_TYPES, record_classes
+from .schema import fullname, project, resolve, schema_cache
 from .utils import *
 
 from ._compat import *
 
+_local = threading.local()
+
+# Buffer formats of fixed width values written natively by write_columns.
+NUMERIC_FORMATS = frozenset("bBhHiIlLqQfd?")
+
+def header_encoder():
+    """
+    Returns the encoder for Avro file headers of the current thread. It is
+    created once per thread and reused by :func:`read_header` and
+    :func:`write_header`.
+    """
+    encoder = getattr(_local, "header_encoder", None)
+    if encoder is None:
+        encoder = _local.header_encoder = BinaryEncoder(HEADER_SCHEMA)
+    return encoder
+
 def read_header(data):
     """
     Reads Avro binary file header
 
     :param data: bytes representing Avro file header.
     """
-    with BinaryEncoder(HEADER_SCHEMA) as encoder:
-        header, offset = encoder.read_record(data)
-        if not header:
-            raise InvalidSchemaError("Unable to read Avro header.")
-        return header, offset
+    header, offset = header_encoder().read_record(data)
+    if not header:
+        raise InvalidSchemaError("Unable to read Avro header.")
+    return header, offset
 
 def write_header(schema, sync_marker, codec="null"):
     """
@@ -32,16 +56,72 @@ def write_header(schema, sync_marker, codec="null"):
     :param sync_marker: str used to verify blocks.
     :param codec: (optional) Compression codec.
     """
-    with BinaryEncoder(HEADER_SCHEMA, codec) as encoder:
-        header = {
-            "magic": MAGIC,
-            "meta": {
-                "avro.codec": ensure_bytes(codec),
-                "avro.schema": ensure_bytes(json.dumps(schema))
-            },
-            "sync": sync_marker
-        }
-        return encoder.write(header)
+    header = {
+        "magic": MAGIC,
+        "meta": {
+            "avro.codec": ensure_bytes(codec),
+            "avro.schema": ensure_bytes(json.dumps(schema))
+        },
+        "sync": sync_marker
+    }
+    return header_encoder().write(header)
+
+
+def _column(column):
+    """
+    Returns column as a list, tuple or one dimensional numeric buffer,
+    the forms the native column writer reads without copying.
+    """
+    if isinstance(column, (list, tuple)):
+        return column
+    try:
+        view = memoryview(column)
+    except TypeError:
+        view = None
+    if view is not None and view.ndim <= 1 and getattr(view, "c_contiguous", True) and \
+            view.format.lstrip("@=<>!") in NUMERIC_FORMATS:
+        return column
+    if hasattr(column, "tolist"):
+        return column.tolist()
+    return list(column)
+
+
+class ColumnBatch(object):
+    """
+    Columns ordered like the fields of a record schema, written a block at
+    a time by :meth:`BinaryEncoder.write_columns`. Columns are converted
+    once, and the rows of schemas without a columnar representation are
+    read from a single iterator, so that each block only costs its own
+    rows.
+
+    :param names: Names of the fields of the record schema.
+    :param columns: Dictionary of field names to columns.
+    """
+
+    def __init__(self, names, columns):
+        for name in names:
+            if name not in columns:
+                raise WriteError("Missing column {0}.".format(name))
+        self.names = names
+        self.columns = [_column(columns[name]) for name in names]
+        self.native = True
+        self.rows = None
+        self.position = 0
+
+    def records(self, offset):
+        """
+        Returns an iterator over the records from row offset on. The
+        iterator of the previous call is continued when it stopped at
+        offset.
+
+        :param offset: First row.
+        """
+        if self.rows is None or offset != self.position:
+            columns = [column.tolist() if hasattr(column, "tolist") else column for column in self.columns]
+            rows = itertools.islice(izip(*columns), offset, None)
+            self.rows = (dict(izip(self.names, row)) for row in rows)
+            self.position = offset
+        return self.rows
 
 
 class BinaryEncoder(Encoder):
@@ -53,7 +133,14 @@ class BinaryEncoder(Encoder):
     :param schema: (optional) Dictionary to use as Avro schema for this
         :class:`BinaryEncoder`.
     :param codec: (optional) Compression codec used with
-        :class:`BinaryEncoder`.
+        :class:`BinaryEncoder`: ``null``, ``deflate``, ``snappy``,
+        ``zstandard``, ``xz`` or ``bzip2``.
+    :param level: (optional) Compression level of the codec. Defaults to
+        the default level of each codec and is ignored by ``null`` and
+        ``snappy``.
+    :param flush_policy: (optional) Policy deciding when blocks end, see
+        :mod:`quickavro.flush`. Blocks end after
+        :data:`DEFAULT_SYNC_INTERVAL` bytes by default.
 
     Example:
 
@@ -74,17 +161,27 @@ class BinaryEncoder(Encoder):
                     f.write(block)
     """
 
-    def __init__(self, schema=None, codec="null"):
+    def __init__(self, schema=None, codec="null", level=None, flush_policy=None):
         super(BinaryEncoder, self).__init__()
         self._codec = None
+        self._level = None
+        self._compressor = None
         self._schema = None
+        self._reader_schema = None
+        self._fields = None
+        self._projections = {}
+        self._record_type = None
         self.sync_marker = os.urandom(SYNC_SIZE)
         self.codec = codec
+        self.level = level
         if schema:
             self.schema = schema
         self.block = []
         self.block_count = 0
+        self.block_records = 0
         self.block_size = 0
+        self.block_start = None
+        self.flush_policy = flush_policy
 
     def close(self):
         pass
@@ -95,10 +192,33 @@ class BinaryEncoder(Encoder):
 
     @codec.setter
     def codec(self, codec):
-        if codec not in {"deflate", "null", "snappy"}:
-            raise CodecNotSupported("Codec {0} is not supported.".format(codec))
+        self._compressor = get_codec(codec, self._level)
         self._codec = codec
 
+    @property
+    def level(self):
+        """
+        Compression level of the codec, or None for the default level.
+        """
+        return self._level
+
+    @level.setter
+    def level(self, level):
+        self._compressor = get_codec(self._codec, level)
+        self._level = level
+
+    @property
+    def flush_policy(self):
+        """
+        Policy deciding when blocks end, see :mod:`quickavro.flush`.
+        Lists of policies end blocks as soon as any of them would.
+        """
+        return self._flush_policy
+
+    @flush_policy.setter
+    def flush_policy(self, policy):
+        self._flush_policy = flush_policy(policy)
+
     @property
     def header(self):
         return write_header(self.schema, self.sync_marker, self.codec)
@@ -121,9 +241,93 @@ class BinaryEncoder(Encoder):
                 break
             self.block_count += 1
             sync_marker, data = data[:SYNC_SIZE], data[SYNC_SIZE:]
-            for record in self.read(block):
+            for record in self.iter_read(block):
                 yield record
 
+    def iter_read(self, data, fields=None):
+        """
+        Returns an iterator over the records serialized in data.
+
+        :param data: Serialized records.
+        :param fields: (optional) Names of the fields to decode. Other
+            fields are skipped in their binary form. Only applies to this
+            call, see :meth:`projection`.
+        """
+        if fields is not None:
+            return self.projection(fields).iter_read(data)
+        return super(BinaryEncoder, self).iter_read(data)
+
+    def read(self, data, fields=None):
+        """
+        Returns a list of the records serialized in data.
+
+        :param data: Serialized records.
+        :param fields: (optional) Names of the fields to decode. Other
+            fields are skipped in their binary form.
+        """
+        return list(self.iter_read(data, fields))
+
+    def read_columnar(self, data, fields=None, use_numpy=None):
+        """
+        Decodes the records serialized in data into columns without
+        building a dictionary per record. Returns an ordered dictionary of
+        field names to :class:`quickavro.columnar.Column`.
+
+        :param data: Serialized records.
+        :param fields: (optional) Names of the fields to decode. Only
+            applies to this call, see :meth:`projection`.
+        :param use_numpy: (optional) Hold values in numpy arrays rather
+            than :class:`array.array`. Defaults to True when numpy is
+            installed.
+        """
+        if fields is not None:
+            return self.projection(fields).read_columnar(data, use_numpy=use_numpy)
+        count, raw = super(BinaryEncoder, self).read_columnar(data)
+        columns = OrderedDict((column.name, column) for column in make_columns(count, raw, use_numpy))
+        if self.reader_schema:
+            schema, defaults = resolve(self.schema, self.reader_schema)
+            name = fullname(schema["name"], schema.get("namespace"))
+            for field, value in defaults.get(name, {}).items():
+                columns[field] = default_column(field, count, value)
+        return columns
+
+    def project(self, fields):
+        """
+        Sets the reader schema to the projection of the schema on fields,
+        unless fields is None. Unlike the fields option of :meth:`read`,
+        the projection applies to every following read.
+
+        :param fields: Names of the fields to decode.
+        """
+        if fields is not None:
+            fields = tuple(fields)
+            if fields != self._fields:
+                self.reader_schema = project(self.schema, fields)
+                self._fields = fields
+
+    def projection(self, fields):
+        """
+        Returns an encoder that only decodes fields, with the reader
+        schema and record type of this encoder, used for the fields
+        option of reads without changing this encoder. It is created
+        once per set of fields.
+
+        :param fields: Names of the fields to decode.
+        """
+        fields = tuple(fields)
+        if fields == self._fields:
+            return self
+        encoder = self._projections.get(fields)
+        if encoder is None:
+            base = self.schema
+            if self._reader_schema and self._fields is None:
+                base = self._reader_schema
+            encoder = BinaryEncoder(self.schema)
+            encoder.reader_schema = project(base, fields)
+            encoder.record_type = self._record_type
+            self._projections[fields] = encoder
+        return encoder
+
     def read_header(self, data):
         data = memoryview(data)
         header, offset = read_header(data)
@@ -139,37 +343,219 @@ class BinaryEncoder(Encoder):
     @schema.setter
     def schema(self, schema):
         self._schema = schema
-        self.set_schema(json.dumps(schema))
+        self._projections = {}
+        self.set_schema(schema_cache.get(schema))
+        if self._reader_schema:
+            self.reader_schema = self._reader_schema
+        elif self._record_type:
+            self.record_type = self._record_type
 
-    def write_block(self):
+    @property
+    def reader_schema(self):
+        """
+        Schema records are resolved to when read. Fields of the writer
+        schema that are not in the reader schema are skipped without
+        being decoded into Python objects, fields only in the reader
+        schema are set to their default value and int, long and float
+        values are promoted to the reader type.
+        """
+        return self._reader_schema
+
+    @reader_schema.setter
+    def reader_schema(self, schema):
+        self._reader_schema = schema
+        self._fields = None
+        self._projections = {}
+        if not schema:
+            self.set_reader_schema(None)
+            if self._record_type:
+                self.record_type = self._record_type
+            return
+        schema, defaults = resolve(self.schema, schema)
+        self.set_reader_schema(json.dumps(schema), defaults)
+        if self._record_type:
+            self.record_type = self._record_type
+
+    @property
+    def record_type(self):
+        """
+        Type records are decoded into: ``"dict"`` (the default),
+        ``"tuple"`` for namedtuples or ``"slots"`` for instances of a class
+        with ``__slots__``. The classes are generated once per record
+        schema, see :mod:`quickavro.records`.
+        """
+        return self._record_type or "dict"
+
+    @record_type.setter
+    def record_type(self, record_type):
+        if record_type not in RECORD_TYPES and record_type is not None:
+            raise ValueError("Record type must be one of {0}.".format(", ".join(RECORD_TYPES)))
+        self._record_type = None if record_type == "dict" else record_type
+        self._projections = {}
+        if not self._schema:
+            return
+        if not self._record_type:
+            self.set_record_type(None, None)
+            return
+        reader_classes = None
+        if self._reader_schema:
+            schema, defaults = resolve(self.schema, self._reader_schema)
+            reader_classes = record_classes(schema, self._record_type, defaults)
+        self.set_record_type(record_classes(self.schema, self._record_type), reader_classes)
+
+    def compress(self, data):
+        """
+        Compresses block data with the codec of this encoder. Like
+        :meth:`decompress`, the result may be a :class:`memoryview` of a
+        reused buffer.
+
+        :param data: Serialized records of a block.
+        """
+        return self._compressor.compress(data)
+
+    def decompress(self, data):
+        """
+        Decompresses block data with the codec of this encoder. Blocks
+        decompressed by the native codecs are returned as a
+        :class:`memoryview` of a buffer that is reused for later blocks
+        once the view has been released.
+
+        :param data: Compressed block data.
+        """
+        return self._compressor.decompress(data)
+
+    def pack_block(self, block_count, data):
+        """
+        Frames compressed block data with its record count, length and
+        the sync marker.
+
+        :param block_count: Number of records in the block.
+        :param data: Compressed block data.
+        """
+        if PY2 and isinstance(data, memoryview):
+            data = data.tobytes()
+        return b"".join((self.write_long(block_count), self.write_long(len(data)), data, self.sync_marker))
+
+    def take_block(self):
+        """
+        Returns the record count and serialized data of the current block
+        and starts a new one.
+        """
         data = b"".join(self.block)
-        block_count = self.write_long(len(self.block))
-        if self.codec == 'deflate':
-            data = zlib.compress(data)[2:-1]
-        elif self.codec == 'snappy':
-            crc = crc32(data)
-            data = snappy_compress(data)
-            data = data + crc
-        block_length = self.write_long(len(data))
+        block_count = self.block_records
         self.block = []
         self.block_count += 1
+        self.block_records = 0
         self.block_size = 0
-        return block_count + block_length + data + self.sync_marker
+        return block_count, data
+
+    def write_block(self):
+        block_count, data = self.take_block()
+        compressed = self.compress(data)
+        self.flush_policy.block_written(len(data), len(compressed), block_count)
+        return self.pack_block(block_count, compressed)
+
+    def append_block(self, data, count):
+        """
+        Adds serialized records to the current block.
+
+        :param data: Serialized records.
+        :param count: Number of records in data.
+        """
+        if not self.block_records:
+            self.block_start = time.time()
+        self.block.append(data)
+        self.block_records += count
+        self.block_size += len(data)
+
+    def fill_block(self, records):
+        """
+        Encodes records from an iterator into the current block until the
+        limits of the flush policy are reached or the iterator is
+        exhausted. Returns the number of records encoded.
+
+        :param records: Iterator of records.
+        """
+        # Ensure schema is set before allowing fill_block
+        self.schema
+        max_size, max_count = self.flush_policy.limits(self)
+        block_count, data = self.write_many(records, max_size, max_count)
+        if block_count:
+            self.append_block(data, block_count)
+        return block_count
+
+    def write_columns(self, columns, offset=0, max_size=0, max_count=0):
+        """
+        Serializes records given as columns, a dictionary of field names
+        to sequences of values, starting at row offset and stopping once
+        max_size bytes or max_count records have been written. Numeric
+        columns can be numpy arrays, :class:`array.array` or any other
+        buffer of fixed width values. Returns a tuple of the number of
+        records written and their serialized data.
+
+        Schemas with fields of types other than primitives, enums and
+        unions of null and one of those are written by building a
+        record per row.
+
+        :param columns: Dictionary of field names to columns, or a
+            :class:`ColumnBatch` from :meth:`column_batch` when writing
+            the same columns in several calls.
+        :param offset: (optional) First row to write.
+        :param max_size: (optional) Stop once this many bytes have been
+            written.
+        :param max_count: (optional) Stop once this many records have
+            been written.
+        """
+        batch = self.column_batch(columns)
+        if batch.native:
+            result = super(BinaryEncoder, self).write_columns(batch.columns, offset, max_size, max_count)
+            if result is not None:
+                return result
+            batch.native = False
+        result = self.write_many(batch.records(offset), max_size, max_count)
+        batch.position = offset + result[0]
+        return result
+
+    def column_batch(self, columns):
+        """
+        Returns a :class:`ColumnBatch` of columns for the current schema.
+
+        :param columns: Dictionary of field names to columns.
+        """
+        if isinstance(columns, ColumnBatch):
+            return columns
+        return ColumnBatch([field["name"] for field in self.schema["fields"]], columns)
+
+    def fill_block_columns(self, columns, offset=0):
+        """
+        Encodes the rows of columns starting at offset into the current
+        block until the limits of the flush policy are reached. Returns
+        the number of records encoded.
+
+        :param columns: Dictionary of field names to columns, or a
+            :class:`ColumnBatch`.
+        :param offset: (optional) First row to encode.
+        """
+        max_size, max_count = self.flush_policy.limits(self)
+        block_count, data = self.write_columns(columns, offset, max_size, max_count)
+        if block_count:
+            self.append_block(data, block_count)
+        return block_count
 
     def write_blocks(self, records):
-        for record in records:
-            if self.block_size >= DEFAULT_SYNC_INTERVAL:
+        records = iter(records)
+        while True:
+            if self.flush_policy.should_flush(self):
                 yield self.write_block()
-            self.write_record(record)
+            if not self.fill_block(records):
+                break
         if self.block:
             yield self.write_block()
 
     def write_record(self, record):
         # Ensure schema is set before allowing write_record
         self.schema
-        record = self.write(record)
-        self.block_size += len(record)
-        self.block.append(record)
+        self.append_block(self.write(record), 1)
 
     def __enter__(self):
         return self
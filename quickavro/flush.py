@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+"""
+Policies deciding when writers end the current block.
+
+Larger blocks compress better and suit parallel reads, smaller blocks
+reach readers sooner. A policy is given to :class:`quickavro.FileWriter`
+or set as :attr:`quickavro.BinaryEncoder.flush_policy`:
+
+.. code-block:: python
+
+    from quickavro.flush import BytesPolicy
+
+    with quickavro.FileWriter("test.avro", codec="snappy",
+                              flush_policy=BytesPolicy(1024 * 1024)) as writer:
+        ...
+
+A list of policies ends a block as soon as any of them would.
+"""
+
+import time
+
+from .constants import *
+
+from ._compat import *
+
+
+# Number of records encoded between checks of the age of a block.
+AGE_CHECK_INTERVAL = 1000
+
+# Bounds of the uncompressed block size targeted by CompressedSizePolicy.
+MIN_ADAPTIVE_SIZE = 4 * 1024
+MAX_ADAPTIVE_SIZE = 64 * 1024 * 1024
+
+
+class FlushPolicy(object):
+    """
+    Base class of flush policies. Writers call :meth:`should_flush` before
+    adding records to the current block, encode batches of records within
+    :meth:`limits` and report every block written to :meth:`block_written`.
+    """
+
+    def should_flush(self, encoder):
+        """
+        Returns True if the current block of encoder should be written.
+
+        :param encoder: :class:`quickavro.BinaryEncoder` holding the
+            block.
+        """
+        return False
+
+    def limits(self, encoder):
+        """
+        Returns the maximum number of bytes and records that can be added
+        to the current block of encoder in one batch, 0 meaning no limit.
+
+        :param encoder: :class:`quickavro.BinaryEncoder` holding the
+            block.
+        """
+        return 0, 0
+
+    def block_written(self, size, compressed_size, count):
+        """
+        Called with the uncompressed and compressed size and the record
+        count of each block written.
+        """
+
+
+class BytesPolicy(FlushPolicy):
+    """
+    Ends blocks once they hold size bytes of uncompressed data. This is
+    the default policy, with a size of
+    :data:`quickavro.constants.DEFAULT_SYNC_INTERVAL`.
+
+    :param size: (optional) Uncompressed size of blocks in bytes.
+    """
+
+    def __init__(self, size=DEFAULT_SYNC_INTERVAL):
+        self.size = size
+
+    def should_flush(self, encoder):
+        return encoder.block_size >= self.size
+
+    def limits(self, encoder):
+        return max(self.size - encoder.block_size, 1), 0
+
+    def __repr__(self):
+        return "BytesPolicy({0})".format(self.size)
+
+
+class CountPolicy(FlushPolicy):
+    """
+    Ends blocks once they hold count records.
+
+    :param count: Number of records of blocks.
+    """
+
+    def __init__(self, count):
+        self.count = count
+
+    def should_flush(self, encoder):
+        return encoder.block_records >= self.count
+
+    def limits(self, encoder):
+        return 0, max(self.count - encoder.block_records, 1)
+
+    def __repr__(self):
+        return "CountPolicy({0})".format(self.count)
+
+
+class AgePolicy(FlushPolicy):
+    """
+    Ends blocks once their first record was added max_age milliseconds
+    ago. The age is only checked when records are written, so writers
+    receiving records slowly should also call
+    :meth:`quickavro.FileWriter.flush_if_due` periodically.
+
+    :param max_age: Maximum age of blocks in milliseconds.
+    """
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+
+    def should_flush(self, encoder):
+        if not encoder.block_records:
+            return False
+        return (time.time() - encoder.block_start) * 1000 >= self.max_age
+
+    def limits(self, encoder):
+        return 0, AGE_CHECK_INTERVAL
+
+    def __repr__(self):
+        return "AgePolicy({0})".format(self.max_age)
+
+
+class CompressedSizePolicy(FlushPolicy):
+    """
+    Ends blocks once their compressed size is expected to reach size
+    bytes. The uncompressed size targeted is derived from the compression
+    ratio of the blocks written so far, smoothed with an exponential
+    moving average.
+
+    :param size: Compressed size of blocks in bytes.
+    :param ratio: (optional) Compression ratio, compressed over
+        uncompressed size, assumed before the first block is written.
+    :param smoothing: (optional) Weight of the ratio of the last block
+        in the moving average.
+    """
+
+    def __init__(self, size, ratio=0.5, smoothing=0.3):
+        self.size = size
+        self.ratio = ratio
+        self.smoothing = smoothing
+
+    @property
+    def target(self):
+        """
+        Uncompressed block size currently targeted.
+        """
+        target = int(self.size / max(self.ratio, 1e-6))
+        return min(max(target, MIN_ADAPTIVE_SIZE), MAX_ADAPTIVE_SIZE)
+
+    def should_flush(self, encoder):
+        return encoder.block_size >= self.target
+
+    def limits(self, encoder):
+        return max(self.target - encoder.block_size, 1), 0
+
+    def block_written(self, size, compressed_size, count):
+        if size:
+            ratio = float(compressed_size) / size
+            self.ratio += self.smoothing * (ratio - self.ratio)
+
+    def __repr__(self):
+        return "CompressedSizePolicy({0})".format(self.size)
+
+
+class AnyPolicy(FlushPolicy):
+    """
+    Ends blocks as soon as any of policies would.
+
+    :param policies: Flush policies.
+    """
+
+    def __init__(self, policies):
+        self.policies = list(policies)
+
+    def should_flush(self, encoder):
+        return any(policy.should_flush(encoder) for policy in self.policies)
+
+    def limits(self, encoder):
+        max_size = max_count = 0
+        for size, count in (policy.limits(encoder) for policy in self.policies):
+            if size and (not max_size or size < max_size):
+                max_size = size
+            if count and (not max_count or count < max_count):
+                max_count = count
+        return max_size, max_count
+
+    def block_written(self, size, compressed_size, count):
+        for policy in self.policies:
+            policy.block_written(size, compressed_size, count)
+
+    def __repr__(self):
+        return "AnyPolicy({0!r})".format(self.policies)
+
+
+def flush_policy(policy):
+    """
+    Returns the flush policy for the flush_policy option of writers: the
+    default policy for None and an :class:`AnyPolicy` for a list.
+    """
+    if policy is None:
+        return BytesPolicy()
+    if isinstance(policy, (list, tuple)):
+        return AnyPolicy(policy)
+    if not isinstance(policy, FlushPolicy):
+        raise TypeError("Flush policy must be a FlushPolicy or a list of them.")
+    return policy
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""
+Block indexes of Avro container files.
+
+An index lists the byte offset, record count and ordinal of the first
+record of every block, so that blocks and records can be located without
+decoding the blocks before them. Indexes are built from the block headers
+alone and can be persisted next to the file they describe.
+"""
+
+import bisect
+import binascii
+import json
+import os
+
+from collections import namedtuple
+
+from .errors import *
+
+from ._compat import *
+
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+
+BlockEntry = namedtuple("BlockEntry", ["offset", "count", "first_record"])
+
+
+class BlockIndex(object):
+    """
+    Index of the blocks of an Avro file.
+
+    :param sync_marker: Sync marker of the indexed file, used to check that
+        a persisted index still matches the file.
+    :param size: (optional) Size in bytes of the indexed file.
+    """
+
+    def __init__(self, sync_marker, size=None):
+        self.sync_marker = sync_marker
+        self.size = size
+        self.blocks = []
+        self._firsts = []
+
+    def __getitem__(self, i):
+        return self.blocks[i]
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def append(self, offset, count):
+        """
+        Adds the next block of the file to the index.
+
+        :param offset: Offset of the block in the file.
+        :param count: Number of records in the block.
+        """
+        first_record = self.record_count
+        self.blocks.append(BlockEntry(offset, count, first_record))
+        self._firsts.append(first_record)
+
+    @property
+    def record_count(self):
+        """
+        Total number of records in the indexed blocks.
+        """
+        if not self.blocks:
+            return 0
+        last = self.blocks[-1]
+        return last.first_record + last.count
+
+    def find_record(self, n):
+        """
+        Returns the position in the index of the block holding record n.
+
+        :param n: Ordinal of the record in the file.
+        """
+        if n < 0 or n >= self.record_count:
+            raise IndexError("Record {0} is out of range.".format(n))
+        return bisect.bisect_right(self._firsts, n) - 1
+
+    def save(self, path):
+        """
+        Writes the index to path.
+
+        :param path: Path of the sidecar file.
+        """
+        data = {
+            "version": INDEX_VERSION,
+            "sync": ensure_str(binascii.hexlify(self.sync_marker)),
+            "size": self.size,
+            "blocks": [list(block) for block in self.blocks]
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.rename(tmp, path)
+
+    @classmethod
+    def load(cls, path, sync_marker=None, size=None):
+        """
+        Reads an index from path. Returns None if the file does not exist
+        or the index does not match the given sync marker or file size.
+
+        :param path: Path of the sidecar file.
+        :param sync_marker: (optional) Expected sync marker.
+        :param size: (optional) Expected size of the indexed file.
+        """
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if data.get("version") != INDEX_VERSION:
+            return None
+        marker = binascii.unhexlify(ensure_bytes(data["sync"]))
+        if sync_marker is not None and marker != bytes(sync_marker):
+            return None
+        if size is not None and data.get("size") != size:
+            return None
+        index = cls(marker, data.get("size"))
+        for offset, count, first_record in data["blocks"]:
+            index.blocks.append(BlockEntry(offset, count, first_record))
+            index._firsts.append(first_record)
+        return index
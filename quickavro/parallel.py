@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+"""
+Parallel decoding of Avro container files.
+
+Blocks in an Avro file are independent of each other once the header
+has been read, so a file can be split into byte ranges that are each
+resynchronized on the sync marker and decoded in a separate process.
+"""
+
+import os
+import multiprocessing
+
+from .constants import *
+from .reader import FileReader
+
+from ._compat import *
+
+
+DEFAULT_SPLIT_SIZE = 64 * 1024 * 1024
+
+# Number of decoded blocks a worker can queue before waiting for the
+# reading process to consume them.
+MAX_QUEUED_BLOCKS = 4
+
+# Queues of the worker processes of read_records, one per task slot.
+_queues = None
+
+
+def iter_range(path, start, end, reader_schema=None, record_type=None):
+    """
+    Returns an iterator over the blocks whose sync marker begins within
+    the byte range [start, end) of the Avro file at path, each decoded
+    into a list of records.
+
+    :param path: Path of the Avro file.
+    :param start: Offset of the first byte of the range.
+    :param end: Offset of the byte following the range.
+    :param reader_schema: (optional) Schema records are resolved to.
+    :param record_type: (optional) ``"dict"``, ``"tuple"`` or ``"slots"``.
+    """
+    with FileReader(path, reader_schema=reader_schema, record_type=record_type, start=start, end=end) as reader:
+        for block in reader.iter_blocks():
+            yield list(reader.iter_read(block))
+            block = None
+
+
+def _init_worker(queues):
+    global _queues
+    _queues = queues
+
+
+def _read_range(slot, task, args):
+    """
+    Sends the blocks of a byte range to the queue of slot as (task,
+    records) tuples, followed by (task, None) or (task, exception).
+    """
+    queue = _queues[slot]
+    try:
+        for records in iter_range(*args):
+            queue.put((task, records))
+    except Exception as e:
+        queue.put((task, e))
+    else:
+        queue.put((task, None))
+
+
+def byte_ranges(size, split_size=DEFAULT_SPLIT_SIZE, start=0):
+    """
+    Returns a list of (start, end) tuples covering the bytes from start to
+    size in ranges of at most split_size bytes.
+    """
+    return [(offset, min(offset + split_size, size)) for offset in range(start, size, split_size)]
+
+
+def splits(path, n, start=0, end=None):
+    """
+    Returns a list of n (start, end) tuples splitting the Avro file at
+    path into byte ranges of balanced size, to be read with
+    ``FileReader(path, start=start, end=end)``.
+
+    :param path: Path of the Avro file.
+    :param n: Number of splits.
+    :param start: (optional) Offset of the first byte to split, so that a
+        split can be split again.
+    :param end: (optional) Offset of the byte following the bytes to
+        split. Defaults to the size of the file.
+    """
+    size = os.path.getsize(path)
+    if end is None or end > size:
+        end = size
+    length = max(end - start, 0)
+    n = max(min(n, length), 1)
+    bounds = [start + length * i // n for i in range(n + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def read_records(path, workers=None, ordered=True, split_size=None, reader_schema=None, record_type=None,
+                 start=0, end=None, skip=0):
+    """
+    Returns an iterator over the records of the Avro file at path, decoding
+    byte ranges of the file in a pool of worker processes.
+
+    Workers send records back a block at a time through bounded queues,
+    and at most two ranges per worker are in flight, so the memory used
+    does not depend on the size of the file or on how fast records are
+    consumed.
+
+    :param path: Path of the Avro file.
+    :param workers: (optional) Number of worker processes. Defaults to
+        the number of CPUs.
+    :param ordered: (optional) Yield records in file order. If False,
+        records are yielded as soon as each block has been decoded.
+    :param split_size: (optional) Size in bytes of the ranges handed to
+        the workers. Defaults to an even share of the file per worker,
+        capped at 64MiB.
+    :param reader_schema: (optional) Schema records are resolved to.
+    :param record_type: (optional) ``"dict"``, ``"tuple"`` or ``"slots"``.
+    :param start: (optional) Read the blocks whose sync marker begins at
+        or after start.
+    :param end: (optional) Read the blocks whose sync marker begins
+        before end. Defaults to the end of the file.
+    :param skip: (optional) Number of records of the first block to skip.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    size = os.path.getsize(path)
+    if end is not None and end < size:
+        size = end
+    if split_size is None:
+        split_size = min(DEFAULT_SPLIT_SIZE, max((size - start) // workers, 1))
+    tasks = [
+        (path, offset, end, reader_schema, record_type)
+        for offset, end in byte_ranges(size, split_size, start)
+    ]
+    window = max(min(2 * workers, len(tasks)), 1)
+    # In file order the blocks of each range are read from the queue of
+    # its slot, so that ranges decoded ahead wait in their worker rather
+    # than in this process. Otherwise all slots share one queue.
+    if ordered:
+        queues = [multiprocessing.Queue(MAX_QUEUED_BLOCKS) for i in range(window)]
+    else:
+        queues = [multiprocessing.Queue(MAX_QUEUED_BLOCKS * window)] * window
+    pool = multiprocessing.Pool(workers, _init_worker, (queues,))
+    try:
+        submitted = min(window, len(tasks))
+        for task in range(submitted):
+            pool.apply_async(_read_range, (task, task, tasks[task]))
+        done = 0
+        while done < len(tasks):
+            slot = done % window if ordered else 0
+            task, records = queues[slot].get()
+            if isinstance(records, Exception):
+                raise records
+            if records is None:
+                done += 1
+                if submitted < len(tasks):
+                    slot = submitted % window
+                    pool.apply_async(_read_range, (slot, submitted, tasks[submitted]))
+                    submitted += 1
+                continue
+            if task == 0 and skip:
+                # The first block of the first range is where the reader
+                # stopped, records before its position are skipped.
+                records, skip = records[skip:], 0
+            for record in records:
+                yield record
+            records = None
+    finally:
+        pool.terminate()
+        pool.join()
+        for queue in set(queues):
+            queue.close()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+Readahead of Avro blocks in a background thread.
+
+A :class:`Prefetcher` pulls items from an iterator in its own thread and
+keeps them in a queue bounded both in number of items and in bytes, so
+that reading and decompressing the next blocks overlaps with decoding the
+current one while memory use stays capped.
+"""
+
+import collections
+import sys
+import threading
+
+from ._compat import *
+
+
+class Prefetcher(object):
+    """
+    Iterates over items in a background thread ahead of the consumer.
+
+    :param items: Iterable of (item, size) pairs. It is only iterated from
+        the background thread.
+    :param max_items: Maximum number of items queued.
+    :param max_bytes: Maximum total size of the items queued. A single
+        item larger than max_bytes is still queued on its own.
+    """
+
+    def __init__(self, items, max_items, max_bytes):
+        self.items = items
+        self.max_items = max(max_items, 1)
+        self.max_bytes = max_bytes
+        self.queue = collections.deque()
+        self.size = 0
+        self.done = False
+        self.closed = False
+        self.error = None
+        self.callback = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="quickavro-prefetch")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def full(self):
+        return bool(self.queue) and (len(self.queue) >= self.max_items or self.size >= self.max_bytes)
+
+    def run(self):
+        try:
+            items = iter(self.items)
+            while True:
+                with self.condition:
+                    while self.full() and not self.closed:
+                        self.condition.wait()
+                    if self.closed:
+                        return
+                try:
+                    item, size = next(items)
+                except StopIteration:
+                    return
+                with self.condition:
+                    self.queue.append((item, size))
+                    self.size += size
+                    self.condition.notify_all()
+        except Exception:
+            self.error = sys.exc_info()[1]
+        finally:
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+                callback = self.callback
+            if callback is not None:
+                callback()
+
+    def get(self):
+        """
+        Returns the next item, or None once the iterator is exhausted or
+        the prefetcher has been closed. Exceptions raised by the iterator
+        are raised here, after the items read before them.
+        """
+        with self.condition:
+            while not self.queue and not self.done and not self.closed:
+                self.condition.wait()
+            if self.queue and not self.closed:
+                item, size = self.queue.popleft()
+                self.size -= size
+                self.condition.notify_all()
+                return item
+            if self.error is not None and not self.closed:
+                raise self.error
+            return None
+
+    def close(self, timeout=None):
+        """
+        Stops the background thread and discards the queued items. The
+        thread stops once the item it is reading, if any, has been read,
+        so with no timeout this blocks until a stalled read returns.
+        Returns False if the thread is still running after timeout.
+
+        :param timeout: (optional) Maximum number of seconds to wait for
+            the thread to stop.
+        """
+        with self.condition:
+            self.closed = True
+            self.queue.clear()
+            self.size = 0
+            self.condition.notify_all()
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+    def call_when_stopped(self, callback):
+        """
+        Calls callback from the background thread once it stops. Returns
+        False without calling it if the thread has already stopped.
+
+        :param callback: Function called without arguments.
+        """
+        with self.condition:
+            if self.done:
+                return False
+            self.callback = callback
+            return True
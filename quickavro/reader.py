@@ -1,24 +1,63 @@
 # -*- coding: utf-8 -*-
 
-import json
-import zlib
+import os
+import mmap
 import binascii
+import itertools
 import struct
 
+from .buffer import ReadBuffer
 from .constants import *
+from .compression import LENGTH_HEADER_SIZE, uncompressed_length
 from .encoder import *
 from .errors import *
+from .index import BlockIndex, INDEX_SUFFIX
+from .prefetch import Prefetcher
 from .utils import *
 
-from . import _quickavro
 
-class FileReader(BinaryEncoder):
+class FileReader(ReadBuffer, BinaryEncoder):
     """
     The :class:`FileReader` object implements :class:`quickavro.BinaryEncoder`
     and provides and interface to read Avro files.
 
+    Data is pulled from the underlying file in large chunks and all block
+    framing is parsed from an internal buffer, so the file object only
+    needs to support ``read``. This allows reading from non-seekable
+    streams such as stdin, sockets or :mod:`gzip` files.
+
     :param f: File-like object or path of file that :class:`FileReader`
         will read from.
+    :param header_size: (optional) Number of bytes initially read when
+        looking for the Avro header.
+    :param buffer_size: (optional) Minimum number of bytes requested from
+        the underlying file each time the internal buffer is refilled.
+    :param reader_schema: (optional) Schema records are resolved to. Only
+        the fields of the reader schema are decoded, see
+        :attr:`BinaryEncoder.reader_schema`.
+    :param mmap: (optional) Memory-map the file instead of reading it
+        into the internal buffer. Blocks are then handed to the decoder
+        and decompressors as :class:`memoryview` slices of the mapping
+        without being copied. Requires a real file on disk.
+    :param record_type: (optional) ``"dict"``, ``"tuple"`` or ``"slots"``,
+        see :attr:`BinaryEncoder.record_type`.
+    :param start: (optional) Offset of the first byte of an input split
+        of the file. Reading starts at the first block whose preceding
+        sync marker begins at or after start.
+    :param end: (optional) Offset of the byte following an input split.
+        Only blocks whose preceding sync marker begins before end are
+        read, so that adjacent splits read each block exactly once.
+    :param prefetch_blocks: (optional) Number of blocks read ahead by a
+        background thread while the current block is decoded. Readahead
+        is disabled by default.
+    :param prefetch_bytes: (optional) Maximum size in bytes of the blocks
+        read ahead.
+    :param prefetch_decompress: (optional) Decompress blocks in the
+        readahead thread rather than when they are decoded.
+
+    Seekable files support random access through a block index, see
+    :meth:`block_index`, :meth:`seek_block` and :meth:`seek_record`.
+    ``len(reader)`` is the number of records in the file.
 
     Example:
 
@@ -29,74 +68,471 @@ class FileReader(BinaryEncoder):
                 print(record)
     """
 
-    def __init__(self, f, header_size=INITIAL_HEADER_SIZE):
+    def __init__(self, f, header_size=INITIAL_HEADER_SIZE, buffer_size=DEFAULT_BUFFER_SIZE, mmap=False,
+                 reader_schema=None, record_type=None, start=None, end=None, prefetch_blocks=0,
+                 prefetch_bytes=DEFAULT_PREFETCH_BYTES, prefetch_decompress=True):
         super(FileReader, self).__init__()
         if isinstance(f, basestring):
             self.f = open(f, 'rb')
         else:
             self.f = f
+        self.path = getattr(self.f, 'name', None)
+        self.buffer_size = buffer_size
+        self.reset_buffer()
+        self._map = None
+        self._index = None
+        self._skip = 0
+        self._prefetcher = None
+        self._prefetch_position = None
+        self.prefetch_blocks = prefetch_blocks
+        self.prefetch_bytes = prefetch_bytes
+        self.prefetch_decompress = prefetch_decompress
+        if mmap:
+            self.map_file()
         header = self.read_header(header_size)
-        metadata = header.get('meta')
-        self.schema = json.loads(ensure_str(metadata.get('avro.schema')))
-        self.codec = ensure_str(metadata.get('avro.codec', 'null'))
-        self.sync_marker = header.get('sync')
+        self.header_end = self.tell()
+        self.apply_header(header, reader_schema, record_type)
+        self.end = end
+        if start is not None:
+            self.sync(start)
+
+    def __len__(self):
+        return self.block_index().record_count
+
+    def __bool__(self):
+        return True
+
+    __nonzero__ = __bool__
+
+    def block_index(self, sidecar=None):
+        """
+        Returns the :class:`quickavro.index.BlockIndex` of the file,
+        building it on first use by walking the block headers without
+        decompressing or decoding any block.
+
+        :param sidecar: (optional) Path of a file the index is loaded
+            from, or saved to when it is missing or out of date. If True,
+            the path of the Avro file with ``.idx`` appended is used.
+        """
+        if self._index is None:
+            if sidecar is True:
+                if not self.path:
+                    raise ValueError("Sidecar indexes require a FileReader opened from a path.")
+                sidecar = self.path + INDEX_SUFFIX
+            if sidecar:
+                self._index = BlockIndex.load(sidecar, self.sync_marker, self.file_size())
+            if self._index is None:
+                self._index = self.build_index()
+                if sidecar:
+                    self._index.save(sidecar)
+        return self._index
+
+    def build_index(self):
+        """
+        Returns a new :class:`quickavro.index.BlockIndex` of the file. The
+        position of the reader is left unchanged.
+        """
+        index = BlockIndex(self.sync_marker, self.file_size())
+        for offset, block_count, block_length in self.scan_blocks():
+            index.append(offset, block_count)
+        return index
+
+    def count(self):
+        """
+        Returns the number of records in the file, reading only the block
+        headers. Block data is skipped without being decompressed.
+        """
+        if self._index is not None:
+            return self._index.record_count
+        return sum(block_count for offset, block_count, block_length in self.scan_blocks())
+
+    def stats(self, exact=False):
+        """
+        Returns a dictionary of statistics about the file computed from the
+        block headers: codec, number of records and blocks, and compressed
+        and uncompressed size of the block data. The uncompressed size of
+        blocks of codecs that do not record it, such as deflate, is only
+        known if exact is True, in which case they are decompressed, and
+        is None otherwise.
+
+        :param exact: (optional) Decompress blocks to compute their
+            uncompressed size when their codec does not record it.
+        """
+        stats = {
+            "codec": self.codec,
+            "records": 0,
+            "blocks": 0,
+            "header_size": self.header_end,
+            "file_size": self.file_size(),
+            "compressed_size": 0,
+            "uncompressed_size": 0
+        }
+        for offset, block_count, block_length in self.scan_blocks():
+            stats["records"] += block_count
+            stats["blocks"] += 1
+            stats["compressed_size"] += block_length
+            if stats["uncompressed_size"] is None:
+                continue
+            size = uncompressed_length(self.codec, self.peek(min(block_length, LENGTH_HEADER_SIZE)), block_length)
+            if size is None and exact:
+                size = len(self.decompress(self.peek(block_length)))
+            if size is None:
+                stats["uncompressed_size"] = None
+            else:
+                stats["uncompressed_size"] += size
+        return stats
+
+    def scan_blocks(self):
+        """
+        Yields the offset, record count and length of every block of the
+        file. Block data is skipped when the iterator is resumed, so it
+        can be peeked at in between. The position of the reader is
+        restored afterwards if the file is seekable, non-seekable files
+        are consumed.
+        """
+        self.stop_prefetch()
+        position = self.tell()
+        if position != self.header_end:
+            self.seek(self.header_end)
+        while self.fill(1):
+            offset = self.tell()
+            block_count = self.read_long()
+            block_length = self.read_long()
+            yield offset, block_count, block_length
+            self.skip_bytes(block_length)
+            if not self.read_sync():
+                raise InvalidSyncData("Block sync marker does not match.")
+        try:
+            self.seek(position)
+        except (AttributeError, IOError, OSError, ValueError):
+            pass
 
     def close(self):
-        self.f.close()
+        prefetcher = self._prefetcher
+        self.stop_prefetch(rewind=False, timeout=PREFETCH_CLOSE_TIMEOUT)
+        if self._map is not None:
+            try:
+                self._buffer.release()
+                self._map.close()
+            except BufferError:
+                # Records iterators still reference blocks of the
+                # mapping, it is unmapped once they are released.
+                pass
+            self._buffer = b""
+            self._map = None
+        # A readahead thread stalled in a read holds the lock of buffered
+        # files, so closing them here would block until the read returns.
+        # The thread closes the file itself once it stops instead.
+        if prefetcher is None or not prefetcher.call_when_stopped(self.f.close):
+            self.f.close()
+
+    def fill(self, size):
+        """
+        Ensures at least size bytes are available in the internal buffer,
+        reading from the underlying file if necessary. Returns the number
+        of bytes available, which is only less than size at end of file.
+        """
+        chunks = []
+        wanted = self.wanted(size, chunks)
+        while wanted:
+            chunks.append(self.f.read(wanted))
+            wanted = self.wanted(size, chunks)
+        return self.extend(chunks)
+
+    def file_size(self):
+        """
+        Returns the size of the underlying file, or None if it is not a
+        regular file.
+        """
+        if self._map is not None:
+            return len(self._map)
+        try:
+            return os.fstat(self.f.fileno()).st_size
+        except (AttributeError, IOError, OSError, ValueError):
+            return None
+
+    def map_file(self):
+        """
+        Memory-maps the underlying file and uses the mapping as the
+        internal buffer, so that no further reads are necessary.
+        """
+        self._map = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._map)
+        self._pos = 0
+        self._offset = 0
+        self._eof = True
 
     def peek(self, size):
-        cur = self.f.tell()
-        data = self.f.read(size)
-        self.f.seek(cur)
-        return data
+        self.fill(size)
+        return self._buffer[self._pos:self._pos+size]
+
+    def read_bytes(self, size):
+        self.fill(size)
+        return self.take(size)
+
+    def read_sync(self):
+        """
+        Reads a sync marker. Returns whether it matches the sync marker of
+        the file.
+        """
+        self.fill(SYNC_SIZE)
+        return self.take_sync()
 
     def read_block(self):
+        self.stop_prefetch()
+        data = self.read_raw_block()
+        if not data:
+            return None
+        data = self.decompress(data)
+        self.block_count += 1
+        return data
+
+    def read_raw_block(self):
+        """
+        Reads the header and compressed data of the next block. Returns
+        None at end of file.
+        """
+        if not self.fill(1):
+            return None
         block_count = self.read_long()
         block_length = self.read_long()
-        data = self.f.read(block_length)
+        data = self.read_bytes(block_length)
         if not data:
             return None
-        if self.codec == "deflate":
-            data = zlib.decompress(data, -15)
-        elif self.codec == "snappy":
-            crc = data[-4:]
-            data = snappy_uncompress(data[:-4])
-            if crc != crc32(data):
-                raise SnappyChecksumError("Snappy CRC32 check has failed.")
-        self.block_count += 1
         return data
 
-    def read_blocks(self):
-        while True:
+    def iter_blocks(self):
+        """
+        Yields the decompressed data of the blocks from the current
+        position, up to the end of the split if one was given. Stops at
+        the first block followed by an invalid sync marker.
+        """
+        if self.prefetch_blocks:
+            for block in self.prefetch():
+                yield block
+            return
+        # A block belongs to the split in which its preceding sync marker
+        # begins.
+        while self.end is None or self.tell() - SYNC_SIZE < self.end:
             block = self.read_block()
             if not block:
                 break
-            for record in self.read(block):
-                yield record
-            sync_marker = self.f.read(16)
-            if sync_marker != self.sync_marker:
+            yield block
+            block = None
+            if not self.read_sync():
+                break
+
+    def readahead(self):
+        """
+        Yields each block read ahead as a pair of the block and its size.
+        The block is a tuple of its data, whether the sync marker
+        following it is valid and the position after the sync marker.
+        Runs in the readahead thread.
+        """
+        while self.end is None or self._offset + self._pos - SYNC_SIZE < self.end:
+            data = self.read_raw_block()
+            if not data:
+                break
+            valid = self.read_sync()
+            if self.prefetch_decompress:
+                data = self.decompress(data)
+            yield (data, valid, self._offset + self._pos), len(data)
+            data = None
+            if not valid:
+                break
+
+    def prefetch(self):
+        """
+        Yields the decompressed data of the blocks from the current
+        position while a background thread reads the next ones ahead,
+        see :meth:`iter_blocks`.
+        """
+        while True:
+            if self._prefetcher is None:
+                self._prefetch_position = self.tell()
+                self._prefetcher = Prefetcher(self.readahead(), self.prefetch_blocks, self.prefetch_bytes)
+            prefetcher = self._prefetcher
+            item = prefetcher.get()
+            if item is None:
+                # The readahead thread was stopped by a seek or scan and
+                # restarts from the new position.
+                if prefetcher.closed:
+                    continue
+                break
+            data, valid, self._prefetch_position = item
+            item = None
+            if not self.prefetch_decompress:
+                data = self.decompress(data)
+            self.block_count += 1
+            yield data
+            data = None
+            if not valid:
                 break
 
+    def stop_prefetch(self, rewind=True, timeout=None):
+        """
+        Stops the readahead thread, if any, discarding the blocks it read
+        ahead. With no timeout this waits for a read in progress in the
+        thread to return, so that the file can be read again.
+
+        :param rewind: (optional) Move the reader back to the first block
+            read ahead that was not consumed, which requires a seekable
+            file.
+        :param timeout: (optional) Maximum number of seconds to wait for
+            the thread, after which it is left to finish on its own. The
+            file must then not be read from again, only closed.
+        """
+        prefetcher = self._prefetcher
+        if prefetcher is None:
+            return
+        self._prefetcher = None
+        prefetcher.close(timeout)
+        if rewind and self._prefetch_position != self._offset + self._pos:
+            self.seek(self._prefetch_position)
+
+    def read_blocks(self):
+        for block in self.iter_blocks():
+            records = self.iter_read(block)
+            if self._skip:
+                records = itertools.islice(records, self._skip, None)
+                self._skip = 0
+            for record in records:
+                yield record
+            # Release the decompressed block so its buffer can be reused.
+            records = block = None
+
+    def read_columns(self, fields=None, use_numpy=None):
+        """
+        Returns an iterator over the blocks of the file decoded into
+        columns, see :meth:`BinaryEncoder.read_columnar`. Each item is an
+        ordered dictionary of field names to columns holding the records
+        of one block.
+
+        :param fields: (optional) Names of the fields to decode.
+        :param use_numpy: (optional) Hold values in numpy arrays rather
+            than :class:`array.array`.
+        """
+        self._skip = 0
+        for block in self.iter_blocks():
+            yield self.read_columnar(block, fields, use_numpy)
+            block = None
+
     def read_header(self, size=INITIAL_HEADER_SIZE):
-        b = b""
         while True:
-            data = self.f.read(size)
-            if len(data) == 0:
-                raise InvalidSchemaError("end of file, unable to find avro header")
-            b += data
-            try:
-                header, offset = read_header(b)
-            except _quickavro.ReadError as error:
-                continue
-            self.f.seek(offset)
-            return header
+            self.fill(self.buffered() + size)
+            header = self.parse_header()
+            if header is not None:
+                return header
 
     def read_long(self):
-        data = self.peek(MAX_VARINT_SIZE)
-        l, offset = super(FileReader, self).read_long(data)
-        cur = self.f.tell()
-        self.f.seek(cur+offset)
-        return l
+        self.fill(MAX_VARINT_SIZE)
+        return self.take_long()
 
-    def records(self):
+    def records(self, workers=None, ordered=True):
+        """
+        Returns an iterator over the records in the file from the current
+        position.
+
+        :param workers: (optional) Number of processes used to decompress
+            and decode blocks in parallel. The file must have been opened
+            from a path.
+        :param ordered: (optional) When decoding in parallel, yield records
+            in file order. If False, records are yielded as soon as any
+            worker decodes a block.
+        """
+        if workers:
+            from .parallel import read_records
+            if not self.path:
+                raise ValueError("Parallel reads require a FileReader opened from a path.")
+            # Workers start from the sync marker preceding the next block
+            start = self.tell() - SYNC_SIZE
+            skip, self._skip = self._skip, 0
+            return read_records(self.path, workers=workers, ordered=ordered, reader_schema=self.reader_schema,
+                                record_type=self._record_type, start=start, end=self.end, skip=skip)
         return self.read_blocks()
+
+    def seek(self, offset):
+        """
+        Moves the reader to offset in the underlying file, discarding the
+        internal buffer. Requires a seekable file unless memory-mapped.
+        """
+        self.stop_prefetch(rewind=False)
+        if self._map is not None:
+            self._pos = offset
+            return
+        self.f.seek(offset)
+        self.reset_buffer(offset)
+
+    def seek_block(self, i):
+        """
+        Moves the reader to the start of block i of the file. Returns the
+        :class:`quickavro.index.BlockEntry` of the block.
+
+        :param i: Position of the block in the file.
+        """
+        block = self.block_index()[i]
+        self.seek(block.offset)
+        self.block_count = i
+        self._skip = 0
+        return block
+
+    def seek_record(self, n):
+        """
+        Moves the reader so that :meth:`records` starts at record n of the
+        file. Only the block holding record n is decoded to get there.
+
+        :param n: Ordinal of the record in the file.
+        """
+        block = self.seek_block(self.block_index().find_record(n))
+        self._skip = n - block.first_record
+        return block
+
+    def skip_bytes(self, size):
+        """
+        Moves the reader size bytes forward, seeking the underlying file
+        instead of reading it when the bytes are not buffered.
+        """
+        if size <= self.buffered() or self._map is not None:
+            self._pos += size
+            return
+        try:
+            self.seek(self.tell() + size)
+        except (AttributeError, IOError, OSError, ValueError):
+            while size > 0:
+                data = self.read_bytes(min(size, self.buffer_size))
+                if not data:
+                    break
+                size -= len(data)
+
+    def sync(self, position):
+        """
+        Moves the reader to the start of the first block whose sync marker
+        begins at or after position. Returns False if no sync marker is
+        found before the end of the file.
+        """
+        self.seek(position)
+        while True:
+            available = self.fill(max(self.buffer_size, SYNC_SIZE))
+            if self._map is not None:
+                index = self._map.find(self.sync_marker, self._pos)
+            else:
+                index = self._buffer.find(self.sync_marker, self._pos)
+            if index >= 0:
+                self._pos = index + SYNC_SIZE
+                return True
+            if self._eof:
+                self._pos += available
+                return False
+            # Keep enough trailing bytes to match a marker split across
+            # two reads.
+            self._pos += max(available - SYNC_SIZE + 1, 0)
+
+    def tell(self):
+        """
+        Returns the position in the underlying file of the next byte
+        that will be parsed. While blocks are read ahead, this is the
+        position after the last block consumed.
+        """
+        if self._prefetcher is not None:
+            return self._prefetch_position
+        return self._offset + self._pos
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compact record types decoded records can be returned as instead of
+dictionaries.
+
+``"tuple"`` records are :func:`collections.namedtuple` instances and
+``"slots"`` records are instances of a class defining ``__slots__``. The
+class of each record schema is generated once per set of field names and
+shared by every encoder using it.
+"""
+
+import threading
+
+from collections import namedtuple
+
+from .errors import *
+from .schema import NAMED_TYPES, fullname, named_types
+
+from ._compat import *
+
+
+RECORD_TYPES = ("dict", "tuple", "slots")
+
+_classes = {}
+_lock = threading.Lock()
+
+
+class SlotsRecord(object):
+    """
+    Base class of the generated ``"slots"`` record classes.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self._fields, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._astuple() == other._astuple()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __iter__(self):
+        return iter(self._astuple())
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return "{0}({1})".format(type(self).__name__, ", ".join(
+            "{0}={1!r}".format(name, getattr(self, name, None)) for name in self._fields))
+
+    def __reduce__(self):
+        return (_rebuild_record, (self._record_name, self._fields, self._astuple()))
+
+    def _astuple(self):
+        return tuple(getattr(self, name, None) for name in self._fields)
+
+    def _asdict(self):
+        return dict(zip(self._fields, self._astuple()))
+
+
+def _rebuild_record(name, fields, values):
+    return record_class(name, fields, "slots")(*values)
+
+
+def _rebuild_tuple(name, fields, values):
+    return record_class(name, fields, "tuple")(*values)
+
+
+def _reduce_tuple(self):
+    # Generated namedtuple classes cannot be found by name when unpickled
+    return (_rebuild_tuple, (self._record_name, self._record_fields, tuple(self)))
+
+
+def record_class(name, fields, record_type):
+    """
+    Returns the class of records with the given fields.
+
+    :param name: Name of the record.
+    :param fields: Names of the fields.
+    :param record_type: ``"tuple"`` or ``"slots"``.
+    """
+    if record_type not in ("tuple", "slots"):
+        raise ValueError("Record type must be one of {0}.".format(", ".join(RECORD_TYPES)))
+    fields = tuple(fields)
+    key = (name, fields, record_type)
+    cls = _classes.get(key)
+    if cls is not None:
+        return cls
+    class_name = str(name.rpartition(".")[2])
+    if record_type == "tuple":
+        cls = namedtuple(class_name, fields, rename=True)
+        cls._record_name = name
+        cls._record_fields = fields
+        cls.__reduce__ = _reduce_tuple
+    else:
+        cls = type(class_name, (SlotsRecord,), {
+            "__slots__": tuple(str(field) for field in fields),
+            "_fields": fields,
+            "_record_name": name
+        })
+    with _lock:
+        return _classes.setdefault(key, cls)
+
+
+def record_classes(schema, record_type, defaults=None):
+    """
+    Returns a dictionary of the full names of the records of a schema to
+    their record class.
+
+    :param schema: Avro schema.
+    :param record_type: ``"tuple"`` or ``"slots"``.
+    :param defaults: (optional) Dictionary of default values of fields
+        missing from the writer schema keyed by record full name, as
+        returned by :func:`quickavro.schema.resolve`. Fields with defaults
+        come after the other fields.
+    """
+    classes = {}
+    for name, definition in named_types(schema).items():
+        if definition.get("type") not in ("record", "error"):
+            continue
+        fields = [field["name"] for field in definition["fields"]]
+        fields.extend((defaults or {}).get(name, {}))
+        classes[name] = record_class(name, fields, record_type)
+    return classes
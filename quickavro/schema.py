@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+
+"""
+Helpers for manipulating Avro schemas represented as Python objects.
+"""
+
+import copy
+import json
+import threading
+
+from collections import OrderedDict
+
+from ._quickavro import Schema, fingerprint64
+
+from .constants import *
+from .errors import *
+
+from ._compat import *
+
+
+PRIMITIVE_TYPES = {"null", "boolean", "int", "long", "float", "double", "bytes", "string"}
+NAMED_TYPES = {"record", "error", "enum", "fixed"}
+
+# Attributes kept by the Parsing Canonical Form, in canonical order.
+CANONICAL_ATTRIBUTES = ("name", "type", "fields", "symbols", "items", "values", "size")
+
+
+def fullname(name, namespace=None):
+    """
+    Returns the full name of a named type.
+
+    :param name: Name of the type, possibly already qualified.
+    :param namespace: (optional) Enclosing namespace.
+    """
+    if "." in name or not namespace:
+        return name
+    return "{0}.{1}".format(namespace, name)
+
+
+def named_types(schema, namespace=None, types=None):
+    """
+    Returns a dictionary of the definitions of all named types in schema
+    keyed by full name.
+
+    :param schema: Avro schema.
+    :param namespace: (optional) Enclosing namespace.
+    """
+    if types is None:
+        types = {}
+    if isinstance(schema, list):
+        for branch in schema:
+            named_types(branch, namespace, types)
+    elif isinstance(schema, dict):
+        t = schema.get("type")
+        if t in NAMED_TYPES:
+            name = fullname(schema["name"], schema.get("namespace", namespace))
+            types.setdefault(name, schema)
+            namespace = name.rpartition(".")[0] or None
+            for field in schema.get("fields", []):
+                named_types(field["type"], namespace, types)
+        elif t == "array":
+            named_types(schema["items"], namespace, types)
+        elif t == "map":
+            named_types(schema["values"], namespace, types)
+        elif isinstance(t, (dict, list)):
+            named_types(t, namespace, types)
+    return types
+
+
+def inline_references(schema, types, namespace=None, defined=None):
+    """
+    Returns a copy of schema where references to named types that are
+    not defined within schema itself are replaced by their definition
+    from types.
+
+    :param schema: Avro schema.
+    :param types: Dictionary of named type definitions keyed by full name.
+    :param namespace: (optional) Enclosing namespace.
+    """
+    if defined is None:
+        defined = set()
+    if isinstance(schema, basestring):
+        if schema in PRIMITIVE_TYPES:
+            return schema
+        name = schema if schema in types else fullname(schema, namespace)
+        if name in defined or name not in types:
+            return schema
+        return inline_references(copy.deepcopy(types[name]), types, namespace, defined)
+    if isinstance(schema, list):
+        return [inline_references(branch, types, namespace, defined) for branch in schema]
+    schema = dict(schema)
+    t = schema.get("type")
+    if t in NAMED_TYPES:
+        name = fullname(schema["name"], schema.get("namespace", namespace))
+        defined.add(name)
+        namespace = name.rpartition(".")[0] or None
+        if "fields" in schema:
+            schema["fields"] = [
+                dict(field, type=inline_references(field["type"], types, namespace, defined))
+                for field in schema["fields"]
+            ]
+    elif t == "array":
+        schema["items"] = inline_references(schema["items"], types, namespace, defined)
+    elif t == "map":
+        schema["values"] = inline_references(schema["values"], types, namespace, defined)
+    elif isinstance(t, (basestring, dict, list)):
+        schema["type"] = inline_references(t, types, namespace, defined)
+    return schema
+
+
+def project(schema, fields):
+    """
+    Returns a reader schema for a record schema that only keeps the given
+    fields. Named types used by the kept fields but defined in dropped
+    fields are moved into the projection.
+
+    :param schema: Avro record schema.
+    :param fields: Names of the fields to keep.
+    """
+    if not isinstance(schema, dict) or schema.get("type") != "record":
+        raise InvalidSchemaError("Only record schemas can be projected.")
+    by_name = dict((field["name"], field) for field in schema["fields"])
+    for name in fields:
+        if name not in by_name:
+            raise InvalidSchemaError("Field {0} is not in the schema.".format(name))
+    projection = dict(schema, fields=[by_name[name] for name in fields])
+    return inline_references(projection, named_types(schema))
+
+
+RESOLUTION_CACHE_SIZE = 256
+
+_resolutions = {}
+
+
+def default_value(schema, value, types, namespace=None):
+    """
+    Returns the Python value of the JSON encoded default value of a field.
+
+    :param schema: Avro schema of the field.
+    :param value: Default value as parsed from the schema JSON.
+    :param types: Dictionary of named type definitions keyed by full name.
+    :param namespace: (optional) Enclosing namespace.
+    """
+    if isinstance(schema, basestring):
+        if schema in PRIMITIVE_TYPES:
+            schema = {"type": schema}
+        else:
+            name = schema if schema in types else fullname(schema, namespace)
+            schema = types[name]
+    if isinstance(schema, list):
+        # Defaults of unions correspond to their first branch.
+        return default_value(schema[0], value, types, namespace)
+    t = schema.get("type")
+    if isinstance(t, (dict, list)):
+        return default_value(t, value, types, namespace)
+    if t in NAMED_TYPES:
+        namespace = fullname(schema["name"], schema.get("namespace", namespace)).rpartition(".")[0] or None
+    if t in ("bytes", "fixed"):
+        # JSON defaults of bytes map code points 0-255 to byte values.
+        return value.encode("latin-1")
+    if t in ("float", "double"):
+        return float(value)
+    if t in ("record", "error"):
+        return dict(
+            (field["name"], default_value(field["type"], value.get(field["name"], field.get("default")),
+                                          types, namespace))
+            for field in schema["fields"]
+        )
+    if t == "array":
+        return [default_value(schema["items"], item, types, namespace) for item in value]
+    if t == "map":
+        return dict((k, default_value(schema["values"], v, types, namespace)) for k, v in value.items())
+    return value
+
+
+def _resolve_type(name, schema, writer_types, reader_types, defaults):
+    """
+    Returns the definition of a named reader type as resolved against the
+    writer type of the same name.
+    """
+    writer = writer_types.get(name)
+    if not isinstance(writer, dict) or writer.get("type") != schema["type"]:
+        return schema
+    schema = dict(schema)
+    if schema["type"] in ("record", "error"):
+        namespace = name.rpartition(".")[0] or None
+        writer_fields = set(field["name"] for field in writer["fields"])
+        fields = []
+        for field in schema["fields"]:
+            if field["name"] in writer_fields:
+                fields.append(field)
+            elif "default" in field:
+                defaults.setdefault(name, {})[field["name"]] = default_value(
+                    field["type"], field["default"], reader_types, namespace)
+            else:
+                raise InvalidSchemaError(
+                    "Field {0} of {1} is not in the writer schema and has no default.".format(field["name"], name))
+        schema["fields"] = fields
+    elif schema["type"] == "enum":
+        # Enums are decoded by symbol index, decoding with the symbols of
+        # the writer yields the symbol that was written.
+        schema["symbols"] = writer["symbols"]
+    return schema
+
+
+def _rebuild(schema, types, namespace=None, defined=None):
+    """
+    Returns a copy of schema where each named type is replaced by its
+    definition from types at its first occurrence and by a reference to
+    its full name afterwards.
+    """
+    if defined is None:
+        defined = set()
+    if isinstance(schema, list):
+        return [_rebuild(branch, types, namespace, defined) for branch in schema]
+    if isinstance(schema, basestring):
+        if schema in PRIMITIVE_TYPES:
+            return schema
+        name = schema if schema in types else fullname(schema, namespace)
+    elif schema.get("type") in NAMED_TYPES:
+        name = fullname(schema["name"], schema.get("namespace", namespace))
+    else:
+        schema = dict(schema)
+        t = schema.get("type")
+        if t == "array":
+            schema["items"] = _rebuild(schema["items"], types, namespace, defined)
+        elif t == "map":
+            schema["values"] = _rebuild(schema["values"], types, namespace, defined)
+        elif isinstance(t, (basestring, dict, list)):
+            schema["type"] = _rebuild(t, types, namespace, defined)
+        return schema
+    if name in defined or name not in types:
+        return name
+    defined.add(name)
+    namespace, _, short_name = name.rpartition(".")
+    schema = dict(types[name], name=short_name)
+    schema.pop("namespace", None)
+    if namespace:
+        schema["namespace"] = namespace
+    namespace = namespace or None
+    if "fields" in schema:
+        schema["fields"] = [
+            dict(field, type=_rebuild(field["type"], types, namespace, defined))
+            for field in schema["fields"]
+        ]
+    return schema
+
+
+def resolve(writer, reader):
+    """
+    Resolves a reader schema against the schema data was written with.
+    Returns a tuple of the schema to decode with and a dictionary of the
+    default values of fields only in the reader schema, keyed by the full
+    name of their record. Results are cached per pair of schemas.
+
+    Fields only in the writer schema are skipped and int, long and float
+    values are promoted by the decoder, the schema returned only drops the
+    reader fields it cannot find in the writer schema.
+
+    :param writer: Avro schema the data was written with.
+    :param reader: Avro schema to read data as.
+    """
+    key = (json.dumps(writer, sort_keys=True), json.dumps(reader, sort_keys=True))
+    resolution = _resolutions.get(key)
+    if resolution is not None:
+        return resolution
+    writer_types = named_types(writer)
+    reader_types = named_types(reader)
+    defaults = {}
+    types = dict(
+        (name, _resolve_type(name, schema, writer_types, reader_types, defaults))
+        for name, schema in reader_types.items()
+    )
+    resolution = (_rebuild(reader, types), defaults)
+    if len(_resolutions) >= RESOLUTION_CACHE_SIZE:
+        _resolutions.clear()
+    _resolutions[key] = resolution
+    return resolution
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def _canonical_form(schema, namespace):
+    if isinstance(schema, basestring):
+        if schema not in PRIMITIVE_TYPES:
+            schema = fullname(schema, namespace)
+        return _dumps(schema)
+    if isinstance(schema, list):
+        return "[" + ",".join(_canonical_form(branch, namespace) for branch in schema) + "]"
+    t = schema["type"]
+    if isinstance(t, (dict, list)) or t in PRIMITIVE_TYPES or t not in ("array", "map") and t not in NAMED_TYPES:
+        return _canonical_form(t, namespace)
+    attributes = dict(schema)
+    if t in NAMED_TYPES:
+        attributes["name"] = fullname(schema["name"], schema.get("namespace", namespace))
+        namespace = attributes["name"].rpartition(".")[0] or None
+    parts = []
+    for attribute in CANONICAL_ATTRIBUTES:
+        if attribute not in attributes:
+            continue
+        value = attributes[attribute]
+        if attribute == "fields":
+            value = "[" + ",".join(
+                '{{"name":{0},"type":{1}}}'.format(_dumps(field["name"]), _canonical_form(field["type"], namespace))
+                for field in value
+            ) + "]"
+        elif attribute in ("items", "values"):
+            value = _canonical_form(value, namespace)
+        elif attribute == "size":
+            value = str(int(value))
+        else:
+            value = _dumps(value)
+        parts.append('"{0}":{1}'.format(attribute, value))
+    return "{" + ",".join(parts) + "}"
+
+
+def canonical_form(schema):
+    """
+    Returns the Parsing Canonical Form of a schema, the JSON serialization
+    that only keeps the attributes relevant to parsing data with full
+    names and no whitespace.
+
+    :param schema: Avro schema.
+    """
+    return _canonical_form(schema, None)
+
+
+def fingerprint(schema):
+    """
+    Returns the 64-bit Rabin fingerprint (CRC-64-AVRO) of the Parsing
+    Canonical Form of a schema.
+
+    :param schema: Avro schema.
+    """
+    return fingerprint64(ensure_bytes(canonical_form(schema)))
+
+
+class SchemaCache(object):
+    """
+    A thread-safe LRU cache of compiled schemas keyed by fingerprint.
+    Compiled schemas hold the parsed schema, its value interface and its
+    conversion plan, and are shared by every encoder they are set on.
+
+    :param maxsize: (optional) Maximum number of compiled schemas kept.
+    """
+
+    def __init__(self, maxsize=DEFAULT_SCHEMA_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._schemas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._schemas)
+
+    def clear(self):
+        with self._lock:
+            self._schemas.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get(self, schema):
+        """
+        Returns the compiled schema for schema, compiling it if it is not
+        in the cache.
+
+        :param schema: Avro schema.
+        """
+        try:
+            key = fingerprint(schema)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            # Malformed schemas have no canonical form, compiling them
+            # raises the schema error.
+            return Schema(json.dumps(schema))
+        with self._lock:
+            compiled = self._schemas.pop(key, None)
+            if compiled is not None:
+                self.hits += 1
+                self._schemas[key] = compiled
+                return compiled
+            self.misses += 1
+        compiled = Schema(json.dumps(schema))
+        with self._lock:
+            self._schemas[key] = compiled
+            while len(self._schemas) > self.maxsize:
+                self._schemas.popitem(last=False)
+        return compiled
+
+    def stats(self):
+        """
+        Returns a dictionary with the hits, misses and size of the cache.
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self), "maxsize": self.maxsize}
+
+
+schema_cache = SchemaCache()
@@ -1,15 +1,14 @@
 # -*- coding: utf-8 -*-
 
 
-import binascii
-import struct
-
 from . import _quickavro
 
 
 def crc32(s):
-    data = binascii.crc32(s) & 0xFFFFFFFF
-    return struct.pack('>I', data)
+    """
+    Returns the big-endian CRC32 checksum of str
+    """
+    return _quickavro.crc32(s)
 
 def snappy_compress(data):
     """
@@ -23,8 +22,40 @@ def snappy_uncompress(data):
     """
     return _quickavro.Snappy.uncompress(data)
 
+def snappy_uncompressed_length(data):
+    """
+    Returns the uncompressed length stored in the varint preamble of
+    snappy compressed str
+    """
+    length = shift = 0
+    for byte in bytearray(data[:5]):
+        length |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return length
+        shift += 7
+    raise ValueError("Invalid snappy preamble.")
+
 def snappy_validate(data):
     """
     Validate snappy compressed str
     """
     return _quickavro.Snappy.validate(data)
+
+def zstd_compress(data, level=3):
+    """
+    Compress str with Zstandard
+    """
+    return _quickavro.Zstd.compress(data, level)
+
+def zstd_uncompress(data):
+    """
+    Uncompress str with Zstandard
+    """
+    return _quickavro.Zstd.uncompress(data)
+
+def zstd_uncompressed_length(data):
+    """
+    Returns the uncompressed length stored in the header of a Zstandard
+    frame, or None if the frame does not record it
+    """
+    return _quickavro.Zstd.uncompressed_length(data)
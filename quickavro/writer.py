@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import collections
+from multiprocessing.pool import ThreadPool
+
 from .constants import *
 from .encoder import *
 from .errors import *
@@ -17,6 +20,15 @@ class FileWriter(BinaryEncoder):
         will write into.
     :param codec: (optional) Compression codec used with
         :class:`FileWriter`.
+    :param compress_workers: (optional) Number of threads used to compress
+        blocks. When set, full blocks are compressed in the background
+        while records continue to be encoded, and written in order once
+        compressed. The output is identical to the serial path.
+    :param level: (optional) Compression level of the codec, see
+        :attr:`BinaryEncoder.level`.
+    :param flush_policy: (optional) Policy deciding when blocks end, see
+        :mod:`quickavro.flush`. Blocks end after
+        :data:`DEFAULT_SYNC_INTERVAL` bytes by default.
 
     Example:
 
@@ -44,25 +56,100 @@ class FileWriter(BinaryEncoder):
                 writer.write_record(record)
     """
 
-    def __init__(self, f, codec="null"):
-        super(FileWriter, self).__init__(codec=codec)
+    def __init__(self, f, codec="null", compress_workers=0, level=None, flush_policy=None):
+        super(FileWriter, self).__init__(codec=codec, level=level, flush_policy=flush_policy)
         if isinstance(f, basestring):
             self.f = open(f, 'wb')
         else:
             self.f = f
+        self.pool = None
+        self.pending = collections.deque()
+        if compress_workers:
+            self.pool = ThreadPool(compress_workers)
+            self.max_pending = 2 * compress_workers
 
     def write_record(self, record):
-        if self.block_size >= DEFAULT_SYNC_INTERVAL:
+        if self.flush_policy.should_flush(self):
             self.f.write(self.flush())
         super(FileWriter, self).write_record(record)
 
+    def write_records(self, records):
+        """
+        Writes all records of an iterable. Records are serialized in
+        batches directly into block payloads, which is considerably
+        faster than calling :meth:`write_record` for each record.
+
+        :param records: Iterable of records.
+        """
+        records = iter(records)
+        while True:
+            if self.flush_policy.should_flush(self):
+                self.f.write(self.flush())
+            if not self.fill_block(records):
+                break
+
+    def write_columns(self, columns):
+        """
+        Writes records given as columns, a dictionary of field names to
+        sequences of values, see :meth:`BinaryEncoder.write_columns`.
+        Records are serialized column-wise without building a dictionary
+        per record.
+
+        :param columns: Dictionary of field names to columns.
+        """
+        columns = self.column_batch(columns)
+        offset = 0
+        while True:
+            if self.flush_policy.should_flush(self):
+                self.f.write(self.flush())
+            block_count = self.fill_block_columns(columns, offset)
+            if not block_count:
+                break
+            offset += block_count
+
     def flush(self):
         if self.block_count == 0:
             self.f.write(self.header)
             self.block_count += 1
-        return self.write_block()
+        if self.pool is None:
+            return self.write_block()
+        block_count, data = self.take_block()
+        self.pending.append((block_count, len(data), self.pool.apply_async(self.compress, (data,))))
+        self.drain(self.max_pending)
+        return b""
+
+    def flush_if_due(self):
+        """
+        Writes the current block if the flush policy says it should end.
+        Policies such as :class:`quickavro.flush.AgePolicy` are otherwise
+        only checked when records are written, so writers receiving
+        records slowly can call this periodically. Returns True if a
+        block was written.
+        """
+        if not self.block or not self.flush_policy.should_flush(self):
+            return False
+        self.f.write(self.flush())
+        return True
+
+    def drain(self, limit=0):
+        """
+        Writes blocks compressed in the background, in the order they
+        were submitted, until at most limit blocks are still pending.
+
+        :param limit: (optional) Number of blocks allowed to remain
+            pending.
+        """
+        while len(self.pending) > limit:
+            block_count, size, result = self.pending.popleft()
+            compressed = result.get()
+            self.flush_policy.block_written(size, len(compressed), block_count)
+            self.f.write(self.pack_block(block_count, compressed))
 
     def close(self):
         if self.block:
             self.f.write(self.flush())
+        if self.pool is not None:
+            self.drain()
+            self.pool.close()
+            self.pool.join()
         self.f.close()
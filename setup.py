@@ -92,6 +92,13 @@ source_files = [
         "url": "https://github.com/madler/zlib/archive/v{0}.tar.gz",
         "dir": "zlib",
         "filename": "zlib-{0}.tar.gz"
+    },
+    {
+        "name": "Zstandard",
+        "version": "1.4.5",
+        "url": "https://github.com/facebook/zstd/releases/download/v{0}/zstd-{0}.tar.gz",
+        "dir": "zstd",
+        "filename": "zstd-{0}.tar.gz"
     }
 ]
 
@@ -109,7 +116,10 @@ def compile_vendor_static(static_build_dir, static_lib_name):
         'vendor/jansson',
         'vendor/jansson/src',
         'vendor/avro/lang/c/src',
-        'vendor/avro/lang/c/src/avro'
+        'vendor/avro/lang/c/src/avro',
+        'vendor/zlib',
+        'vendor/zstd/lib',
+        'vendor/zstd/lib/common'
     ]   
     sources = [ 
         'vendor/snappy/snappy-c.cc',
@@ -162,6 +172,42 @@ def compile_vendor_static(static_build_dir, static_lib_name):
         'vendor/avro/lang/c/src/value-write.c',
         'vendor/avro/lang/c/src/value.c',
         'vendor/avro/lang/c/src/wrapped-buffer.c',
+        'vendor/zlib/adler32.c',
+        'vendor/zlib/compress.c',
+        'vendor/zlib/crc32.c',
+        'vendor/zlib/deflate.c',
+        'vendor/zlib/infback.c',
+        'vendor/zlib/inffast.c',
+        'vendor/zlib/inflate.c',
+        'vendor/zlib/inftrees.c',
+        'vendor/zlib/trees.c',
+        'vendor/zlib/uncompr.c',
+        'vendor/zlib/zutil.c',
+        'vendor/zstd/lib/common/debug.c',
+        'vendor/zstd/lib/common/entropy_common.c',
+        'vendor/zstd/lib/common/error_private.c',
+        'vendor/zstd/lib/common/fse_decompress.c',
+        'vendor/zstd/lib/common/pool.c',
+        'vendor/zstd/lib/common/threading.c',
+        'vendor/zstd/lib/common/xxhash.c',
+        'vendor/zstd/lib/common/zstd_common.c',
+        'vendor/zstd/lib/compress/fse_compress.c',
+        'vendor/zstd/lib/compress/hist.c',
+        'vendor/zstd/lib/compress/huf_compress.c',
+        'vendor/zstd/lib/compress/zstd_compress.c',
+        'vendor/zstd/lib/compress/zstd_compress_literals.c',
+        'vendor/zstd/lib/compress/zstd_compress_sequences.c',
+        'vendor/zstd/lib/compress/zstd_compress_superblock.c',
+        'vendor/zstd/lib/compress/zstd_double_fast.c',
+        'vendor/zstd/lib/compress/zstd_fast.c',
+        'vendor/zstd/lib/compress/zstd_lazy.c',
+        'vendor/zstd/lib/compress/zstd_ldm.c',
+        'vendor/zstd/lib/compress/zstd_opt.c',
+        'vendor/zstd/lib/compress/zstdmt_compress.c',
+        'vendor/zstd/lib/decompress/huf_decompress.c',
+        'vendor/zstd/lib/decompress/zstd_ddict.c',
+        'vendor/zstd/lib/decompress/zstd_decompress.c',
+        'vendor/zstd/lib/decompress/zstd_decompress_block.c',
     ]
     depends = [
         'vendor/snappy/snappy-c.h',
@@ -202,6 +248,12 @@ def compile_vendor_static(static_build_dir, static_lib_name):
         'vendor/avro/lang/c/src/avro/resolver.h',
         'vendor/avro/lang/c/src/avro/schema.h',
         'vendor/avro/lang/c/src/avro/value.h',
+        'vendor/zlib/zconf.h',
+        'vendor/zlib/zlib.h',
+        'vendor/zstd/lib/zstd.h',
+        'vendor/zstd/lib/common/zstd_internal.h',
+        'vendor/zstd/lib/compress/zstd_compress_internal.h',
+        'vendor/zstd/lib/decompress/zstd_decompress_internal.h',
     ]
     extra_compile_args = ['-O3', '-fPIC', '-g', '-Wall', '-Wfatal-errors', '-DHAVE_STDINT_H', '-DJSON_INLINE=inline', '-DTHREADSAFE=true']
     touch('vendor/jansson/src/jansson_config.h')
@@ -221,20 +273,32 @@ def compile_ext(static_lib):
         'vendor/jansson/src',
         'vendor/avro/lang/c/src',
         'vendor/avro/lang/c/src/avro',
+        'vendor/zlib',
+        'vendor/zstd/lib',
     ]
     libraries = ['stdc++']
     library_dirs = []
     sources = [
+        'src/codecobject.c',
+        'src/columnar.c',
         'src/convert.c',
         'src/encoderobject.c',
+        'src/iteratorobject.c',
+        'src/schemaobject.c',
         'src/snappyobject.c',
+        'src/zstdobject.c',
         'src/module.c',
     ]
     depends = [
+        'src/codecobject.h',
+        'src/columnar.h',
         'src/compat.h',
         'src/convert.h',
         'src/encoderobject.h',
+        'src/iteratorobject.h',
+        'src/schemaobject.h',
         'src/snappyobject.h',
+        'src/zstdobject.h',
         "src/quickavro.h",
     ]
     extra_compile_args = ['-Wfatal-errors']
@@ -0,0 +1,615 @@
+/*
+ * Copyright 2016 Chris Marshall
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#include "codecobject.h"
+#include "compat.h"
+#include <snappy-c.h>
+
+
+// zlib and crc32 take the length of their input as a uInt.
+#define ZLIB_CHUNK_SIZE (1U << 30)
+#define CRC_SIZE 4
+
+
+static uint32_t crc32_of(const char* data, size_t length) {
+    uLong crc = crc32(0L, Z_NULL, 0);
+    while (length > 0) {
+        uInt chunk = length > ZLIB_CHUNK_SIZE ? ZLIB_CHUNK_SIZE : (uInt)length;
+        crc = crc32(crc, (const Bytef*)data, chunk);
+        data += chunk;
+        length -= chunk;
+    }
+    return (uint32_t)crc;
+}
+
+static void write_crc(char* output, uint32_t crc) {
+    output[0] = (char)(crc >> 24);
+    output[1] = (char)(crc >> 16);
+    output[2] = (char)(crc >> 8);
+    output[3] = (char)crc;
+}
+
+static uint32_t read_crc(const char* input) {
+    const unsigned char* p = (const unsigned char*)input;
+    return ((uint32_t)p[0] << 24) | ((uint32_t)p[1] << 16) | ((uint32_t)p[2] << 8) | (uint32_t)p[3];
+}
+
+PyObject* codec_crc32(PyObject* self, PyObject* args) {
+    Py_buffer buffer;
+    char output[CRC_SIZE];
+
+    if (!PyArg_ParseTuple(args, "s*", &buffer)) {
+        return NULL;
+    }
+    write_crc(output, crc32_of(buffer.buf, buffer.len));
+    PyBuffer_Release(&buffer);
+    return PyBytes_FromStringAndSize(output, CRC_SIZE);
+}
+
+static void raise_checksum_error(void) {
+    PyObject* errors = PyImport_ImportModule("quickavro.errors");
+    PyObject* error = NULL;
+
+    if (errors != NULL) {
+        error = PyObject_GetAttrString(errors, "SnappyChecksumError");
+        Py_DECREF(errors);
+    }
+    if (error == NULL) {
+        return;
+    }
+    PyErr_SetString(error, "Snappy CRC32 check has failed.");
+    Py_DECREF(error);
+}
+
+/*
+ * Returns a new reference to a scratch bytearray of at least size bytes.
+ * The buffer in slot is reused if nothing else references it, which also
+ * means no memoryview of it is alive. Otherwise it is replaced by a new
+ * buffer. The caller holds its reference while writing into the buffer,
+ * so concurrent calls never share one.
+ */
+static PyObject* codec_scratch(PyObject** slot, Py_ssize_t size) {
+    PyObject* buffer = *slot;
+
+    if (size < 1) {
+        size = 1;
+    }
+    if (buffer != NULL && Py_REFCNT(buffer) == 1) {
+        if (PyByteArray_GET_SIZE(buffer) < size && PyByteArray_Resize(buffer, size) < 0) {
+            return NULL;
+        }
+        Py_INCREF(buffer);
+        return buffer;
+    }
+    buffer = PyByteArray_FromStringAndSize(NULL, size);
+    if (buffer == NULL) {
+        return NULL;
+    }
+    Py_XDECREF(*slot);
+    *slot = buffer;
+    Py_INCREF(buffer);
+    return buffer;
+}
+
+/*
+ * Returns a memoryview of the first length bytes of buffer and releases
+ * the caller's reference to buffer.
+ */
+static PyObject* codec_view(PyObject* buffer, Py_ssize_t length) {
+    PyObject* view = PyMemoryView_FromObject(buffer);
+    PyObject* result = NULL;
+
+    Py_DECREF(buffer);
+    if (view == NULL) {
+        return NULL;
+    }
+    result = PySequence_GetSlice(view, 0, length);
+    Py_DECREF(view);
+    return result;
+}
+
+/*
+ * Doubles the size of a scratch buffer while a codec is running without
+ * the GIL, which must be reacquired around the call.
+ */
+static int codec_grow(PyObject* buffer) {
+    Py_ssize_t size = PyByteArray_GET_SIZE(buffer);
+
+    return PyByteArray_Resize(buffer, size * 2);
+}
+
+static int deflate_stream_init(Codec* self, z_stream* stream, int shared) {
+    if (shared && self->deflate_ready) {
+        return deflateReset(stream);
+    }
+    memset(stream, 0, sizeof(z_stream));
+    if (deflateInit2(stream, self->level, Z_DEFLATED, -15, 8, Z_DEFAULT_STRATEGY) != Z_OK) {
+        return Z_STREAM_ERROR;
+    }
+    if (shared) {
+        self->deflate_ready = 1;
+    }
+    return Z_OK;
+}
+
+static int inflate_stream_init(Codec* self, z_stream* stream, int shared) {
+    if (shared && self->inflate_ready) {
+        return inflateReset(stream);
+    }
+    memset(stream, 0, sizeof(z_stream));
+    if (inflateInit2(stream, -15) != Z_OK) {
+        return Z_STREAM_ERROR;
+    }
+    if (shared) {
+        self->inflate_ready = 1;
+    }
+    return Z_OK;
+}
+
+static PyObject* deflate_compress(Codec* self, Py_buffer* input, int shared) {
+    z_stream local;
+    z_stream* stream = shared ? &self->deflate_stream : &local;
+    uLong bound = compressBound(input->len);
+    PyObject* buffer;
+    int status;
+
+    if (input->len > ZLIB_CHUNK_SIZE) {
+        PyErr_SetString(PyExc_ValueError, "Block is too large to compress with deflate.");
+        return NULL;
+    }
+    buffer = codec_scratch(&self->compress_buffer, bound);
+    if (buffer == NULL) {
+        return NULL;
+    }
+    if (deflate_stream_init(self, stream, shared) != Z_OK) {
+        Py_DECREF(buffer);
+        PyErr_SetString(PyExc_ValueError, "Unable to initialize deflate stream.");
+        return NULL;
+    }
+    stream->next_in = (Bytef*)input->buf;
+    stream->avail_in = (uInt)input->len;
+    stream->next_out = (Bytef*)PyByteArray_AS_STRING(buffer);
+    stream->avail_out = (uInt)bound;
+    Py_BEGIN_ALLOW_THREADS
+    status = deflate(stream, Z_FINISH);
+    Py_END_ALLOW_THREADS
+    uLong length = stream->total_out;
+    if (!shared) {
+        deflateEnd(stream);
+    }
+    if (status != Z_STREAM_END) {
+        Py_DECREF(buffer);
+        PyErr_SetString(PyExc_ValueError, "Deflate compression failed.");
+        return NULL;
+    }
+    return codec_view(buffer, length);
+}
+
+static PyObject* deflate_decompress(Codec* self, Py_buffer* input, int shared) {
+    z_stream local;
+    z_stream* stream = shared ? &self->inflate_stream : &local;
+    PyObject* buffer;
+    Py_ssize_t size = input->len * 4;
+    int status = Z_OK;
+    int grow_failed = 0;
+
+    if (input->len > ZLIB_CHUNK_SIZE) {
+        PyErr_SetString(PyExc_ValueError, "Block is too large to decompress with deflate.");
+        return NULL;
+    }
+    if (self->decompress_buffer != NULL && PyByteArray_GET_SIZE(self->decompress_buffer) > size) {
+        size = PyByteArray_GET_SIZE(self->decompress_buffer);
+    }
+    buffer = codec_scratch(&self->decompress_buffer, size);
+    if (buffer == NULL) {
+        return NULL;
+    }
+    if (inflate_stream_init(self, stream, shared) != Z_OK) {
+        Py_DECREF(buffer);
+        PyErr_SetString(PyExc_ValueError, "Unable to initialize deflate stream.");
+        return NULL;
+    }
+    stream->next_in = (Bytef*)input->buf;
+    stream->avail_in = (uInt)input->len;
+    Py_BEGIN_ALLOW_THREADS
+    for (;;) {
+        size = PyByteArray_GET_SIZE(buffer);
+        if (size - (Py_ssize_t)stream->total_out > ZLIB_CHUNK_SIZE) {
+            size = stream->total_out + ZLIB_CHUNK_SIZE;
+        }
+        stream->next_out = (Bytef*)PyByteArray_AS_STRING(buffer) + stream->total_out;
+        stream->avail_out = (uInt)(size - stream->total_out);
+        status = inflate(stream, Z_NO_FLUSH);
+        if (status == Z_STREAM_END || (status != Z_OK && status != Z_BUF_ERROR)) {
+            break;
+        }
+        if (stream->avail_out > 0) {
+            // The input ended before the end of the deflate stream.
+            status = Z_DATA_ERROR;
+            break;
+        }
+        Py_BLOCK_THREADS
+        grow_failed = codec_grow(buffer) < 0;
+        Py_UNBLOCK_THREADS
+        if (grow_failed) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    uLong length = stream->total_out;
+    if (!shared) {
+        inflateEnd(stream);
+    }
+    if (grow_failed) {
+        Py_DECREF(buffer);
+        return NULL;
+    }
+    if (status != Z_STREAM_END) {
+        Py_DECREF(buffer);
+        PyErr_SetString(PyExc_ValueError, "Invalid deflate data.");
+        return NULL;
+    }
+    return codec_view(buffer, length);
+}
+
+static PyObject* snappy_codec_compress(Codec* self, Py_buffer* input) {
+    size_t length = snappy_max_compressed_length(input->len);
+    PyObject* buffer = codec_scratch(&self->compress_buffer, length + CRC_SIZE);
+    snappy_status status;
+    char* output;
+
+    if (buffer == NULL) {
+        return NULL;
+    }
+    output = PyByteArray_AS_STRING(buffer);
+    Py_BEGIN_ALLOW_THREADS
+    status = snappy_compress(input->buf, input->len, output, &length);
+    if (status == SNAPPY_OK) {
+        write_crc(output + length, crc32_of(input->buf, input->len));
+    }
+    Py_END_ALLOW_THREADS
+    if (status != SNAPPY_OK) {
+        Py_DECREF(buffer);
+        PyErr_SetString(PyExc_ValueError, "Snappy compression failed.");
+        return NULL;
+    }
+    return codec_view(buffer, length + CRC_SIZE);
+}
+
+static PyObject* snappy_codec_decompress(Codec* self, Py_buffer* input) {
+    size_t input_length = input->len - CRC_SIZE;
+    size_t length;
+    PyObject* buffer;
+    snappy_status status;
+    int valid;
+    char* output;
+
+    if (input->len < CRC_SIZE || snappy_uncompressed_length(input->buf, input_length, &length) != SNAPPY_OK) {
+        PyErr_SetString(PyExc_ValueError, "Invalid snappy data.");
+        return NULL;
+    }
+    buffer = codec_scratch(&self->decompress_buffer, length);
+    if (buffer == NULL) {
+        return NULL;
+    }
+    output = PyByteArray_AS_STRING(buffer);
+    Py_BEGIN_ALLOW_THREADS
+    status = snappy_uncompress(input->buf, input_length, output, &length);
+    valid = status == SNAPPY_OK && crc32_of(output, length) == read_crc((const char*)input->buf + input_length);
+    Py_END_ALLOW_THREADS
+    if (status != SNAPPY_OK) {
+        Py_DECREF(buffer);
+        PyErr_SetString(PyExc_ValueError, "Invalid snappy data.");
+        return NULL;
+    }
+    if (!valid) {
+        Py_DECREF(buffer);
+        raise_checksum_error();
+        return NULL;
+    }
+    return codec_view(buffer, length);
+}
+
+static PyObject* zstd_codec_compress(Codec* self, Py_buffer* input, int shared) {
+    size_t length = ZSTD_compressBound(input->len);
+    PyObject* buffer;
+    ZSTD_CCtx* cctx;
+    char* output;
+
+    if (shared && self->cctx == NULL) {
+        self->cctx = ZSTD_createCCtx();
+    }
+    cctx = shared ? self->cctx : ZSTD_createCCtx();
+    if (cctx == NULL) {
+        return PyErr_NoMemory();
+    }
+    buffer = codec_scratch(&self->compress_buffer, length);
+    if (buffer == NULL) {
+        if (!shared) {
+            ZSTD_freeCCtx(cctx);
+        }
+        return NULL;
+    }
+    output = PyByteArray_AS_STRING(buffer);
+    Py_BEGIN_ALLOW_THREADS
+    length = ZSTD_compressCCtx(cctx, output, length, input->buf, input->len, self->level);
+    Py_END_ALLOW_THREADS
+    if (!shared) {
+        ZSTD_freeCCtx(cctx);
+    }
+    if (ZSTD_isError(length)) {
+        Py_DECREF(buffer);
+        PyErr_Format(PyExc_ValueError, "Zstandard compression failed: %s", ZSTD_getErrorName(length));
+        return NULL;
+    }
+    return codec_view(buffer, length);
+}
+
+static PyObject* zstd_codec_decompress(Codec* self, Py_buffer* input, int shared) {
+    unsigned long long content_size = ZSTD_getFrameContentSize(input->buf, input->len);
+    ZSTD_inBuffer in = { input->buf, input->len, 0 };
+    ZSTD_outBuffer out;
+    PyObject* buffer;
+    ZSTD_DCtx* dctx;
+    size_t status = 0;
+    int grow_failed = 0;
+
+    if (content_size == ZSTD_CONTENTSIZE_ERROR) {
+        PyErr_SetString(PyExc_ValueError, "Invalid Zstandard frame.");
+        return NULL;
+    }
+    if (shared && self->dctx == NULL) {
+        self->dctx = ZSTD_createDCtx();
+    }
+    dctx = shared ? self->dctx : ZSTD_createDCtx();
+    if (dctx == NULL) {
+        return PyErr_NoMemory();
+    }
+    if (content_size == ZSTD_CONTENTSIZE_UNKNOWN) {
+        buffer = codec_scratch(&self->decompress_buffer, ZSTD_DStreamOutSize());
+    } else {
+        buffer = codec_scratch(&self->decompress_buffer, (Py_ssize_t)content_size);
+    }
+    if (buffer == NULL) {
+        if (!shared) {
+            ZSTD_freeDCtx(dctx);
+        }
+        return NULL;
+    }
+    out.pos = 0;
+    Py_BEGIN_ALLOW_THREADS
+    if (content_size != ZSTD_CONTENTSIZE_UNKNOWN) {
+        status = ZSTD_decompressDCtx(dctx, PyByteArray_AS_STRING(buffer), content_size, input->buf, input->len);
+        out.pos = status;
+    } else {
+        // Frames written by streaming compressors do not record their
+        // content size and are decompressed into a growing buffer.
+        ZSTD_initDStream(dctx);
+        while (in.pos < in.size || (status != 0 && out.pos == out.size)) {
+            out.dst = PyByteArray_AS_STRING(buffer);
+            out.size = PyByteArray_GET_SIZE(buffer);
+            if (out.pos == out.size) {
+                Py_BLOCK_THREADS
+                grow_failed = codec_grow(buffer) < 0;
+                Py_UNBLOCK_THREADS
+                if (grow_failed) {
+                    break;
+                }
+                continue;
+            }
+            status = ZSTD_decompressStream(dctx, &out, &in);
+            if (ZSTD_isError(status)) {
+                break;
+            }
+        }
+    }
+    Py_END_ALLOW_THREADS
+    if (!shared) {
+        ZSTD_freeDCtx(dctx);
+    }
+    if (grow_failed) {
+        Py_DECREF(buffer);
+        return NULL;
+    }
+    if (ZSTD_isError(status)) {
+        Py_DECREF(buffer);
+        PyErr_Format(PyExc_ValueError, "Zstandard decompression failed: %s", ZSTD_getErrorName(status));
+        return NULL;
+    }
+    if (status != 0) {
+        Py_DECREF(buffer);
+        PyErr_SetString(PyExc_ValueError, "Truncated Zstandard frame.");
+        return NULL;
+    }
+    return codec_view(buffer, out.pos);
+}
+
+static void Codec_dealloc(Codec* self) {
+    Py_XDECREF(self->compress_buffer);
+    Py_XDECREF(self->decompress_buffer);
+    if (self->deflate_ready) {
+        deflateEnd(&self->deflate_stream);
+    }
+    if (self->inflate_ready) {
+        inflateEnd(&self->inflate_stream);
+    }
+    ZSTD_freeCCtx(self->cctx);
+    ZSTD_freeDCtx(self->dctx);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static PyObject* Codec_new(PyTypeObject* type, PyObject* args, PyObject* kwds) {
+    Codec* self;
+
+    self = (Codec*)type->tp_alloc(type, 0);
+    return (PyObject*)self;
+}
+
+static int Codec_init(Codec* self, PyObject* args, PyObject* kwds) {
+    static char* kwlist[] = {"codec", "level", NULL};
+    const char* codec;
+    PyObject* level = Py_None;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "s|O", kwlist, &codec, &level)) {
+        return -1;
+    }
+    if (strcmp(codec, "null") == 0) {
+        self->codec = CODEC_NULL;
+        self->level = 0;
+    } else if (strcmp(codec, "deflate") == 0) {
+        self->codec = CODEC_DEFLATE;
+        self->level = Z_DEFAULT_COMPRESSION;
+    } else if (strcmp(codec, "snappy") == 0) {
+        self->codec = CODEC_SNAPPY;
+        self->level = 0;
+    } else if (strcmp(codec, "zstandard") == 0) {
+        self->codec = CODEC_ZSTANDARD;
+        self->level = ZSTD_CLEVEL_DEFAULT;
+    } else {
+        PyErr_Format(PyExc_ValueError, "Codec %s is not supported.", codec);
+        return -1;
+    }
+    if (level != Py_None) {
+        self->level = (int)PyLong_AsLong(level);
+        if (self->level == -1 && PyErr_Occurred()) {
+            return -1;
+        }
+    }
+    return 0;
+}
+
+static PyObject* Codec_compress(Codec* self, PyObject* args) {
+    PyObject* obj;
+    PyObject* result = NULL;
+    Py_buffer input;
+    int shared;
+
+    if (!PyArg_ParseTuple(args, "O", &obj)) {
+        return NULL;
+    }
+    if (self->codec == CODEC_NULL) {
+        Py_INCREF(obj);
+        return obj;
+    }
+    if (PyObject_GetBuffer(obj, &input, PyBUF_SIMPLE) < 0) {
+        return NULL;
+    }
+    shared = !self->busy;
+    self->busy = 1;
+    switch (self->codec) {
+        case CODEC_DEFLATE:
+            result = deflate_compress(self, &input, shared);
+            break;
+        case CODEC_SNAPPY:
+            result = snappy_codec_compress(self, &input);
+            break;
+        case CODEC_ZSTANDARD:
+            result = zstd_codec_compress(self, &input, shared);
+            break;
+        default:
+            break;
+    }
+    if (shared) {
+        self->busy = 0;
+    }
+    PyBuffer_Release(&input);
+    return result;
+}
+
+static PyObject* Codec_decompress(Codec* self, PyObject* args) {
+    PyObject* obj;
+    PyObject* result = NULL;
+    Py_buffer input;
+    int shared;
+
+    if (!PyArg_ParseTuple(args, "O", &obj)) {
+        return NULL;
+    }
+    if (self->codec == CODEC_NULL) {
+        Py_INCREF(obj);
+        return obj;
+    }
+    if (PyObject_GetBuffer(obj, &input, PyBUF_SIMPLE) < 0) {
+        return NULL;
+    }
+    shared = !self->busy;
+    self->busy = 1;
+    switch (self->codec) {
+        case CODEC_DEFLATE:
+            result = deflate_decompress(self, &input, shared);
+            break;
+        case CODEC_SNAPPY:
+            result = snappy_codec_decompress(self, &input);
+            break;
+        case CODEC_ZSTANDARD:
+            result = zstd_codec_decompress(self, &input, shared);
+            break;
+        default:
+            break;
+    }
+    if (shared) {
+        self->busy = 0;
+    }
+    PyBuffer_Release(&input);
+    return result;
+}
+
+static PyMethodDef Codec_methods[] = {
+    {"compress", (PyCFunction)Codec_compress, METH_VARARGS, ""},
+    {"decompress", (PyCFunction)Codec_decompress, METH_VARARGS, ""},
+    {NULL}  /* Sentinel */
+};
+
+PyTypeObject CodecType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_quickavro.Codec",                            /* tp_name */
+    sizeof(Codec),                                 /* tp_basicsize */
+    0,                                              /* tp_itemsize */
+    (destructor)Codec_dealloc,                     /* tp_dealloc */
+    0,                                              /* tp_print */
+    0,                                              /* tp_getattr */
+    0,                                              /* tp_setattr */
+    0,                                              /* tp_compare */
+    0,                                              /* tp_repr */
+    0,                                              /* tp_as_number */
+    0,                                              /* tp_as_sequence */
+    0,                                              /* tp_as_mapping */
+    0,                                              /* tp_hash */
+    0,                                              /* tp_call */
+    0,                                              /* tp_str */
+    0,                                              /* tp_getattro */
+    0,                                              /* tp_setattro */
+    0,                                              /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE,       /* tp_flags */
+    "Codec objects",                               /* tp_doc */
+    0,                                              /* tp_traverse */
+    0,                                              /* tp_clear */
+    0,                                              /* tp_richcompare */
+    0,                                              /* tp_weaklistoffset */
+    0,                                              /* tp_iter */
+    0,                                              /* tp_iternext */
+    Codec_methods,                                 /* tp_methods */
+    0,                                              /* tp_members */
+    0,                                              /* tp_getset */
+    0,                                              /* tp_base */
+    0,                                              /* tp_dict */
+    0,                                              /* tp_descr_get */
+    0,                                              /* tp_descr_set */
+    0,                                              /* tp_dictoffset */
+    (initproc)Codec_init,                          /* tp_init */
+    0,                                              /* tp_alloc */
+    Codec_new,                                     /* tp_new */
+};
@@ -0,0 +1,65 @@
+/*
+ * Copyright 2016 Chris Marshall
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#ifndef __CODECOBJECT_H
+#define __CODECOBJECT_H
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#include <Python.h>
+#include <zlib.h>
+#include <zstd.h>
+
+
+typedef enum {
+    CODEC_NULL,
+    CODEC_DEFLATE,
+    CODEC_SNAPPY,
+    CODEC_ZSTANDARD
+} codec_type;
+
+// Block compressor and decompressor of one codec. Output is written into
+// bytearray scratch buffers kept between calls and returned as memoryview
+// slices. A scratch buffer is only reused once every view of it has been
+// released, otherwise a new one is allocated, so returned views stay valid
+// for as long as they are referenced. The compression streams are reused
+// as well, except by calls made while another thread is using them.
+typedef struct {
+    PyObject_HEAD
+    codec_type  codec;
+    int         level;
+    PyObject*   compress_buffer;
+    PyObject*   decompress_buffer;
+    z_stream    deflate_stream;
+    z_stream    inflate_stream;
+    int         deflate_ready;
+    int         inflate_ready;
+    ZSTD_CCtx*  cctx;
+    ZSTD_DCtx*  dctx;
+    int         busy;
+} Codec;
+
+extern PyTypeObject CodecType;
+
+PyObject* codec_crc32(PyObject* self, PyObject* args);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif
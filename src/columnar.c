@@ -0,0 +1,641 @@
+/*
+ * Copyright 2016 Chris Marshall
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#include "columnar.h"
+#include "compat.h"
+#include "encoderobject.h"
+#include "quickavro.h"
+#include <avro.h>
+#include <stdint.h>
+#include <stdlib.h>
+#include <string.h>
+
+
+static int column_buffer_append(column_buffer* buffer, const void* data, size_t size) {
+    char* new_data;
+    size_t new_capacity;
+
+    if (buffer->size + size > buffer->capacity) {
+        new_capacity = buffer->capacity ? buffer->capacity : 4096;
+        while (new_capacity < buffer->size + size) {
+            new_capacity *= 2;
+        }
+        new_data = (char*)realloc(buffer->data, new_capacity);
+        if (new_data == NULL) {
+            return ENOMEM;
+        }
+        buffer->data = new_data;
+        buffer->capacity = new_capacity;
+    }
+    memcpy(buffer->data + buffer->size, data, size);
+    buffer->size += size;
+    return 0;
+}
+
+static PyObject* column_buffer_to_bytes(column_buffer* buffer) {
+    return PyBytes_FromStringAndSize(buffer->data ? buffer->data : "", buffer->size);
+}
+
+static char column_typecode(convert_node* node) {
+    switch (node->type) {
+        case AVRO_INT32:
+            return COLUMN_INT32;
+        case AVRO_INT64:
+            return COLUMN_INT64;
+        case AVRO_FLOAT:
+            return COLUMN_FLOAT;
+        case AVRO_DOUBLE:
+            return COLUMN_DOUBLE;
+        case AVRO_BOOLEAN:
+            return COLUMN_BOOLEAN;
+        case AVRO_STRING:
+            return COLUMN_STRING;
+        case AVRO_BYTES:
+            return COLUMN_BYTES;
+        case AVRO_ENUM:
+            return COLUMN_ENUM;
+        default:
+            return COLUMN_OBJECT;
+    }
+}
+
+static int column_init(column* col, convert_node* node) {
+    memset(col, 0, sizeof(column));
+    col->node = node;
+    col->value_node = node;
+    col->null_branch = -1;
+    if (node->type == AVRO_UNION) {
+        // Unions of null and one other type are stored natively with a
+        // validity mask.
+        if (node->size == 2 && node->null_branch >= 0) {
+            col->null_branch = node->null_branch;
+            col->value_node = node->children[1 - node->null_branch];
+            col->typecode = column_typecode(col->value_node);
+        } else {
+            col->typecode = COLUMN_OBJECT;
+        }
+    } else {
+        col->typecode = column_typecode(node);
+    }
+    if (col->typecode == COLUMN_OBJECT) {
+        col->null_branch = -1;
+        col->objects = PyList_New(0);
+        if (col->objects == NULL) {
+            return -1;
+        }
+    }
+    if (col->typecode == COLUMN_STRING || col->typecode == COLUMN_BYTES) {
+        int64_t zero = 0;
+        if (column_buffer_append(&col->offsets, &zero, sizeof(zero)) != 0) {
+            PyErr_NoMemory();
+            return -1;
+        }
+    }
+    return 0;
+}
+
+static void column_free(column* col) {
+    free(col->data.data);
+    free(col->offsets.data);
+    free(col->validity.data);
+    Py_XDECREF(col->objects);
+}
+
+// Appends a value to a column. Native columns do not touch Python
+// objects and can be appended to without the GIL.
+static int column_append(column* col, avro_value_t* value) {
+    avro_value_t branch;
+    int discriminant;
+    uint8_t valid = 1;
+    int rval;
+    union {
+        int32_t i;
+        int64_t l;
+        float f;
+        double d;
+        int b;
+    } item;
+    const void* data = NULL;
+    size_t size = 0;
+    int64_t offset;
+
+    if (col->null_branch >= 0) {
+        avro_value_get_discriminant(value, &discriminant);
+        avro_value_get_current_branch(value, &branch);
+        valid = discriminant != col->null_branch;
+        if ((rval = column_buffer_append(&col->validity, &valid, 1)) != 0) {
+            return rval;
+        }
+        value = &branch;
+    }
+    memset(&item, 0, sizeof(item));
+    switch (col->typecode) {
+        case COLUMN_INT32:
+            if (valid) {
+                avro_value_get_int(value, &item.i);
+            }
+            return column_buffer_append(&col->data, &item.i, sizeof(int32_t));
+        case COLUMN_INT64:
+            if (valid) {
+                avro_value_get_long(value, &item.l);
+            }
+            return column_buffer_append(&col->data, &item.l, sizeof(int64_t));
+        case COLUMN_FLOAT:
+            if (valid) {
+                avro_value_get_float(value, &item.f);
+            }
+            return column_buffer_append(&col->data, &item.f, sizeof(float));
+        case COLUMN_DOUBLE:
+            if (valid) {
+                avro_value_get_double(value, &item.d);
+            }
+            return column_buffer_append(&col->data, &item.d, sizeof(double));
+        case COLUMN_BOOLEAN: {
+            uint8_t b = 0;
+            if (valid) {
+                avro_value_get_boolean(value, &item.b);
+                b = item.b ? 1 : 0;
+            }
+            return column_buffer_append(&col->data, &b, 1);
+        }
+        case COLUMN_ENUM:
+            if (valid) {
+                avro_value_get_enum(value, &item.i);
+            }
+            return column_buffer_append(&col->data, &item.i, sizeof(int32_t));
+        case COLUMN_STRING:
+            if (valid) {
+                avro_value_get_string(value, (const char**)&data, &size);
+                // Sizes of Avro strings include the NUL terminator
+                size = size ? size - 1 : 0;
+            }
+            break;
+        case COLUMN_BYTES:
+            if (valid) {
+                avro_value_get_bytes(value, &data, &size);
+            }
+            break;
+    }
+    if (size && (rval = column_buffer_append(&col->data, data, size)) != 0) {
+        return rval;
+    }
+    offset = (int64_t)col->data.size;
+    return column_buffer_append(&col->offsets, &offset, sizeof(offset));
+}
+
+static PyObject* column_symbols(convert_node* node) {
+    size_t i;
+    size_t size = avro_schema_enum_number_of_symbols(node->schema);
+    PyObject* symbols = PyTuple_New(size);
+    PyObject* symbol;
+
+    if (symbols == NULL) {
+        return NULL;
+    }
+    for (i=0; i<size; i++) {
+        symbol = PyUnicode_FromString(avro_schema_enum_get(node->schema, i));
+        if (symbol == NULL) {
+            Py_DECREF(symbols);
+            return NULL;
+        }
+        PyTuple_SET_ITEM(symbols, i, symbol);
+    }
+    return symbols;
+}
+
+// Returns (name, typecode, data, offsets, validity, symbols) for a column.
+// data is a list for object columns and bytes otherwise, offsets and
+// validity are bytes or None, and symbols is a tuple for enums or None.
+static PyObject* column_to_python(column* col, PyObject* name) {
+    PyObject *typecode, *data, *offsets, *validity, *symbols;
+
+    typecode = PyUnicode_FromStringAndSize(&col->typecode, 1);
+    if (col->typecode == COLUMN_OBJECT) {
+        data = col->objects;
+        Py_INCREF(data);
+    } else {
+        data = column_buffer_to_bytes(&col->data);
+    }
+    if (col->typecode == COLUMN_STRING || col->typecode == COLUMN_BYTES) {
+        offsets = column_buffer_to_bytes(&col->offsets);
+    } else {
+        offsets = Py_None;
+        Py_INCREF(offsets);
+    }
+    if (col->null_branch >= 0) {
+        validity = column_buffer_to_bytes(&col->validity);
+    } else {
+        validity = Py_None;
+        Py_INCREF(validity);
+    }
+    if (col->typecode == COLUMN_ENUM) {
+        symbols = column_symbols(col->value_node);
+    } else {
+        symbols = Py_None;
+        Py_INCREF(symbols);
+    }
+    if (typecode == NULL || data == NULL || offsets == NULL || validity == NULL || symbols == NULL) {
+        Py_XDECREF(typecode);
+        Py_XDECREF(data);
+        Py_XDECREF(offsets);
+        Py_XDECREF(validity);
+        Py_XDECREF(symbols);
+        return NULL;
+    }
+    return Py_BuildValue("(ONNNNN)", name, typecode, data, offsets, validity, symbols);
+}
+
+// Reads every record left in reader into value, and appends the fields of
+// record, which is either value or the destination of a resolved writer,
+// to one column per field of root. Returns a tuple of the number of
+// records and a list of columns, see column_to_python.
+PyObject* read_columnar(avro_reader_t reader, avro_value_t* value, avro_value_t* record, convert_node* root) {
+    column* columns;
+    avro_value_t field;
+    PyObject *result = NULL, *list = NULL, *item;
+    size_t i, count = 0;
+    int native = 1;
+    int rval = 0;
+
+    if (root->type != AVRO_RECORD) {
+        PyErr_SetString(SchemaError, "Columnar reads require a record schema");
+        return NULL;
+    }
+    columns = (column*)PyMem_Malloc((root->size ? root->size : 1) * sizeof(column));
+    if (columns == NULL) {
+        return PyErr_NoMemory();
+    }
+    memset(columns, 0, (root->size ? root->size : 1) * sizeof(column));
+    for (i=0; i<root->size; i++) {
+        if (column_init(&columns[i], root->children[i]) < 0) {
+            goto done;
+        }
+        if (columns[i].typecode == COLUMN_OBJECT) {
+            native = 0;
+        }
+    }
+
+    // Blocks without object columns are decoded entirely without the GIL.
+    Py_BEGIN_ALLOW_THREADS
+    while (native) {
+        avro_value_reset(record);
+        if (avro_value_read(reader, value) != 0) {
+            break;
+        }
+        for (i=0; i<root->size && rval == 0; i++) {
+            avro_value_get_by_index(record, i, &field, NULL);
+            rval = column_append(&columns[i], &field);
+        }
+        if (rval != 0) {
+            break;
+        }
+        count++;
+    }
+    Py_END_ALLOW_THREADS
+
+    while (!native && rval == 0) {
+        avro_value_reset(record);
+        if (avro_value_read(reader, value) != 0) {
+            break;
+        }
+        for (i=0; i<root->size && rval == 0; i++) {
+            avro_value_get_by_index(record, i, &field, NULL);
+            if (columns[i].typecode != COLUMN_OBJECT) {
+                rval = column_append(&columns[i], &field);
+                continue;
+            }
+            item = avro_to_python(&field, columns[i].node);
+            if (item == NULL) {
+                goto done;
+            }
+            rval = PyList_Append(columns[i].objects, item) < 0 ? -1 : 0;
+            Py_DECREF(item);
+            if (rval != 0) {
+                goto done;
+            }
+        }
+        count++;
+    }
+    if (rval == ENOMEM) {
+        PyErr_NoMemory();
+        goto done;
+    }
+
+    list = PyList_New(root->size);
+    if (list == NULL) {
+        goto done;
+    }
+    for (i=0; i<root->size; i++) {
+        item = column_to_python(&columns[i], root->names[i]);
+        if (item == NULL) {
+            Py_CLEAR(list);
+            goto done;
+        }
+        PyList_SET_ITEM(list, i, item);
+    }
+    result = Py_BuildValue("(nN)", (Py_ssize_t)count, list);
+
+done:
+    for (i=0; i<root->size; i++) {
+        column_free(&columns[i]);
+    }
+    PyMem_Free(columns);
+    return result;
+}
+
+static int column_buffer_write_long(column_buffer* out, int64_t l) {
+    char buf[MAX_VARINT_SIZE];
+    size_t size = 0;
+    uint64_t n = (l << 1) ^ (l >> 63);
+
+    while (n & ~0x7F) {
+        buf[size++] = (char)((((uint8_t) n) & 0x7F) | 0x80);
+        n >>= 7;
+    }
+    buf[size++] = (char)n;
+    return column_buffer_append(out, buf, size);
+}
+
+// Avro floats and doubles are little-endian regardless of the host.
+static int column_buffer_write_fixed(column_buffer* out, uint64_t bits, size_t size) {
+    unsigned char buf[8];
+    size_t i;
+
+    for (i=0; i<size; i++) {
+        buf[i] = (unsigned char)(bits >> (8 * i));
+    }
+    return column_buffer_append(out, buf, size);
+}
+
+static int view_format(column_source* src) {
+    const char* format = src->view.format ? src->view.format : "B";
+
+    if (*format == '<' || *format == '=' || *format == '@') {
+        format++;
+    }
+    if (format[0] == '\0' || format[1] != '\0' || strchr("bBhHiIlLqQfd?", format[0]) == NULL) {
+        return -1;
+    }
+    if ((format[0] == 'f' || format[0] == 'd') && src->typecode != COLUMN_FLOAT && src->typecode != COLUMN_DOUBLE) {
+        return -1;
+    }
+    src->format = format[0];
+    return 0;
+}
+
+// Reads the value at index i of a buffer column. Returns ERANGE for
+// unsigned values that do not fit in a long.
+static int view_get(column_source* src, Py_ssize_t i, int64_t* l, double* d) {
+    const char* p = (const char*)src->view.buf + i * src->view.itemsize;
+
+#define VIEW_GET(type) { type v; memcpy(&v, p, sizeof(type)); *l = (int64_t)v; *d = (double)v; break; }
+#define VIEW_GET_UNSIGNED(type) { type v; memcpy(&v, p, sizeof(type)); \
+    if ((unsigned long long)v > (unsigned long long)INT64_MAX) { return ERANGE; } \
+    *l = (int64_t)v; *d = (double)v; break; }
+    switch (src->format) {
+        case 'b': VIEW_GET(signed char)
+        case 'B': VIEW_GET(unsigned char)
+        case '?': VIEW_GET(unsigned char)
+        case 'h': VIEW_GET(short)
+        case 'H': VIEW_GET(unsigned short)
+        case 'i': VIEW_GET(int)
+        case 'I': VIEW_GET(unsigned int)
+        case 'l': VIEW_GET(long)
+        case 'L': VIEW_GET_UNSIGNED(unsigned long)
+        case 'q': VIEW_GET(long long)
+        case 'Q': VIEW_GET_UNSIGNED(unsigned long long)
+        case 'f': VIEW_GET(float)
+        case 'd': VIEW_GET(double)
+    }
+#undef VIEW_GET
+#undef VIEW_GET_UNSIGNED
+    return 0;
+}
+
+// Checks that a long fits the field type of a column. Returns ERANGE
+// otherwise.
+static int column_source_check(column_source* src, int64_t l) {
+    if (src->typecode == COLUMN_INT32 && (l < INT32_MIN || l > INT32_MAX)) {
+        return ERANGE;
+    }
+    if (src->typecode == COLUMN_ENUM && (l < 0 || l >= src->symbols)) {
+        return ERANGE;
+    }
+    return 0;
+}
+
+// Converts an integer item of a column. Integers that do not fit in a
+// long are reported as ERANGE.
+static int column_source_long(PyObject* item, int64_t* l) {
+    *l = PyLong_AsLongLong(item);
+    if (*l == -1 && PyErr_Occurred()) {
+        if (PyErr_ExceptionMatches(PyExc_OverflowError)) {
+            PyErr_Clear();
+            return ERANGE;
+        }
+        return -1;
+    }
+    return 0;
+}
+
+// Prepares obj to be serialized as the values of a field of node. Returns
+// 1 if the field type has no columnar representation.
+int column_source_init(column_source* src, PyObject* obj, convert_node* node) {
+    memset(src, 0, sizeof(column_source));
+    src->value_node = node;
+    src->null_branch = -1;
+    if (node->type == AVRO_UNION) {
+        if (node->size != 2 || node->null_branch < 0) {
+            return 1;
+        }
+        src->null_branch = node->null_branch;
+        src->value_branch = 1 - node->null_branch;
+        src->value_node = node->children[src->value_branch];
+    }
+    src->typecode = column_typecode(src->value_node);
+    if (src->typecode == COLUMN_OBJECT) {
+        return 1;
+    }
+    if (src->typecode == COLUMN_ENUM) {
+        src->symbols = avro_schema_enum_number_of_symbols(src->value_node->schema);
+    }
+    if (src->typecode != COLUMN_STRING && src->typecode != COLUMN_BYTES &&
+        PyObject_CheckBuffer(obj) && !PyBytes_Check(obj) && !PyUnicode_Check(obj)) {
+        if (PyObject_GetBuffer(obj, &src->view, PyBUF_FORMAT | PyBUF_C_CONTIGUOUS) == 0) {
+            if (src->view.ndim <= 1 && src->view.itemsize > 0 && view_format(src) == 0) {
+                src->has_view = 1;
+                src->length = src->view.len / src->view.itemsize;
+                return 0;
+            }
+            PyBuffer_Release(&src->view);
+        }
+        // Buffers in other layouts are read as sequences
+        PyErr_Clear();
+    }
+    src->seq = PySequence_Fast(obj, "Columns must be sequences");
+    if (src->seq == NULL) {
+        return -1;
+    }
+    src->length = PySequence_Fast_GET_SIZE(src->seq);
+    return 0;
+}
+
+void column_source_release(column_source* src) {
+    if (src->has_view) {
+        PyBuffer_Release(&src->view);
+        src->has_view = 0;
+    }
+    Py_CLEAR(src->seq);
+}
+
+static int column_source_write_string(column_source* src, PyObject* item, column_buffer* out) {
+    PyObject* encoded = NULL;
+    const char* data;
+    Py_ssize_t size;
+    int rval;
+
+    if (PyUnicode_Check(item) && src->typecode == COLUMN_STRING) {
+        encoded = PyUnicode_AsUTF8String(item);
+        if (encoded == NULL) {
+            return -1;
+        }
+        item = encoded;
+    }
+    if (PyBytes_Check(item)) {
+        data = PyBytes_AS_STRING(item);
+        size = PyBytes_GET_SIZE(item);
+    } else if (PyByteArray_Check(item) && src->typecode == COLUMN_BYTES) {
+        data = PyByteArray_AS_STRING(item);
+        size = PyByteArray_GET_SIZE(item);
+    } else {
+        PyErr_Format(WriteError, "Invalid %s value: %s",
+            src->typecode == COLUMN_STRING ? "string" : "bytes", Py_TYPE(item)->tp_name);
+        return -1;
+    }
+    rval = column_buffer_write_long(out, size);
+    if (rval == 0) {
+        rval = column_buffer_append(out, data, size);
+    }
+    Py_XDECREF(encoded);
+    return rval;
+}
+
+static int column_source_write_enum(column_source* src, PyObject* item, int64_t* l) {
+    PyObject* encoded;
+    int index;
+
+    if (PyLong_Check(item)) {
+        return column_source_long(item, l);
+    }
+    encoded = PyUnicode_Check(item) ? PyUnicode_AsUTF8String(item) : (Py_INCREF(item), item);
+    if (encoded == NULL) {
+        return -1;
+    }
+    if (!PyBytes_Check(encoded)) {
+        Py_DECREF(encoded);
+        PyErr_Format(WriteError, "Invalid enum value: %s", Py_TYPE(item)->tp_name);
+        return -1;
+    }
+    index = avro_schema_enum_get_by_name(src->value_node->schema, PyBytes_AS_STRING(encoded));
+    Py_DECREF(encoded);
+    if (index < 0) {
+        PyErr_SetString(WriteError, "Invalid enum symbol");
+        return -1;
+    }
+    *l = index;
+    return 0;
+}
+
+// Serializes the value at row of a column. Columns backed by a buffer do
+// not touch Python objects and can be written without the GIL. Returns 0,
+// ENOMEM, ERANGE for integers out of the range of the field type, or -1
+// with a Python exception set.
+int column_source_write(column_source* src, Py_ssize_t row, column_buffer* out) {
+    PyObject* item = NULL;
+    int64_t l = 0;
+    double d = 0;
+    float f;
+    uint32_t bits32;
+    uint64_t bits64;
+    uint8_t b;
+    int rval;
+
+    if (src->has_view) {
+        if ((rval = view_get(src, row, &l, &d)) != 0) {
+            return rval;
+        }
+    } else {
+        item = PySequence_Fast_GET_ITEM(src->seq, row);
+        if (src->null_branch >= 0 && item == Py_None) {
+            return column_buffer_write_long(out, src->null_branch);
+        }
+    }
+    if (src->null_branch >= 0 && (rval = column_buffer_write_long(out, src->value_branch)) != 0) {
+        return rval;
+    }
+    switch (src->typecode) {
+        case COLUMN_INT32:
+        case COLUMN_INT64:
+            if (item != NULL && (rval = column_source_long(item, &l)) != 0) {
+                return rval;
+            }
+            if ((rval = column_source_check(src, l)) != 0) {
+                return rval;
+            }
+            return column_buffer_write_long(out, l);
+        case COLUMN_FLOAT:
+            if (item != NULL) {
+                d = PyFloat_AsDouble(item);
+                if (d == -1.0 && PyErr_Occurred()) {
+                    return -1;
+                }
+            }
+            f = (float)d;
+            memcpy(&bits32, &f, sizeof(bits32));
+            return column_buffer_write_fixed(out, bits32, sizeof(bits32));
+        case COLUMN_DOUBLE:
+            if (item != NULL) {
+                d = PyFloat_AsDouble(item);
+                if (d == -1.0 && PyErr_Occurred()) {
+                    return -1;
+                }
+            }
+            memcpy(&bits64, &d, sizeof(bits64));
+            return column_buffer_write_fixed(out, bits64, sizeof(bits64));
+        case COLUMN_BOOLEAN:
+            if (item != NULL) {
+                rval = PyObject_IsTrue(item);
+                if (rval < 0) {
+                    return -1;
+                }
+                l = rval;
+            }
+            b = l ? 1 : 0;
+            return column_buffer_append(out, &b, 1);
+        case COLUMN_ENUM:
+            if (item != NULL && (rval = column_source_write_enum(src, item, &l)) != 0) {
+                return rval;
+            }
+            if ((rval = column_source_check(src, l)) != 0) {
+                return rval;
+            }
+            return column_buffer_write_long(out, l);
+        case COLUMN_STRING:
+        case COLUMN_BYTES:
+            return column_source_write_string(src, item, out);
+    }
+    return 0;
+}
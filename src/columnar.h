@@ -0,0 +1,95 @@
+/*
+ * Copyright 2016 Chris Marshall
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#ifndef __COLUMNAR_H
+#define __COLUMNAR_H
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#include <Python.h>
+#include <avro.h>
+
+#include "convert.h"
+
+
+// Type codes of the columns returned by read_columnar. Fixed width
+// columns use the struct module format of their items.
+#define COLUMN_OBJECT  'O'
+#define COLUMN_INT32   'i'
+#define COLUMN_INT64   'q'
+#define COLUMN_FLOAT   'f'
+#define COLUMN_DOUBLE  'd'
+#define COLUMN_BOOLEAN '?'
+#define COLUMN_STRING  's'
+#define COLUMN_BYTES   'y'
+#define COLUMN_ENUM    'e'
+
+// A growable buffer allocated with malloc, so that it can be appended to
+// without the GIL.
+typedef struct {
+    char* data;
+    size_t size;
+    size_t capacity;
+} column_buffer;
+
+typedef struct {
+    char typecode;
+    // Node of the field, and of the non-null branch of nullable fields
+    convert_node* node;
+    convert_node* value_node;
+    int null_branch;
+
+    // Fixed width values, enum indexes or concatenated strings
+    column_buffer data;
+    // For strings and bytes, the int64 offset of each value in data
+    // followed by the total size
+    column_buffer offsets;
+    // For nullable fields, one byte per value that is 0 for nulls
+    column_buffer validity;
+    // Converted values of fields without a native representation
+    PyObject* objects;
+} column;
+
+// A column of values to serialize, either a buffer of fixed width values
+// such as an array.array or numpy array, or any other sequence.
+typedef struct {
+    char typecode;
+    // Node of the non-null branch of nullable fields, or of the field
+    convert_node* value_node;
+    int null_branch;
+    int value_branch;
+    // Number of symbols of enums
+    int64_t symbols;
+
+    Py_buffer view;
+    int has_view;
+    char format;
+    PyObject* seq;
+    Py_ssize_t length;
+} column_source;
+
+PyObject* read_columnar(avro_reader_t reader, avro_value_t* value, avro_value_t* record, convert_node* root);
+int column_source_init(column_source* src, PyObject* obj, convert_node* node);
+void column_source_release(column_source* src);
+int column_source_write(column_source* src, Py_ssize_t row, column_buffer* out);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif
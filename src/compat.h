@@ -43,6 +43,7 @@
   #define _PyUnicode_CheckExact(ob) PyUnicode_CheckExact(ob)
 #else
   #define PyUnicode_AsUTF8 PyString_AsString
+  #define PyUnicode_InternFromString PyString_InternFromString
   #define PyNumber_FloorDivide PyNumber_Divide
   #define PyBytes_FromStringAndSize PyString_FromStringAndSize
   #define _PyLong_Check(ob) (PyLong_Check(ob) || PyInt_Check(ob))
@@ -15,6 +15,7 @@
  */
 
 #include "convert.h"
+#include <structmember.h>
 #include "compat.h"
 #include <avro.h>
 #include "encoderobject.h"
@@ -41,39 +42,48 @@ static const char* lookup(const char* key) {
     return key;
 }
 
-static PyObject* array_to_pylist(avro_value_t* value) {
+static PyObject* array_to_pylist(avro_value_t* value, convert_node* node) {
     size_t record_length;
     size_t i;
+    PyObject* item;
     avro_value_get_size(value, &record_length);
     PyObject* l = PyList_New(record_length);
+    if (l == NULL) {
+        return NULL;
+    }
     for (i=0; i<record_length; i++) {
         avro_value_t field_value;
         avro_value_get_by_index(value, i, &field_value, NULL);
-        PyList_SetItem(l, i, avro_to_python(&field_value));
+        item = avro_to_python(&field_value, node->children[0]);
+        if (item == NULL) {
+            Py_DECREF(l);
+            return NULL;
+        }
+        PyList_SET_ITEM(l, i, item);
     }
     return l;
 }
 
-static PyObject* boolean_to_pybool(avro_value_t* value) {
+static PyObject* boolean_to_pybool(avro_value_t* value, convert_node* node) {
     int t;
     avro_value_get_boolean(value, &t);
     return PyBool_FromLong(t);
 }
 
-static PyObject* bytes_to_pybytes(avro_value_t* value) {
+static PyObject* bytes_to_pybytes(avro_value_t* value, convert_node* node) {
     const void* buf;
     size_t length;
     avro_value_get_bytes(value, &buf, &length);
     return PyBytes_FromStringAndSize((char*)buf, length);
 }
 
-static PyObject* double_to_pyfloat(avro_value_t* value) {
+static PyObject* double_to_pyfloat(avro_value_t* value, convert_node* node) {
     double d;
     avro_value_get_double(value, &d);
     return PyFloat_FromDouble(d);
 }
 
-static PyObject* enum_to_pystring(avro_value_t* value) {
+static PyObject* enum_to_pystring(avro_value_t* value, convert_node* node) {
     // TODO: Return quickavro enum object
     int index;
     avro_value_get_enum(value, &index);
@@ -86,14 +96,14 @@ static PyObject* enum_to_pystring(avro_value_t* value) {
     return PyUnicode_FromString(name);
 }
 
-static PyObject* fixed_to_pybytes(avro_value_t* value) {
+static PyObject* fixed_to_pybytes(avro_value_t* value, convert_node* node) {
     const void* buf;
     size_t length;
     avro_value_get_fixed(value, &buf, &length);
     return PyBytes_FromStringAndSize((char*)buf, length);
 }
 
-static PyObject* float_to_pyfloat(avro_value_t* value) {
+static PyObject* float_to_pyfloat(avro_value_t* value, convert_node* node) {
     float f;
     char buf[50];
     avro_value_get_float(value, &f);
@@ -101,59 +111,204 @@ static PyObject* float_to_pyfloat(avro_value_t* value) {
     return PyFloat_FromDouble(atof(buf));
 }
 
-static PyObject* int32_to_pylong(avro_value_t* value) {
+static PyObject* int32_to_pylong(avro_value_t* value, convert_node* node) {
     int32_t l;
     avro_value_get_int(value, &l);
     return PyLong_FromLong(l);
 }
 
-static PyObject* int64_to_pylong(avro_value_t* value) {
+static PyObject* int64_to_pylong(avro_value_t* value, convert_node* node) {
     int64_t q;
     avro_value_get_long(value, &q);
     return PyLong_FromLong(q);
 }
 
-static PyObject* map_to_pydict(avro_value_t* value) {
+static PyObject* map_to_pydict(avro_value_t* value, convert_node* node) {
     PyObject* item;
     size_t record_length;
     size_t i;
     PyObject* d = PyDict_New();
+    if (d == NULL) {
+        return NULL;
+    }
     avro_value_get_size(value, &record_length);
     for (i=0; i<record_length; i++) {
         const char* field_name;
         avro_value_t field_value;
         avro_value_get_by_index(value, i, &field_value, &field_name);
-        item = avro_to_python(&field_value);
+        item = avro_to_python(&field_value, node->children[0]);
+        if (item == NULL) {
+            Py_DECREF(d);
+            return NULL;
+        }
         PyDict_SetItemString(d, field_name, item);
         Py_DECREF(item);
     }
     return d;
 }
 
-static PyObject* null_to_pynone(avro_value_t* value) {
+// Returns a new reference to a default value. Mutable defaults are copied
+// so that records never share them.
+static PyObject* default_value_copy(PyObject* item) {
+    static PyObject* deepcopy = NULL;
+
+    if (!PyDict_Check(item) && !PyList_Check(item)) {
+        Py_INCREF(item);
+        return item;
+    }
+    if (deepcopy == NULL) {
+        PyObject* copy = PyImport_ImportModule("copy");
+        if (copy == NULL) {
+            return NULL;
+        }
+        deepcopy = PyObject_GetAttrString(copy, "deepcopy");
+        Py_DECREF(copy);
+        if (deepcopy == NULL) {
+            return NULL;
+        }
+    }
+    return PyObject_CallFunctionObjArgs(deepcopy, item, NULL);
+}
+
+// Adds the default values of fields missing from the writer schema to a
+// decoded record.
+static int record_set_defaults(PyObject* d, PyObject* defaults) {
+    PyObject *key, *item;
+    Py_ssize_t pos = 0;
+
+    while (PyDict_Next(defaults, &pos, &key, &item)) {
+        item = default_value_copy(item);
+        if (item == NULL) {
+            return -1;
+        }
+        if (PyDict_SetItem(d, key, item) < 0) {
+            Py_DECREF(item);
+            return -1;
+        }
+        Py_DECREF(item);
+    }
+    return 0;
+}
+
+static PyObject* record_to_pydict(avro_value_t* value, convert_node* node) {
+    PyObject* item;
+    size_t i;
+    PyObject* d = PyDict_New();
+    if (d == NULL) {
+        return NULL;
+    }
+    for (i=0; i<node->size; i++) {
+        avro_value_t field_value;
+        avro_value_get_by_index(value, i, &field_value, NULL);
+        item = avro_to_python(&field_value, node->children[i]);
+        if (item == NULL) {
+            Py_DECREF(d);
+            return NULL;
+        }
+        // Field names are interned with their hash cached, so inserting
+        // them does not create or hash a new string per record.
+        PyDict_SetItem(d, node->names[i], item);
+        Py_DECREF(item);
+    }
+    if (node->defaults != NULL && record_set_defaults(d, node->defaults) < 0) {
+        Py_DECREF(d);
+        return NULL;
+    }
+    return d;
+}
+
+// Records decoded into instances of a tuple subclass, such as a
+// namedtuple, holding the fields followed by the fields with defaults.
+static PyObject* record_to_pytuple(avro_value_t* value, convert_node* node) {
+    PyTypeObject* type = (PyTypeObject*)node->record_class;
+    PyObject *obj, *key, *item;
+    Py_ssize_t pos = 0;
+    size_t i;
+
+    obj = type->tp_alloc(type, node->record_size);
+    if (obj == NULL) {
+        return NULL;
+    }
+    for (i=0; i<node->size; i++) {
+        avro_value_t field_value;
+        avro_value_get_by_index(value, i, &field_value, NULL);
+        item = avro_to_python(&field_value, node->children[i]);
+        if (item == NULL) {
+            Py_DECREF(obj);
+            return NULL;
+        }
+        PyTuple_SET_ITEM(obj, i, item);
+    }
+    while (node->defaults != NULL && PyDict_Next(node->defaults, &pos, &key, &item)) {
+        item = default_value_copy(item);
+        if (item == NULL) {
+            Py_DECREF(obj);
+            return NULL;
+        }
+        PyTuple_SET_ITEM(obj, i++, item);
+    }
+    return obj;
+}
+
+// Records decoded into instances of a class with __slots__, whose slots
+// are set directly at the offsets of their member descriptors.
+static PyObject* record_to_pyslots(avro_value_t* value, convert_node* node) {
+    PyTypeObject* type = (PyTypeObject*)node->record_class;
+    PyObject *obj, *key, *item;
+    Py_ssize_t pos = 0;
+    size_t i;
+
+    obj = type->tp_alloc(type, 0);
+    if (obj == NULL) {
+        return NULL;
+    }
+    for (i=0; i<node->size; i++) {
+        avro_value_t field_value;
+        avro_value_get_by_index(value, i, &field_value, NULL);
+        item = avro_to_python(&field_value, node->children[i]);
+        if (item == NULL) {
+            Py_DECREF(obj);
+            return NULL;
+        }
+        *(PyObject**)((char*)obj + node->slot_offsets[i]) = item;
+    }
+    while (node->defaults != NULL && PyDict_Next(node->defaults, &pos, &key, &item)) {
+        item = default_value_copy(item);
+        if (item == NULL) {
+            Py_DECREF(obj);
+            return NULL;
+        }
+        *(PyObject**)((char*)obj + node->slot_offsets[i++]) = item;
+    }
+    return obj;
+}
+
+static PyObject* null_to_pynone(avro_value_t* value, convert_node* node) {
     avro_value_get_null(value);
     Py_RETURN_NONE;
 }
 
-static PyObject* string_to_pystring(avro_value_t* value) {
+static PyObject* string_to_pystring(avro_value_t* value, convert_node* node) {
     const char* buf;
     size_t length;
     avro_value_get_string(value, &buf, &length);
     return PyUnicode_FromStringAndSize(buf, length-1);
 }
 
-static PyObject* union_to_python(avro_value_t *value) {
+static PyObject* union_to_python(avro_value_t *value, convert_node* node) {
+    int discriminant;
     avro_value_t v;
+    avro_value_get_discriminant(value, &discriminant);
     avro_value_get_current_branch(value, &v);
-    return avro_to_python(&v);
+    return avro_to_python(&v, node->children[discriminant]);
 }
 
-static int pybool_to_boolean(PyObject* obj, avro_value_t* value) {
+static int pybool_to_boolean(PyObject* obj, avro_value_t* value, convert_node* node) {
     int t = PyObject_IsTrue(obj);
     return avro_error(avro_value_set_boolean(value, t));
 }
 
-static int pybytes_to_bytes(PyObject* obj, avro_value_t* value) {
+static int pybytes_to_bytes(PyObject* obj, avro_value_t* value, convert_node* node) {
     char* buf;
     Py_ssize_t length;
     if (PyBytes_Check(obj)) {
@@ -165,7 +320,7 @@ static int pybytes_to_bytes(PyObject* obj, avro_value_t* value) {
     return avro_error(avro_value_set_bytes(value, buf, length));
 }
 
-static int pydict_to_map(PyObject* obj, avro_value_t* dest) {
+static int pydict_to_map(PyObject* obj, avro_value_t* dest, convert_node* node) {
     PyObject *key, *value;
     Py_ssize_t pos = 0;
     int rval = 0;
@@ -176,13 +331,13 @@ static int pydict_to_map(PyObject* obj, avro_value_t* dest) {
         const char* k = PyUnicode_AsUTF8(key);
         rval = avro_value_add(dest, k, &v, NULL, NULL);
         if (rval == 0) {
-            rval = python_to_avro(value, &v);
+            rval = python_to_avro(value, &v, node->children[0]);
         }
     }
     return rval;
 }
 
-static int pyfloat_to_double(PyObject* obj, avro_value_t* value) {
+static int pyfloat_to_double(PyObject* obj, avro_value_t* value, convert_node* node) {
     double d = PyFloat_AsDouble(obj);
     if (d == -1.0 && PyErr_Occurred()) {
         PyErr_Format(WriteError, "Unable to convert Python object %R to double", obj);
@@ -191,7 +346,7 @@ static int pyfloat_to_double(PyObject* obj, avro_value_t* value) {
     return avro_error(avro_value_set_double(value, d));
 }
 
-static int pyfloat_to_float(PyObject* obj, avro_value_t* value) {
+static int pyfloat_to_float(PyObject* obj, avro_value_t* value, convert_node* node) {
     double d = PyFloat_AsDouble(obj);
     if (d == -1.0 && PyErr_Occurred()) {
         PyErr_Format(WriteError, "Unable to convert Python object %R to float", obj);
@@ -200,7 +355,7 @@ static int pyfloat_to_float(PyObject* obj, avro_value_t* value) {
     return avro_error(avro_value_set_float(value, (float)d));
 }
 
-static int pylist_to_array(PyObject* obj, avro_value_t* dest) {
+static int pylist_to_array(PyObject* obj, avro_value_t* dest, convert_node* node) {
     int rval = 0;
     Py_ssize_t i;
     Py_ssize_t array_length = PySequence_Size(obj);
@@ -208,7 +363,7 @@ static int pylist_to_array(PyObject* obj, avro_value_t* dest) {
         PyObject* item = PySequence_GetItem(obj, i);
         avro_value_t v;
         avro_value_append(dest, &v, NULL);
-        rval = python_to_avro(item, &v);
+        rval = python_to_avro(item, &v, node->children[0]);
         Py_DECREF(item);
         if (rval) {
             return rval;
@@ -217,21 +372,21 @@ static int pylist_to_array(PyObject* obj, avro_value_t* dest) {
     return 0;
 }
 
-static int pylong_to_int32(PyObject* obj, avro_value_t* value) {
+static int pylong_to_int32(PyObject* obj, avro_value_t* value, convert_node* node) {
     long l = PyLong_AsLong(obj);
     return avro_error(avro_value_set_int(value, l));
 }
 
-static int pylong_to_int64(PyObject* obj, avro_value_t* value) {
+static int pylong_to_int64(PyObject* obj, avro_value_t* value, convert_node* node) {
     long long q = PyLong_AsLongLong(obj);
     return avro_error(avro_value_set_long(value, q));
 }
 
-static int pynone_to_null(PyObject* obj, avro_value_t* value) {
+static int pynone_to_null(PyObject* obj, avro_value_t* value, convert_node* node) {
     return avro_error(avro_value_set_null(value));
 }
 
-static int pystring_to_enum(PyObject* obj, avro_value_t* value) {
+static int pystring_to_enum(PyObject* obj, avro_value_t* value, convert_node* node) {
     int index;
     const char* symbol_name;
     avro_schema_t schema = avro_value_get_schema(value);
@@ -250,7 +405,7 @@ static int pystring_to_enum(PyObject* obj, avro_value_t* value) {
     return avro_error(avro_value_set_enum(value, index));
 }
 
-static int pybytes_to_fixed(PyObject* obj, avro_value_t* value) {
+static int pybytes_to_fixed(PyObject* obj, avro_value_t* value, convert_node* node) {
     char* buf;
     Py_ssize_t length;
     if (PyBytes_Check(obj)) {
@@ -262,7 +417,7 @@ static int pybytes_to_fixed(PyObject* obj, avro_value_t* value) {
     return avro_error(avro_value_set_fixed(value, buf, length));
 }
 
-static int pystring_to_string(PyObject* obj, avro_value_t* value) {
+static int pystring_to_string(PyObject* obj, avro_value_t* value, convert_node* node) {
     // Switch to PyUnicode_AsUTF8AndSize and add macros for compat with
     // Python versions before 3.3
     int rval;
@@ -271,37 +426,39 @@ static int pystring_to_string(PyObject* obj, avro_value_t* value) {
     Py_ssize_t length;
     if (PyUnicode_Check(obj)) {
         PyObject* s = PyUnicode_AsUTF8String(obj);
+        if (s == NULL) {
+            return -1;
+        }
         status = PyBytes_AsStringAndSize(s, &buf, &length);
-        if (!status) {
-            //
+        if (status == 0) {
+            rval = avro_error(avro_value_set_string_len(value, buf, length+1));
         }
-        rval = avro_error(avro_value_set_string_len(value, buf, length+1));
         Py_DECREF(s);
     } else {
         status = PyBytes_AsStringAndSize(obj, &buf, &length);
-        if (!status) {
-            //
+        if (status == 0) {
+            rval = avro_error(avro_value_set_string_len(value, buf, length+1));
         }
-        rval = avro_error(avro_value_set_string_len(value, buf, length+1));
+    }
+    if (status != 0) {
+        PyErr_Format(WriteError, "Unable to convert Python object %R to string", obj);
+        return -1;
     }
     return rval;
 }
 
-static int python_to_record(PyObject* obj, avro_value_t* value) {
-    size_t record_length;
+static int python_to_record(PyObject* obj, avro_value_t* value, convert_node* node) {
     size_t i;
     int rval;
-    avro_value_get_size(value, &record_length);
-    for (i=0; i<record_length; i++) {
-        const char* field_name;
+    int is_dict = PyDict_Check(obj);
+    for (i=0; i<node->size; i++) {
         avro_value_t field_value;
-        avro_value_get_by_index(value, i, &field_value, &field_name);
-        PyObject* v = PyDict_GetItemString(obj, field_name);
+        avro_value_get_by_index(value, i, &field_value, NULL);
+        PyObject* v = is_dict ? PyDict_GetItem(obj, node->names[i]) : NULL;
         if (v == NULL) {
-            PyErr_Clear();
             v = Py_None;
         }
-        rval = python_to_avro(v, &field_value);
+        rval = python_to_avro(v, &field_value, node->children[i]);
         if (rval) {
             // const char* record_name = avro_schema_name(avro_value_get_schema(value));
             return rval;
@@ -310,14 +467,68 @@ static int python_to_record(PyObject* obj, avro_value_t* value) {
     return 0;
 }
 
-static int python_to_union(PyObject* obj, avro_value_t* value) {
+static int union_cache_get(convert_node* node, PyTypeObject* type) {
+    size_t i;
+    for (i=0; i<node->cache_count; i++) {
+        if (node->cache[i].type == type) {
+            return node->cache[i].branch;
+        }
+    }
+    return -1;
+}
+
+static void union_cache_set(convert_node* node, PyTypeObject* type, int branch) {
+    if (node->cache_count < UNION_CACHE_SIZE) {
+        node->cache[node->cache_count].type = type;
+        node->cache[node->cache_count].branch = branch;
+        node->cache_count++;
+    }
+}
+
+// Checks that obj can be written as the non-null branch of a nullable
+// union. Only the container type of records, maps and arrays is checked,
+// their contents are checked when converted.
+static int nullable_accepts(PyObject* obj, avro_schema_t schema) {
+    switch (schema->type) {
+        case AVRO_RECORD:
+        case AVRO_MAP:
+            return PyDict_Check(obj);
+        case AVRO_ARRAY:
+            return PyList_Check(obj);
+        case AVRO_LINK:
+            return nullable_accepts(obj, avro_schema_link_target(schema));
+        default:
+            return validate(obj, schema) >= 0;
+    }
+}
+
+static int python_to_union(PyObject* obj, avro_value_t* value, convert_node* node) {
     int branch_index;
     avro_value_t branch;
     avro_schema_t schema;
     avro_schema_t branch_schema;
+    PyObject* n = NULL;
     const char* name;
 
-    schema = avro_value_get_schema(value);
+    schema = node->schema;
+
+    if (node->null_branch >= 0) {
+        if (obj == Py_None) {
+            branch_index = node->null_branch;
+            goto set_branch;
+        }
+        // Other objects, such as enum members, are resolved by name below
+        branch_index = 1 - node->null_branch;
+        if ((PyDict_Check(obj) || PyList_Check(obj) || PyUnicode_Check(obj) || PyBytes_Check(obj) ||
+             PyLong_Check(obj) || PyFloat_Check(obj)) &&
+            nullable_accepts(obj, avro_schema_union_branch(schema, branch_index))) {
+            goto set_branch;
+        }
+    }
+    branch_index = union_cache_get(node, Py_TYPE(obj));
+    if (branch_index >= 0) {
+        goto set_branch;
+    }
 
     if (PyDict_Check(obj)) {
         branch_index = validate(obj, schema);
@@ -329,7 +540,10 @@ static int python_to_union(PyObject* obj, avro_value_t* value) {
         branch_index = validate(obj, schema);
     } else {
         if (strcmp(Py_TYPE(obj)->tp_name, "enum") == 0) {
-            PyObject* n = PyObject_GetAttrString(obj, "name");
+            n = PyObject_GetAttrString(obj, "name");
+            if (n == NULL) {
+                return -1;
+            }
             name = PyUnicode_AsUTF8(n);
         } else if (obj == Py_None) {
             name = "null";
@@ -347,11 +561,23 @@ static int python_to_union(PyObject* obj, avro_value_t* value) {
                 goto union_error;
             }
         }
+        if (n == NULL) {
+            // The branch was found from the name of the type alone, so
+            // every other object of this type resolves to it as well.
+            union_cache_set(node, Py_TYPE(obj), branch_index);
+        }
+        Py_XDECREF(n);
+    }
+    if (branch_index < 0) {
+        PyErr_Format(WriteError, "Unable to find schema branch for Python type '%s'", Py_TYPE(obj)->tp_name);
+        return -1;
     }
+set_branch:
     avro_value_set_branch(value, branch_index, &branch);
-    return python_to_avro(obj, &branch);
+    return python_to_avro(obj, &branch, node->children[branch_index]);
 union_error:
     PyErr_Format(WriteError, "Unable to find schema branch name '%s'", name);
+    Py_XDECREF(n);
     return -1;
 }
 
@@ -371,23 +597,32 @@ static int validate_array(PyObject* obj, avro_schema_t schema) {
 }
 
 static int validate_enum(PyObject* obj, avro_schema_t schema) {
-    int rval;
-    const char* symbol_name;
+    int rval = -1;
+    long index;
+    const char* symbol_name = NULL;
+    PyObject* s = NULL;
 
     if (obj == Py_None) {
         return -1;
     } else if (_PyUnicode_CheckExact(obj)) {
         symbol_name = PyUnicode_AsUTF8(obj);
-        rval = avro_schema_enum_get_by_name(schema, symbol_name);
     } else if (_PyLong_Check(obj)) {
-        symbol_name = avro_schema_enum_get(schema, PyLong_AsLong(obj));
-        rval = avro_schema_enum_get_by_name(schema, symbol_name);
+        index = PyLong_AsLong(obj);
+        if (index >= 0 && index < avro_schema_enum_number_of_symbols(schema)) {
+            symbol_name = avro_schema_enum_get(schema, index);
+        }
     } else {
-        PyObject* s = PyObject_GetAttrString(obj, "value");
-        symbol_name = PyUnicode_AsUTF8(obj);
+        s = PyObject_GetAttrString(obj, "value");
+        if (s != NULL && PyUnicode_Check(s)) {
+            symbol_name = PyUnicode_AsUTF8(s);
+        }
+    }
+    if (symbol_name != NULL) {
         rval = avro_schema_enum_get_by_name(schema, symbol_name);
-        Py_DECREF(s);
     }
+    Py_XDECREF(s);
+    // Validation only reports whether obj matches, never raises
+    PyErr_Clear();
     return rval;
 }
 
@@ -452,88 +687,449 @@ static int validate_union(PyObject* obj, avro_schema_t schema) {
     return -1;
 }
 
-PyObject* avro_to_python(avro_value_t* value) {
-    // The Avro spec calls for defaults to only be applied on read. If
-    // defaults are handled they *could* be done here with a function
-    // that wraps the type conversion functions checking for NoneType
-    // and returning the default value when NoneType is encountered.
-    // This is made difficult since the avro_schema_t does not contain
-    // this information currently. The other option would be to make
-    // a Python closure that returns a function that applies defaults.
-    // This would be light weight and would fit with the general
-    // design of quickavro to be more expressive in Python and let C
-    // just do the heavy lifting.
-    avro_type_t value_type = avro_value_get_type(value);
-    switch (value_type) {
+PyObject* avro_to_python(avro_value_t* value, convert_node* node) {
+    // The Avro spec calls for defaults to only be applied on read. The
+    // avro_schema_t does not carry default values and the resolved
+    // writer requires every reader field to be in the writer schema, so
+    // fields only in the reader schema are dropped from it in Python and
+    // their defaults are attached to the record nodes of the reader plan
+    // with convert_plan_set_defaults.
+    return node->to_python(value, node);
+}
+
+int python_to_avro(PyObject* obj, avro_value_t* value, convert_node* node) {
+    return node->to_avro(obj, value, node);
+}
+
+static convert_node* convert_plan_add(convert_plan* plan, avro_schema_t schema);
+
+enum {
+    KIND_BOOL,
+    KIND_INT,
+    KIND_STR,
+    KIND_BYTES
+};
+
+// Returns 1 if validate accepts every object of the given kind for
+// schema, 0 if it accepts none, and -1 if it depends on the value.
+static int branch_accepts_kind(avro_schema_t schema, int kind) {
+    switch (schema->type) {
         case AVRO_STRING:
-            return string_to_pystring(value);
+            return kind == KIND_STR;
         case AVRO_BYTES:
-            return bytes_to_pybytes(value);
+        case AVRO_FIXED:
+            return kind == KIND_BYTES;
         case AVRO_INT32:
-            return int32_to_pylong(value);
         case AVRO_INT64:
-            return int64_to_pylong(value);
         case AVRO_FLOAT:
-            return float_to_pyfloat(value);
         case AVRO_DOUBLE:
-            return double_to_pyfloat(value);
+            return kind == KIND_INT || kind == KIND_BOOL;
         case AVRO_BOOLEAN:
-            return boolean_to_pybool(value);
-        case AVRO_NULL:
-            return null_to_pynone(value);
-        case AVRO_RECORD:
-            return map_to_pydict(value);
+            return kind == KIND_BOOL;
         case AVRO_ENUM:
-            return enum_to_pystring(value);
-        case AVRO_FIXED:
-            return fixed_to_pybytes(value);
-        case AVRO_MAP:
-            return map_to_pydict(value);
-        case AVRO_ARRAY:
-            return array_to_pylist(value);
-        case AVRO_UNION:
-            return union_to_python(value);
+            return -1;
         case AVRO_LINK:
+            return branch_accepts_kind(avro_schema_link_target(schema), kind);
         default:
-            fprintf(stderr, "Unhandled Type: %d\n", value_type);
+            return 0;
     }
-    Py_RETURN_NONE;
 }
 
-int python_to_avro(PyObject* obj, avro_value_t* value) {
-    avro_type_t value_type = avro_value_get_type(value);
-    switch (value_type) {
+// Fills the union cache with the builtin types whose branch can be
+// determined without looking at the value, matching the resolution
+// done by python_to_union.
+static void union_cache_init(convert_node* node) {
+    size_t i;
+    int accepts;
+    int kind;
+    int branch;
+    avro_schema_t branch_schema;
+    PyTypeObject* types[] = {
+        &PyBool_Type, &PyLong_Type,
+#if PY_MAJOR_VERSION >= 3
+        &PyUnicode_Type, &PyBytes_Type,
+#else
+        &PyInt_Type,
+#endif
+    };
+    int kinds[] = {
+        KIND_BOOL, KIND_INT,
+#if PY_MAJOR_VERSION >= 3
+        KIND_STR, KIND_BYTES,
+#else
+        KIND_INT,
+#endif
+    };
+
+    for (kind=0; kind<(int)tabledef_size(kinds); kind++) {
+        for (i=0; i<node->size; i++) {
+            accepts = branch_accepts_kind(avro_schema_union_branch(node->schema, i), kinds[kind]);
+            if (accepts == 1) {
+                union_cache_set(node, types[kind], i);
+            }
+            if (accepts != 0) {
+                break;
+            }
+        }
+    }
+    // None and float are resolved by branch name
+    branch_schema = avro_schema_union_branch_by_name(node->schema, &branch, "null");
+    if (branch_schema != NULL) {
+        union_cache_set(node, Py_TYPE(Py_None), branch);
+        if (node->size == 2) {
+            node->null_branch = branch;
+        }
+    }
+    branch_schema = avro_schema_union_branch_by_name(node->schema, &branch, "float");
+    if (branch_schema == NULL) {
+        branch_schema = avro_schema_union_branch_by_name(node->schema, &branch, "double");
+    }
+    if (branch_schema != NULL) {
+        union_cache_set(node, &PyFloat_Type, branch);
+    }
+}
+
+static convert_node* convert_node_new(convert_plan* plan, avro_schema_t schema) {
+    convert_node** nodes;
+    convert_node* node;
+
+    if (plan->count == plan->capacity) {
+        plan->capacity = plan->capacity ? plan->capacity * 2 : 16;
+        nodes = (convert_node**)PyMem_Realloc(plan->nodes, plan->capacity * sizeof(convert_node*));
+        if (nodes == NULL) {
+            PyErr_NoMemory();
+            return NULL;
+        }
+        plan->nodes = nodes;
+    }
+    node = (convert_node*)PyMem_Malloc(sizeof(convert_node));
+    if (node == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    memset(node, 0, sizeof(convert_node));
+    node->null_branch = -1;
+    node->type = schema->type;
+    node->schema = schema;
+    plan->nodes[plan->count++] = node;
+    return node;
+}
+
+static int convert_node_children(convert_node* node, size_t size) {
+    node->size = size;
+    node->children = (convert_node**)PyMem_Malloc((size ? size : 1) * sizeof(convert_node*));
+    if (node->children == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    memset(node->children, 0, (size ? size : 1) * sizeof(convert_node*));
+    return 0;
+}
+
+static convert_node* convert_plan_add_record(convert_plan* plan, convert_node* node) {
+    size_t i;
+    size_t size = avro_schema_record_size(node->schema);
+
+    if (convert_node_children(node, size) < 0) {
+        return NULL;
+    }
+    node->names = (PyObject**)PyMem_Malloc((size ? size : 1) * sizeof(PyObject*));
+    if (node->names == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    memset(node->names, 0, (size ? size : 1) * sizeof(PyObject*));
+    for (i=0; i<size; i++) {
+        node->names[i] = PyUnicode_InternFromString(avro_schema_record_field_name(node->schema, i));
+        if (node->names[i] == NULL) {
+            return NULL;
+        }
+        node->children[i] = convert_plan_add(plan, avro_schema_record_field_get_by_index(node->schema, i));
+        if (node->children[i] == NULL) {
+            return NULL;
+        }
+    }
+    return node;
+}
+
+static convert_node* convert_plan_add(convert_plan* plan, avro_schema_t schema) {
+    size_t i;
+    convert_node* node;
+
+    if (schema->type == AVRO_LINK) {
+        return convert_plan_add(plan, avro_schema_link_target(schema));
+    }
+    // Named types are only compiled once so that links to a record that
+    // is still being compiled refer back to its node.
+    if (schema->type == AVRO_RECORD || schema->type == AVRO_ENUM || schema->type == AVRO_FIXED) {
+        for (i=0; i<plan->count; i++) {
+            if (plan->nodes[i]->schema == schema) {
+                return plan->nodes[i];
+            }
+        }
+    }
+    node = convert_node_new(plan, schema);
+    if (node == NULL) {
+        return NULL;
+    }
+    switch (schema->type) {
         case AVRO_STRING:
-            return pystring_to_string(obj, value);
+            node->to_python = string_to_pystring;
+            node->to_avro = pystring_to_string;
+            return node;
         case AVRO_BYTES:
-            return pybytes_to_bytes(obj, value);
+            node->to_python = bytes_to_pybytes;
+            node->to_avro = pybytes_to_bytes;
+            return node;
         case AVRO_INT32:
-            return pylong_to_int32(obj, value);
+            node->to_python = int32_to_pylong;
+            node->to_avro = pylong_to_int32;
+            return node;
         case AVRO_INT64:
-            return pylong_to_int64(obj, value);
+            node->to_python = int64_to_pylong;
+            node->to_avro = pylong_to_int64;
+            return node;
         case AVRO_FLOAT:
-            return pyfloat_to_float(obj, value);
+            node->to_python = float_to_pyfloat;
+            node->to_avro = pyfloat_to_float;
+            return node;
         case AVRO_DOUBLE:
-            return pyfloat_to_double(obj, value);
+            node->to_python = double_to_pyfloat;
+            node->to_avro = pyfloat_to_double;
+            return node;
         case AVRO_BOOLEAN:
-            return pybool_to_boolean(obj, value);
+            node->to_python = boolean_to_pybool;
+            node->to_avro = pybool_to_boolean;
+            return node;
         case AVRO_NULL:
-            return pynone_to_null(obj, value);
+            node->to_python = null_to_pynone;
+            node->to_avro = pynone_to_null;
+            return node;
         case AVRO_RECORD:
-            return python_to_record(obj, value);
+            node->to_python = record_to_pydict;
+            node->to_avro = python_to_record;
+            return convert_plan_add_record(plan, node);
         case AVRO_ENUM:
-            return pystring_to_enum(obj, value);
+            node->to_python = enum_to_pystring;
+            node->to_avro = pystring_to_enum;
+            return node;
         case AVRO_FIXED:
-            return pybytes_to_fixed(obj, value);
+            node->to_python = fixed_to_pybytes;
+            node->to_avro = pybytes_to_fixed;
+            return node;
         case AVRO_MAP:
-            return pydict_to_map(obj, value);
+            node->to_python = map_to_pydict;
+            node->to_avro = pydict_to_map;
+            if (convert_node_children(node, 1) < 0) {
+                return NULL;
+            }
+            node->children[0] = convert_plan_add(plan, avro_schema_map_values(schema));
+            return node->children[0] ? node : NULL;
         case AVRO_ARRAY:
-            return pylist_to_array(obj, value);
+            node->to_python = array_to_pylist;
+            node->to_avro = pylist_to_array;
+            if (convert_node_children(node, 1) < 0) {
+                return NULL;
+            }
+            node->children[0] = convert_plan_add(plan, avro_schema_array_items(schema));
+            return node->children[0] ? node : NULL;
         case AVRO_UNION:
-            return python_to_union(obj, value);
-        case AVRO_LINK:
+            node->to_python = union_to_python;
+            node->to_avro = python_to_union;
+            if (convert_node_children(node, avro_schema_union_size(schema)) < 0) {
+                return NULL;
+            }
+            for (i=0; i<node->size; i++) {
+                node->children[i] = convert_plan_add(plan, avro_schema_union_branch(schema, i));
+                if (node->children[i] == NULL) {
+                    return NULL;
+                }
+            }
+            union_cache_init(node);
+            return node;
         default:
-            fprintf(stderr, "Unhandled Type: %d\n", value_type);
+            PyErr_Format(SchemaError, "Unhandled Type: %d", schema->type);
+            return NULL;
+    }
+}
+
+convert_plan* convert_plan_new(avro_schema_t schema) {
+    convert_plan* plan = (convert_plan*)PyMem_Malloc(sizeof(convert_plan));
+    if (plan == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    memset(plan, 0, sizeof(convert_plan));
+    plan->refcount = 1;
+    plan->root = convert_plan_add(plan, schema);
+    if (plan->root == NULL) {
+        convert_plan_decref(plan);
+        return NULL;
+    }
+    return plan;
+}
+
+convert_plan* convert_plan_incref(convert_plan* plan) {
+    plan->refcount++;
+    return plan;
+}
+
+void convert_plan_decref(convert_plan* plan) {
+    size_t i, j;
+    convert_node* node;
+
+    if (--plan->refcount > 0) {
+        return;
+    }
+    for (i=0; i<plan->count; i++) {
+        node = plan->nodes[i];
+        if (node->names != NULL) {
+            for (j=0; j<node->size; j++) {
+                Py_XDECREF(node->names[j]);
+            }
+            PyMem_Free(node->names);
+        }
+        Py_XDECREF(node->defaults);
+        Py_XDECREF(node->record_class);
+        PyMem_Free(node->slot_offsets);
+        PyMem_Free(node->children);
+        PyMem_Free(node);
+    }
+    PyMem_Free(plan->nodes);
+    PyMem_Free(plan);
+}
+
+static PyObject* record_fullname(convert_node* node) {
+    const char* namespace = avro_schema_namespace(node->schema);
+
+    if (namespace != NULL && namespace[0] != '\0') {
+        return PyUnicode_FromFormat("%s.%s", namespace, avro_schema_name(node->schema));
+    }
+    return PyUnicode_FromString(avro_schema_name(node->schema));
+}
+
+// Looks up the offsets of the slots of the record fields, followed by the
+// fields with defaults, in a class defined with __slots__.
+static int record_slot_offsets(convert_node* node, PyObject* cls) {
+    PyObject *descr, *key, *item;
+    Py_ssize_t pos = 0;
+    size_t i;
+
+    node->slot_offsets = (Py_ssize_t*)PyMem_Malloc((node->record_size ? node->record_size : 1) * sizeof(Py_ssize_t));
+    if (node->slot_offsets == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    for (i=0; i<node->record_size; i++) {
+        if (i < node->size) {
+            key = node->names[i];
+        } else {
+            PyDict_Next(node->defaults, &pos, &key, &item);
+        }
+        descr = PyObject_GetAttr(cls, key);
+        if (descr == NULL) {
+            return -1;
+        }
+        if (Py_TYPE(descr) != &PyMemberDescr_Type ||
+            ((PyMemberDescrObject*)descr)->d_member->type != T_OBJECT_EX) {
+            Py_DECREF(descr);
+            PyErr_SetString(PyExc_TypeError, "Record classes must define a slot for each field");
+            return -1;
+        }
+        node->slot_offsets[i] = ((PyMemberDescrObject*)descr)->d_member->offset;
+        Py_DECREF(descr);
+    }
+    return 0;
+}
+
+// Sets the classes records are decoded into. classes maps the full name
+// of records to either a tuple subclass or a class with a slot for each
+// field, with fields that have defaults after the other fields. Records
+// not in classes, or every record if classes is NULL, are decoded into
+// dictionaries.
+int convert_plan_set_record_classes(convert_plan* plan, PyObject* classes) {
+    size_t i;
+    convert_node* node;
+    PyObject *name, *cls;
+
+    if (classes != NULL && !PyDict_Check(classes)) {
+        PyErr_SetString(PyExc_TypeError, "Record classes must be a dictionary");
+        return -1;
+    }
+    for (i=0; i<plan->count; i++) {
+        node = plan->nodes[i];
+        // Plans shared between encoders never have record classes, so
+        // resetting leaves them untouched.
+        if (node->type != AVRO_RECORD || (classes == NULL && node->record_class == NULL)) {
+            continue;
+        }
+        Py_CLEAR(node->record_class);
+        PyMem_Free(node->slot_offsets);
+        node->slot_offsets = NULL;
+        node->to_python = record_to_pydict;
+        if (classes == NULL) {
+            continue;
+        }
+        name = record_fullname(node);
+        if (name == NULL) {
+            return -1;
+        }
+        cls = PyDict_GetItem(classes, name);
+        Py_DECREF(name);
+        if (cls == NULL) {
+            continue;
+        }
+        if (!PyType_Check(cls)) {
+            PyErr_SetString(PyExc_TypeError, "Record classes must be types");
+            return -1;
+        }
+        node->record_size = node->size + (node->defaults != NULL ? PyDict_Size(node->defaults) : 0);
+        if (PyType_IsSubtype((PyTypeObject*)cls, &PyTuple_Type)) {
+            node->to_python = record_to_pytuple;
+        } else {
+            if (record_slot_offsets(node, cls) < 0) {
+                return -1;
+            }
+            node->to_python = record_to_pyslots;
+        }
+        Py_INCREF(cls);
+        node->record_class = cls;
+    }
+    return 0;
+}
+
+// Attaches default values to the record nodes of plan. defaults maps the
+// full name of records to dictionaries of field names to default values.
+int convert_plan_set_defaults(convert_plan* plan, PyObject* defaults) {
+    size_t i;
+    convert_node* node;
+    PyObject *name, *fields;
+
+    if (!PyDict_Check(defaults)) {
+        PyErr_SetString(PyExc_TypeError, "Defaults must be a dictionary");
+        return -1;
+    }
+    for (i=0; i<plan->count; i++) {
+        node = plan->nodes[i];
+        if (node->type != AVRO_RECORD) {
+            continue;
+        }
+        name = record_fullname(node);
+        if (name == NULL) {
+            return -1;
+        }
+        fields = PyDict_GetItem(defaults, name);
+        Py_DECREF(name);
+        if (fields == NULL) {
+            continue;
+        }
+        if (!PyDict_Check(fields)) {
+            PyErr_SetString(PyExc_TypeError, "Record defaults must be a dictionary");
+            return -1;
+        }
+        Py_INCREF(fields);
+        Py_XDECREF(node->defaults);
+        node->defaults = fields;
     }
     return 0;
 }
@@ -44,9 +44,76 @@ static const tabledef p2a[] = {
     {NULL}
 };
 
+#define UNION_CACHE_SIZE 8
+
+typedef struct convert_node convert_node;
+
+typedef struct {
+    PyTypeObject* type;
+    int branch;
+} union_cache_entry;
+
+typedef PyObject* (*to_python_func)(avro_value_t* value, convert_node* node);
+typedef int (*to_avro_func)(PyObject* obj, avro_value_t* value, convert_node* node);
+
+// A node of a compiled conversion plan. Nodes mirror the schema, with
+// links resolved to the node of their target, and carry the conversion
+// functions for their type so that conversion does not need to inspect
+// values or schemas.
+struct convert_node {
+    avro_type_t    type;
+    avro_schema_t  schema;
+    to_python_func to_python;
+    to_avro_func   to_avro;
+
+    // Number of record fields or union branches
+    size_t size;
+    // Interned record field names
+    PyObject** names;
+    // Record fields, union branches, or array items/map values as the
+    // only child
+    convert_node** children;
+
+    // Union branch resolution. Maps Python types whose branch does not
+    // depend on the value to the branch index, and for unions of null
+    // and one other type holds the index of the null branch.
+    union_cache_entry cache[UNION_CACHE_SIZE];
+    size_t cache_count;
+    int null_branch;
+
+    // Dictionary of record field names to the default values of fields
+    // that are in the reader schema but not in the writer schema, set
+    // by convert_plan_set_defaults.
+    PyObject* defaults;
+
+    // Class records are decoded into instead of dictionaries, set by
+    // convert_plan_set_record_classes. record_size is the number of
+    // fields including defaults, and slot_offsets the offsets of their
+    // slots for classes with __slots__.
+    PyObject* record_class;
+    size_t record_size;
+    Py_ssize_t* slot_offsets;
+};
+
+typedef struct {
+    int refcount;
+    convert_node* root;
+
+    // Every node of the plan, owned by the plan. Recursive schemas make
+    // the node graph cyclic so nodes are freed from this list.
+    convert_node** nodes;
+    size_t count;
+    size_t capacity;
+} convert_plan;
+
 int avro_error(int rval);
-int python_to_avro(PyObject* obj, avro_value_t* value);
-PyObject* avro_to_python(avro_value_t* value);
+convert_plan* convert_plan_new(avro_schema_t schema);
+convert_plan* convert_plan_incref(convert_plan* plan);
+void convert_plan_decref(convert_plan* plan);
+int convert_plan_set_defaults(convert_plan* plan, PyObject* defaults);
+int convert_plan_set_record_classes(convert_plan* plan, PyObject* classes);
+int python_to_avro(PyObject* obj, avro_value_t* value, convert_node* node);
+PyObject* avro_to_python(avro_value_t* value, convert_node* node);
 int validate(PyObject* obj, avro_schema_t schema);
 
 #ifdef __cplusplus
@@ -15,8 +15,11 @@
  */
 
 #include "encoderobject.h"
+#include "columnar.h"
 #include "compat.h"
 #include "convert.h"
+#include "iteratorobject.h"
+#include "schemaobject.h"
 #include "quickavro.h"
 #include <avro.h>
 
@@ -26,13 +29,62 @@ PyObject *ReadError;
 PyObject *SchemaError;
 PyObject *WriteError;
 
-static void Encoder_dealloc(Encoder* self) {
-    if (self->schema != NULL) {
-        avro_schema_decref(self->schema);
+static void Encoder_lock(Encoder* self) {
+    // The lock must never be waited on while holding the GIL, otherwise
+    // a thread holding the lock could not get the GIL back.
+    if (!PyThread_acquire_lock(self->lock, NOWAIT_LOCK)) {
+        Py_BEGIN_ALLOW_THREADS
+        PyThread_acquire_lock(self->lock, WAIT_LOCK);
+        Py_END_ALLOW_THREADS
+    }
+}
+
+static void Encoder_unlock(Encoder* self) {
+    PyThread_release_lock(self->lock);
+}
+
+static void Encoder_clear_reader_schema(Encoder* self) {
+    if (self->resolver != NULL) {
+        avro_value_iface_decref(self->resolver);
+        self->resolver = NULL;
+    }
+    if (self->reader_iface != NULL) {
+        avro_value_iface_decref(self->reader_iface);
+        self->reader_iface = NULL;
+    }
+    if (self->reader_plan != NULL) {
+        convert_plan_decref(self->reader_plan);
+        self->reader_plan = NULL;
+    }
+    if (self->reader_schema != NULL) {
+        avro_schema_decref(self->reader_schema);
+        self->reader_schema = NULL;
+    }
+}
+
+static void Encoder_clear_schema(Encoder* self) {
+    Encoder_clear_reader_schema(self);
+    if (self->value.iface != NULL) {
+        avro_value_decref(&self->value);
+        self->value.iface = NULL;
+        self->value.self = NULL;
     }
     if (self->iface != NULL) {
         avro_value_iface_decref(self->iface);
+        self->iface = NULL;
     }
+    if (self->plan != NULL) {
+        convert_plan_decref(self->plan);
+        self->plan = NULL;
+    }
+    if (self->schema != NULL) {
+        avro_schema_decref(self->schema);
+        self->schema = NULL;
+    }
+}
+
+static void Encoder_dealloc(Encoder* self) {
+    Encoder_clear_schema(self);
     if (self->reader != NULL) {
         avro_reader_free(self->reader);
     }
@@ -42,6 +94,9 @@ static void Encoder_dealloc(Encoder* self) {
     if (self->buffer != NULL) {
         avro_free(self->buffer, self->buffer_length);
     }
+    if (self->lock != NULL) {
+        PyThread_free_lock(self->lock);
+    }
 
     Py_TYPE(self)->tp_free((PyObject*)self);
 }
@@ -54,7 +109,15 @@ static PyObject* Encoder_new(PyTypeObject* type, PyObject* args, PyObject* kwds)
     self->reader = NULL;
     self->writer = NULL;
     self->iface = NULL;
+    self->plan = NULL;
     self->schema = NULL;
+    self->reader_schema = NULL;
+    self->reader_iface = NULL;
+    self->resolver = NULL;
+    self->reader_plan = NULL;
+    self->value.iface = NULL;
+    self->value.self = NULL;
+    self->lock = NULL;
     return (PyObject*)self;
 }
 
@@ -63,29 +126,61 @@ static int Encoder_init(Encoder* self, PyObject* args, PyObject* kwds) {
     self->buffer = (char*)avro_malloc(INITIAL_BUFFER_SIZE);
     self->buffer_length = INITIAL_BUFFER_SIZE;
     self->writer = avro_writer_memory(self->buffer, self->buffer_length);
+    self->lock = PyThread_allocate_lock();
+    if (self->lock == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
     return 0;
 }
 
+static PyObject* Encoder_iter_read(Encoder* self, PyObject* args) {
+    return RecordIterator_New(self, args);
+}
+
 static PyObject* Encoder_read(Encoder* self, PyObject* args) {
+    PyObject* iter;
+    PyObject* values;
+
+    iter = RecordIterator_New(self, args);
+    if (iter == NULL) {
+        return NULL;
+    }
+    values = PySequence_List(iter);
+    Py_DECREF(iter);
+    return values;
+}
+
+static PyObject* Encoder_read_columnar(Encoder* self, PyObject* args) {
     Py_buffer buffer;
-    int rval;
+    avro_reader_t reader;
+    avro_value_t value, dest;
+    PyObject* result;
 
+    if (self->iface == NULL) {
+        PyErr_SetString(SchemaError, "Schema must be set before reading records");
+        return NULL;
+    }
     if (!PyArg_ParseTuple(args, "s*", &buffer)) {
-        Py_RETURN_NONE;
+        return NULL;
     }
-    avro_value_t value;
-    avro_reader_memory_set_source(self->reader, buffer.buf, buffer.len);
-    avro_generic_value_new(self->iface, &value);
-    PyObject* values = PyList_New(0);
-    while ((rval = avro_value_read(self->reader, &value)) == 0) {
-        PyObject* item = avro_to_python(&value);
-        PyList_Append(values, item);
-        avro_value_reset(&value);
-        Py_DECREF(item);
+    // Like RecordIterator, the reader and values are owned by this call
+    // so the encoder lock is not needed.
+    reader = avro_reader_memory(buffer.buf, buffer.len);
+    if (self->resolver != NULL) {
+        avro_resolved_writer_new_value(self->resolver, &value);
+        avro_generic_value_new(self->reader_iface, &dest);
+        avro_resolved_writer_set_dest(&value, &dest);
+        result = read_columnar(reader, &value, &dest, self->reader_plan->root);
+        avro_value_decref(&dest);
+    } else {
+        avro_generic_value_new(self->iface, &value);
+        result = read_columnar(reader, &value, &value, self->plan->root);
     }
     avro_value_decref(&value);
+    avro_reader_free(reader);
     PyBuffer_Release(&buffer);
-    return values;
+    return result;
 }
 
 static PyObject* Encoder_read_long(Encoder* self, PyObject* args) {
@@ -101,9 +196,15 @@ static PyObject* Encoder_read_long(Encoder* self, PyObject* args) {
     int offset = 0;
     do {
         if (offset == MAX_VARINT_SIZE) {
+            PyBuffer_Release(&buffer);
             PyErr_SetString(ReadError, "Varint is too long");
             return NULL;
         }
+        if (offset == buffer.len) {
+            PyBuffer_Release(&buffer);
+            PyErr_SetString(ReadError, "Unexpected end of data while reading varint");
+            return NULL;
+        }
         b = buf[offset];
         value |= (int64_t) (b & 0x7F) << (7 * offset);
         ++offset;
@@ -115,87 +216,466 @@ static PyObject* Encoder_read_long(Encoder* self, PyObject* args) {
 
 static PyObject* Encoder_read_record(Encoder* self, PyObject* args) {
     Py_buffer buffer;
-    PyObject *obj;
+    PyObject *obj = NULL;
     size_t record_size;
     int rval;
 
     if (!PyArg_ParseTuple(args, "s*", &buffer)) {
         Py_RETURN_NONE;
     }
-    avro_value_t value;
-    avro_reader_memory_set_source(self->reader, buffer.buf, buffer.len);
-    avro_generic_value_new(self->iface, &value);
-    if ((rval = avro_value_read(self->reader, &value)) != 0) {
-        PyErr_Format(ReadError, "%s", avro_strerror());
+    if (self->iface == NULL) {
+        PyBuffer_Release(&buffer);
+        PyErr_SetString(SchemaError, "Schema must be set before reading records");
         return NULL;
     }
-    obj = avro_to_python(&value);
-    if ((rval = avro_value_sizeof(&value, &record_size)) != 0) {
+    Encoder_lock(self);
+    Py_BEGIN_ALLOW_THREADS
+    avro_value_reset(&self->value);
+    avro_reader_memory_set_source(self->reader, buffer.buf, buffer.len);
+    if ((rval = avro_value_read(self->reader, &self->value)) == 0) {
+        rval = avro_value_sizeof(&self->value, &record_size);
+    }
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&buffer);
+    if (rval != 0) {
         PyErr_Format(ReadError, "%s", avro_strerror());
+    } else {
+        obj = avro_to_python(&self->value, self->plan->root);
+    }
+    Encoder_unlock(self);
+    if (obj == NULL) {
         return NULL;
     }
-    avro_value_decref(&value);
-    PyBuffer_Release(&buffer);
-    // TODO: refcount wrong, there are others
     // TODO: also check all the PyLong_ calls to make sure they
     // have the correct size types
-    PyObject *ret = Py_BuildValue("(OO)", obj, PyLong_FromLong(record_size));
-    Py_XDECREF(obj);
+    PyObject *ret = Py_BuildValue("(NN)", obj, PyLong_FromLong(record_size));
     return ret;
 }
 
 static PyObject* Encoder_set_schema(Encoder* self, PyObject* args) {
-    char* json_str;
+    PyObject* obj;
+    Schema* compiled = NULL;
+    char* json_str = NULL;
     avro_schema_error_t error;
+    avro_schema_t schema = NULL;
 
-    if (!PyArg_ParseTuple(args, "s", &json_str)) {
+    if (!PyArg_ParseTuple(args, "O", &obj)) {
         PyErr_SetString(SchemaError, "Not provided valid arguments");
         return NULL;
     }
-    int r = avro_schema_from_json(json_str, 0, &self->schema, &error);
-    if (r != 0 || self->schema == NULL) {
-        self->schema = NULL;
-        PyErr_Format(SchemaError, "%s", avro_strerror());
+    // Compiled schemas are shared, only their reference counts change.
+    if (PyObject_TypeCheck(obj, &SchemaType)) {
+        compiled = (Schema*)obj;
+        if (compiled->schema == NULL) {
+            PyErr_SetString(SchemaError, "Schema is not initialized");
+            return NULL;
+        }
+    } else if (!PyArg_Parse(obj, "s", &json_str)) {
+        PyErr_Clear();
+        PyErr_SetString(SchemaError, "Not provided valid arguments");
         return NULL;
     }
-    self->iface = avro_generic_class_from_schema(self->schema);
+    Encoder_lock(self);
+    Encoder_clear_schema(self);
+    if (compiled != NULL) {
+        self->schema = avro_schema_incref(compiled->schema);
+        self->plan = convert_plan_incref(compiled->plan);
+        self->iface = avro_value_iface_incref(compiled->iface);
+    } else {
+        int r = avro_schema_from_json(json_str, 0, &schema, &error);
+        if (r != 0 || schema == NULL) {
+            Encoder_unlock(self);
+            PyErr_Format(SchemaError, "%s", avro_strerror());
+            return NULL;
+        }
+        self->schema = schema;
+        self->plan = convert_plan_new(self->schema);
+        if (self->plan == NULL) {
+            Encoder_clear_schema(self);
+            Encoder_unlock(self);
+            return NULL;
+        }
+        self->iface = avro_generic_class_from_schema(self->schema);
+    }
+    avro_generic_value_new(self->iface, &self->value);
+    Encoder_unlock(self);
     return Py_BuildValue("i", 0);
 }
 
+static PyObject* Encoder_set_reader_schema(Encoder* self, PyObject* args) {
+    char* json_str = NULL;
+    PyObject* defaults = NULL;
+    avro_schema_error_t error;
+    avro_schema_t schema = NULL;
+
+    if (!PyArg_ParseTuple(args, "z|O", &json_str, &defaults)) {
+        PyErr_SetString(SchemaError, "Not provided valid arguments");
+        return NULL;
+    }
+    if (self->schema == NULL) {
+        PyErr_SetString(SchemaError, "Writer schema must be set before the reader schema");
+        return NULL;
+    }
+    Encoder_lock(self);
+    Encoder_clear_reader_schema(self);
+    if (json_str == NULL) {
+        Encoder_unlock(self);
+        Py_RETURN_NONE;
+    }
+    int r = avro_schema_from_json(json_str, 0, &schema, &error);
+    if (r != 0 || schema == NULL) {
+        Encoder_unlock(self);
+        PyErr_Format(SchemaError, "%s", avro_strerror());
+        return NULL;
+    }
+    self->reader_schema = schema;
+    self->resolver = avro_resolved_writer_new(self->schema, self->reader_schema);
+    if (self->resolver == NULL) {
+        Encoder_clear_reader_schema(self);
+        Encoder_unlock(self);
+        PyErr_Format(SchemaError, "%s", avro_strerror());
+        return NULL;
+    }
+    self->reader_plan = convert_plan_new(self->reader_schema);
+    if (self->reader_plan == NULL ||
+        (defaults != NULL && defaults != Py_None && convert_plan_set_defaults(self->reader_plan, defaults) < 0)) {
+        Encoder_clear_reader_schema(self);
+        Encoder_unlock(self);
+        return NULL;
+    }
+    self->reader_iface = avro_generic_class_from_schema(self->reader_schema);
+    Encoder_unlock(self);
+    Py_RETURN_NONE;
+}
+
+static PyObject* Encoder_set_record_type(Encoder* self, PyObject* args) {
+    PyObject* classes = Py_None;
+    PyObject* reader_classes = Py_None;
+    convert_plan* plan;
+
+    if (!PyArg_ParseTuple(args, "|OO", &classes, &reader_classes)) {
+        return NULL;
+    }
+    if (self->plan == NULL) {
+        PyErr_SetString(SchemaError, "Schema must be set before the record type");
+        return NULL;
+    }
+    Encoder_lock(self);
+    if (classes == Py_None) {
+        if (convert_plan_set_record_classes(self->plan, NULL) < 0) {
+            Encoder_unlock(self);
+            return NULL;
+        }
+    } else {
+        // The plan of the writer schema may be shared with other encoders
+        // through the schema cache, so record classes are set on a plan
+        // private to this encoder.
+        plan = convert_plan_new(self->schema);
+        if (plan == NULL || convert_plan_set_record_classes(plan, classes) < 0) {
+            if (plan != NULL) {
+                convert_plan_decref(plan);
+            }
+            Encoder_unlock(self);
+            return NULL;
+        }
+        convert_plan_decref(self->plan);
+        self->plan = plan;
+    }
+    if (self->reader_plan != NULL &&
+        convert_plan_set_record_classes(self->reader_plan, reader_classes == Py_None ? NULL : reader_classes) < 0) {
+        Encoder_unlock(self);
+        return NULL;
+    }
+    Encoder_unlock(self);
+    Py_RETURN_NONE;
+}
+
+// Serializes value after the data already in the encoder buffer, growing
+// the buffer as needed. The writer destination starts at *base bytes into
+// the buffer, so the total amount of data buffered is always *base plus
+// avro_writer_tell. Must be called with the encoder lock held and may be
+// called without the GIL.
+static int Encoder_write_value(Encoder* self, avro_value_t* value, size_t* base) {
+    char* new_buffer;
+    size_t new_size;
+    size_t start = *base + avro_writer_tell(self->writer);
+    int rval = avro_value_write(self->writer, value);
+
+    while (rval == ENOSPC) {
+        new_size = self->buffer_length * 2;
+        new_buffer = (char*)avro_realloc(self->buffer, self->buffer_length, new_size);
+        if (!new_buffer) {
+            return ENOMEM;
+        }
+        self->buffer = new_buffer;
+        self->buffer_length = new_size;
+        // Resume right after the last complete value, the partially
+        // written one is serialized again from the start.
+        *base = start;
+        avro_writer_memory_set_dest(self->writer, self->buffer + start, self->buffer_length - start);
+        rval = avro_value_write(self->writer, value);
+    }
+    return rval;
+}
+
+static void Encoder_write_error(int rval) {
+    if (PyErr_Occurred()) {
+        return;
+    }
+    if (rval == ENOMEM) {
+        PyErr_NoMemory();
+    } else {
+        PyErr_Format(WriteError, "%s", avro_strerror());
+    }
+}
+
 static PyObject* Encoder_write(Encoder* self, PyObject* args) {
     PyObject* obj;
+    PyObject* s = NULL;
+    size_t base = 0;
     int rval;
 
     if (!PyArg_ParseTuple(args, "O", &obj)) {
         Py_RETURN_NONE;
     }
-    avro_value_t value;
-    avro_generic_value_new(self->iface, &value);
-    rval = python_to_avro(obj, &value);
+    if (self->iface == NULL) {
+        PyErr_SetString(SchemaError, "Schema must be set before writing records");
+        return NULL;
+    }
+    Encoder_lock(self);
+    avro_value_reset(&self->value);
+    rval = python_to_avro(obj, &self->value, self->plan->root);
     if (rval == 0) {
-        rval = avro_value_write(self->writer, &value);
+        Py_BEGIN_ALLOW_THREADS
+        rval = Encoder_write_value(self, &self->value, &base);
+        Py_END_ALLOW_THREADS
+        if (rval) {
+            Encoder_write_error(rval);
+        } else {
+            s = PyBytes_FromStringAndSize(self->buffer, base + avro_writer_tell(self->writer));
+        }
     }
-    size_t new_size;
+    avro_writer_memory_set_dest(self->writer, self->buffer, self->buffer_length);
+    Encoder_unlock(self);
+    return s;
+}
 
-    while (rval == ENOSPC) {
-        new_size = self->buffer_length * 2;
-        self->buffer = (char*)avro_realloc(self->buffer, self->buffer_length, new_size);
-        if (!self->buffer) {
-            PyErr_NoMemory();
-            return NULL;
+// Initial size of the payload of write_many when it has no size limit
+#define WRITE_MANY_INITIAL_SIZE 4096
+
+// Serializes the current value of the encoder at offset *size of the
+// bytes object *out, growing it as needed, and advances *size past it.
+// Must be called with the encoder lock held.
+static int Encoder_write_into(Encoder* self, PyObject** out, size_t* size) {
+    Py_ssize_t capacity;
+    int rval;
+
+    while (1) {
+        capacity = PyBytes_GET_SIZE(*out);
+        avro_writer_memory_set_dest(self->writer, PyBytes_AS_STRING(*out) + *size, capacity - *size);
+        Py_BEGIN_ALLOW_THREADS
+        rval = avro_value_write(self->writer, &self->value);
+        Py_END_ALLOW_THREADS
+        if (rval != ENOSPC) {
+            break;
+        }
+        // The partially written value is serialized again from the start
+        if (_PyBytes_Resize(out, capacity * 2) < 0) {
+            rval = ENOMEM;
+            break;
         }
-        self->buffer_length = new_size;
-        avro_writer_memory_set_dest(self->writer, self->buffer, self->buffer_length);
-        rval = avro_value_write(self->writer, &value);
     }
+    if (rval == 0) {
+        *size += avro_writer_tell(self->writer);
+    }
+    avro_writer_memory_set_dest(self->writer, self->buffer, self->buffer_length);
+    return rval;
+}
 
-    if (rval) {
-        avro_value_decref(&value);
+static PyObject* Encoder_write_many(Encoder* self, PyObject* args) {
+    PyObject* records;
+    PyObject* iter;
+    PyObject* item;
+    PyObject* out;
+    PyObject* s = NULL;
+    Py_ssize_t max_size = 0;
+    Py_ssize_t max_count = 0;
+    Py_ssize_t count = 0;
+    size_t size = 0;
+    int rval = 0;
+
+    if (!PyArg_ParseTuple(args, "O|nn", &records, &max_size, &max_count)) {
         return NULL;
     }
-    PyObject* s = PyBytes_FromStringAndSize(self->buffer, avro_writer_tell(self->writer));
-    avro_writer_reset(self->writer);
-    avro_value_decref(&value);
+    if (self->iface == NULL) {
+        PyErr_SetString(SchemaError, "Schema must be set before writing records");
+        return NULL;
+    }
+    iter = PyObject_GetIter(records);
+    if (iter == NULL) {
+        return NULL;
+    }
+    out = PyBytes_FromStringAndSize(NULL, max_size > 0 ? max_size : WRITE_MANY_INITIAL_SIZE);
+    if (out == NULL) {
+        Py_DECREF(iter);
+        return NULL;
+    }
+
+    // Records are serialized back to back straight into the bytes object
+    // returned as the block payload. The iterator is left positioned
+    // after the last record written, so remaining records can be passed
+    // to the next call. The lock is only held while a record is
+    // serialized, never while the iterator runs, since it may use this
+    // encoder itself.
+    while ((max_size <= 0 || (Py_ssize_t)size < max_size) &&
+           (max_count <= 0 || count < max_count)) {
+        item = PyIter_Next(iter);
+        if (item == NULL) {
+            break;
+        }
+        Encoder_lock(self);
+        if (self->iface == NULL) {
+            PyErr_SetString(SchemaError, "Schema must be set before writing records");
+            rval = -1;
+        } else {
+            avro_value_reset(&self->value);
+            rval = python_to_avro(item, &self->value, self->plan->root);
+            if (rval == 0) {
+                rval = Encoder_write_into(self, &out, &size);
+            }
+            if (rval) {
+                Encoder_write_error(rval);
+            }
+        }
+        Encoder_unlock(self);
+        Py_DECREF(item);
+        if (rval) {
+            break;
+        }
+        count++;
+    }
+    if (out != NULL && !PyErr_Occurred() && _PyBytes_Resize(&out, size) == 0) {
+        s = Py_BuildValue("(nN)", count, out);
+        out = NULL;
+    }
+    Py_XDECREF(out);
+    Py_DECREF(iter);
+    return s;
+}
+
+static PyObject* Encoder_write_columns(Encoder* self, PyObject* args) {
+    PyObject* obj;
+    PyObject* columns;
+    PyObject* s = NULL;
+    column_source* sources;
+    column_buffer out;
+    convert_node* root;
+    Py_ssize_t offset = 0;
+    Py_ssize_t max_size = 0;
+    Py_ssize_t max_count = 0;
+    Py_ssize_t length = -1;
+    Py_ssize_t row, count = 0;
+    size_t i, initialized = 0;
+    int native = 1;
+    int rval = 0;
+
+    if (!PyArg_ParseTuple(args, "O|nnn", &obj, &offset, &max_size, &max_count)) {
+        return NULL;
+    }
+    if (self->plan == NULL) {
+        PyErr_SetString(SchemaError, "Schema must be set before writing records");
+        return NULL;
+    }
+    root = self->plan->root;
+    if (root->type != AVRO_RECORD) {
+        PyErr_SetString(SchemaError, "Columnar writes require a record schema");
+        return NULL;
+    }
+    columns = PySequence_Fast(obj, "Columns must be a sequence");
+    if (columns == NULL) {
+        return NULL;
+    }
+    if ((size_t)PySequence_Fast_GET_SIZE(columns) != root->size) {
+        Py_DECREF(columns);
+        PyErr_SetString(PyExc_ValueError, "Expected one column per record field");
+        return NULL;
+    }
+    sources = (column_source*)PyMem_Malloc((root->size ? root->size : 1) * sizeof(column_source));
+    if (sources == NULL) {
+        Py_DECREF(columns);
+        return PyErr_NoMemory();
+    }
+    memset(&out, 0, sizeof(out));
+    for (i=0; i<root->size; i++) {
+        rval = column_source_init(&sources[i], PySequence_Fast_GET_ITEM(columns, i), root->children[i]);
+        if (rval != 0) {
+            // Fields without a columnar representation are reported with
+            // None so that the caller can fall back to records.
+            if (rval == 1) {
+                column_source_release(&sources[i]);
+                Py_INCREF(Py_None);
+                s = Py_None;
+            }
+            goto done;
+        }
+        initialized++;
+        if (!sources[i].has_view) {
+            native = 0;
+        }
+        if (length >= 0 && sources[i].length != length) {
+            PyErr_SetString(PyExc_ValueError, "Columns must all have the same length");
+            goto done;
+        }
+        length = sources[i].length;
+    }
+    if (length < 0) {
+        length = 0;
+    }
+
+    // Rows are serialized field by field straight from the columns. When
+    // every column is a buffer no Python object is touched, so the GIL
+    // is released for the whole batch.
+    if (native) {
+        Py_BEGIN_ALLOW_THREADS
+        for (row=offset; row<length && rval == 0; row++) {
+            if ((max_size > 0 && (Py_ssize_t)out.size >= max_size) || (max_count > 0 && count >= max_count)) {
+                break;
+            }
+            for (i=0; i<root->size && rval == 0; i++) {
+                rval = column_source_write(&sources[i], row, &out);
+            }
+            count++;
+        }
+        Py_END_ALLOW_THREADS
+    } else {
+        for (row=offset; row<length && rval == 0; row++) {
+            if ((max_size > 0 && (Py_ssize_t)out.size >= max_size) || (max_count > 0 && count >= max_count)) {
+                break;
+            }
+            for (i=0; i<root->size && rval == 0; i++) {
+                rval = column_source_write(&sources[i], row, &out);
+            }
+            count++;
+        }
+    }
+    if (rval == ENOMEM) {
+        PyErr_NoMemory();
+    } else if (rval == ERANGE) {
+        PyErr_SetString(WriteError, "Column value out of range of the field type");
+    } else if (rval == 0) {
+        s = PyBytes_FromStringAndSize(out.data ? out.data : "", out.size);
+        if (s != NULL) {
+            s = Py_BuildValue("(nN)", count, s);
+        }
+    }
+
+done:
+    for (i=0; i<initialized; i++) {
+        column_source_release(&sources[i]);
+    }
+    PyMem_Free(sources);
+    free(out.data);
+    Py_DECREF(columns);
     return s;
 }
 
@@ -220,11 +700,17 @@ static PyObject* Encoder_write_long(Encoder* self, PyObject* args) {
 }
 
 static PyMethodDef Encoder_methods[] = {
+    {"iter_read", (PyCFunction)Encoder_iter_read, METH_VARARGS, ""},
+    {"read_columnar", (PyCFunction)Encoder_read_columnar, METH_VARARGS, ""},
     {"read", (PyCFunction)Encoder_read, METH_VARARGS, ""},
     {"read_long", (PyCFunction)Encoder_read_long, METH_VARARGS, ""},
     {"read_record", (PyCFunction)Encoder_read_record, METH_VARARGS, ""},
+    {"set_reader_schema", (PyCFunction)Encoder_set_reader_schema, METH_VARARGS, ""},
+    {"set_record_type", (PyCFunction)Encoder_set_record_type, METH_VARARGS, ""},
     {"set_schema", (PyCFunction)Encoder_set_schema, METH_VARARGS, ""},
     {"write", (PyCFunction)Encoder_write, METH_VARARGS, ""},
+    {"write_many", (PyCFunction)Encoder_write_many, METH_VARARGS, ""},
+    {"write_columns", (PyCFunction)Encoder_write_columns, METH_VARARGS, ""},
     {"write_long", (PyCFunction)Encoder_write_long, METH_VARARGS, ""},
     {NULL}  /* Sentinel */
 };
@@ -22,8 +22,11 @@ extern "C" {
 #endif
 
 #include <Python.h>
+#include <pythread.h>
 #include <avro.h>
 
+#include "convert.h"
+
 extern PyObject *AvroError;
 extern PyObject *ReadError;
 extern PyObject *SchemaError;
@@ -33,12 +36,28 @@ typedef struct {
     PyObject_HEAD
     avro_schema_t       schema;
     avro_value_iface_t* iface;
+    convert_plan*       plan;
     avro_reader_t       reader;
     avro_writer_t       writer;
 
+    // Optional reader schema, records read with iter_read are resolved
+    // from the writer schema to it
+    avro_schema_t       reader_schema;
+    avro_value_iface_t* reader_iface;
+    avro_value_iface_t* resolver;
+    convert_plan*       reader_plan;
+
+    // Reused for every record written or read with read_record, reset
+    // between records instead of being allocated each time
+    avro_value_t        value;
+
     int flags;
     char* buffer;
     size_t buffer_length;
+
+    // Serializes access to the reader, writer and buffer while the GIL
+    // is released
+    PyThread_type_lock lock;
 } Encoder;
 
 extern PyTypeObject EncoderType;
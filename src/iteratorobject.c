@@ -0,0 +1,153 @@
+/*
+ * Copyright 2016 Chris Marshall
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#include "iteratorobject.h"
+#include "compat.h"
+#include "convert.h"
+#include <avro.h>
+
+
+static void RecordIterator_release(RecordIterator* self) {
+    if (self->done) {
+        return;
+    }
+    avro_value_decref(&self->value);
+    avro_value_iface_decref(self->iface);
+    if (self->dest_iface != NULL) {
+        avro_value_decref(&self->dest);
+        avro_value_iface_decref(self->dest_iface);
+        self->dest_iface = NULL;
+    }
+    convert_plan_decref(self->plan);
+    avro_reader_free(self->reader);
+    PyBuffer_Release(&self->buffer);
+    self->iface = NULL;
+    self->plan = NULL;
+    self->reader = NULL;
+    self->done = 1;
+}
+
+static void RecordIterator_dealloc(RecordIterator* self) {
+    RecordIterator_release(self);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+PyObject* RecordIterator_New(Encoder* encoder, PyObject* args) {
+    RecordIterator* self;
+
+    if (encoder->iface == NULL) {
+        PyErr_SetString(SchemaError, "Schema must be set before reading records");
+        return NULL;
+    }
+    self = PyObject_New(RecordIterator, &RecordIteratorType);
+    if (self == NULL) {
+        return NULL;
+    }
+    // Mark as done until fully initialized so that dealloc does not
+    // attempt to release anything on the error path.
+    self->done = 1;
+    if (!PyArg_ParseTuple(args, "s*", &self->buffer)) {
+        Py_DECREF(self);
+        return NULL;
+    }
+    self->reader = avro_reader_memory(self->buffer.buf, self->buffer.len);
+    if (encoder->resolver != NULL) {
+        self->iface = avro_value_iface_incref(encoder->resolver);
+        self->dest_iface = avro_value_iface_incref(encoder->reader_iface);
+        self->plan = convert_plan_incref(encoder->reader_plan);
+        avro_resolved_writer_new_value(self->iface, &self->value);
+        avro_generic_value_new(self->dest_iface, &self->dest);
+        avro_resolved_writer_set_dest(&self->value, &self->dest);
+    } else {
+        self->iface = avro_value_iface_incref(encoder->iface);
+        self->dest_iface = NULL;
+        self->plan = convert_plan_incref(encoder->plan);
+        avro_generic_value_new(self->iface, &self->value);
+    }
+    self->done = 0;
+    return (PyObject*)self;
+}
+
+static PyObject* RecordIterator_next(RecordIterator* self) {
+    if (self->done) {
+        return NULL;
+    }
+    int rval;
+
+    // The iterator owns its reader and value, and the source buffer is
+    // held until release, so the binary decode can run without the GIL.
+    Py_BEGIN_ALLOW_THREADS
+    if (self->dest_iface != NULL) {
+        // Fields missing from the reader schema are skipped in their
+        // binary form by avro_value_read.
+        avro_value_reset(&self->dest);
+    } else {
+        avro_value_reset(&self->value);
+    }
+    rval = avro_value_read(self->reader, &self->value);
+    Py_END_ALLOW_THREADS
+    if (rval != 0) {
+        // The memory reader is exhausted, so the source buffer can be
+        // released right away rather than waiting for dealloc.
+        RecordIterator_release(self);
+        return NULL;
+    }
+    if (self->dest_iface != NULL) {
+        return avro_to_python(&self->dest, self->plan->root);
+    }
+    return avro_to_python(&self->value, self->plan->root);
+}
+
+PyTypeObject RecordIteratorType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_quickavro.RecordIterator",                    /* tp_name */
+    sizeof(RecordIterator),                         /* tp_basicsize */
+    0,                                              /* tp_itemsize */
+    (destructor)RecordIterator_dealloc,             /* tp_dealloc */
+    0,                                              /* tp_print */
+    0,                                              /* tp_getattr */
+    0,                                              /* tp_setattr */
+    0,                                              /* tp_compare */
+    0,                                              /* tp_repr */
+    0,                                              /* tp_as_number */
+    0,                                              /* tp_as_sequence */
+    0,                                              /* tp_as_mapping */
+    0,                                              /* tp_hash */
+    0,                                              /* tp_call */
+    0,                                              /* tp_str */
+    0,                                              /* tp_getattro */
+    0,                                              /* tp_setattro */
+    0,                                              /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_ITER,      /* tp_flags */
+    "RecordIterator objects",                       /* tp_doc */
+    0,                                              /* tp_traverse */
+    0,                                              /* tp_clear */
+    0,                                              /* tp_richcompare */
+    0,                                              /* tp_weaklistoffset */
+    PyObject_SelfIter,                              /* tp_iter */
+    (iternextfunc)RecordIterator_next,              /* tp_iternext */
+    0,                                              /* tp_methods */
+    0,                                              /* tp_members */
+    0,                                              /* tp_getset */
+    0,                                              /* tp_base */
+    0,                                              /* tp_dict */
+    0,                                              /* tp_descr_get */
+    0,                                              /* tp_descr_set */
+    0,                                              /* tp_dictoffset */
+    0,                                              /* tp_init */
+    0,                                              /* tp_alloc */
+    0,                                              /* tp_new */
+};
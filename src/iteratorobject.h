@@ -0,0 +1,56 @@
+/*
+ * Copyright 2016 Chris Marshall
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#ifndef __ITERATOROBJECT_H
+#define __ITERATOROBJECT_H
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#include <Python.h>
+#include <avro.h>
+
+#include "encoderobject.h"
+
+
+typedef struct {
+    PyObject_HEAD
+    avro_value_iface_t* iface;
+    convert_plan*       plan;
+    avro_reader_t       reader;
+    avro_value_t        value;
+
+    // When reading with a reader schema, value is a resolved writer that
+    // fills dest, a value of the reader schema
+    avro_value_iface_t* dest_iface;
+    avro_value_t        dest;
+
+    // Holds a reference to the source object until the iterator is
+    // exhausted or deallocated
+    Py_buffer buffer;
+    int done;
+} RecordIterator;
+
+extern PyTypeObject RecordIteratorType;
+
+PyObject* RecordIterator_New(Encoder* encoder, PyObject* args);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif
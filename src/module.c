@@ -17,8 +17,12 @@
 #include <Python.h>
 #include "compat.h"
 
+#include "codecobject.h"
 #include "encoderobject.h"
+#include "iteratorobject.h"
+#include "schemaobject.h"
 #include "snappyobject.h"
+#include "zstdobject.h"
 
 
 #ifdef __cplusplus
@@ -27,6 +31,8 @@ extern "C" {
 
 
 static PyMethodDef module_methods[] = {
+    {"crc32", (PyCFunction)codec_crc32, METH_VARARGS, ""},
+    {"fingerprint64", (PyCFunction)fingerprint64, METH_VARARGS, ""},
     {NULL}  /* Sentinel */
 };
 
@@ -34,14 +40,30 @@ MOD_INIT(_quickavro)
 {
     PyObject* m;
 
+    if (PyType_Ready(&CodecType) < 0) {
+        return MOD_ERROR_VAL;
+    }
+
     if (PyType_Ready(&EncoderType) < 0) {
         return MOD_ERROR_VAL;
     }
 
+    if (PyType_Ready(&RecordIteratorType) < 0) {
+        return MOD_ERROR_VAL;
+    }
+
+    if (PyType_Ready(&SchemaType) < 0) {
+        return MOD_ERROR_VAL;
+    }
+
     if (PyType_Ready(&SnappyType) < 0) {
         return MOD_ERROR_VAL;
     }
 
+    if (PyType_Ready(&ZstdType) < 0) {
+        return MOD_ERROR_VAL;
+    }
+
     MOD_DEF(m, "_quickavro", "", module_methods);
 
     if (m == NULL) {
@@ -63,12 +85,24 @@ MOD_INIT(_quickavro)
     Py_INCREF(WriteError);
     PyModule_AddObject(m, "WriteError", WriteError);
 
+    Py_INCREF(&CodecType);
+    PyModule_AddObject(m, "Codec", (PyObject*)&CodecType);
+
     Py_INCREF(&EncoderType);
     PyModule_AddObject(m, "Encoder", (PyObject*)&EncoderType);
 
+    Py_INCREF(&RecordIteratorType);
+    PyModule_AddObject(m, "RecordIterator", (PyObject*)&RecordIteratorType);
+
+    Py_INCREF(&SchemaType);
+    PyModule_AddObject(m, "Schema", (PyObject*)&SchemaType);
+
     Py_INCREF(&SnappyType);
     PyModule_AddObject(m, "Snappy", (PyObject*)&SnappyType);
 
+    Py_INCREF(&ZstdType);
+    PyModule_AddObject(m, "Zstd", (PyObject*)&ZstdType);
+
     return MOD_SUCCESS_VAL(m);
 }
 
@@ -0,0 +1,165 @@
+/*
+ * Copyright 2016 Chris Marshall
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#include "schemaobject.h"
+#include "compat.h"
+#include "encoderobject.h"
+#include <avro.h>
+#include <stdint.h>
+
+
+#define CRC64_AVRO_EMPTY 0xc15d213aa4d7a795ULL
+
+static uint64_t crc64_table[256];
+static int crc64_initialized = 0;
+
+static void crc64_init(void) {
+    int i, j;
+    uint64_t fp;
+
+    for (i=0; i<256; i++) {
+        fp = i;
+        for (j=0; j<8; j++) {
+            fp = (fp >> 1) ^ (CRC64_AVRO_EMPTY & -(fp & 1));
+        }
+        crc64_table[i] = fp;
+    }
+    crc64_initialized = 1;
+}
+
+// Returns the CRC-64-AVRO (Rabin) fingerprint of a bytes-like object, the
+// 64-bit fingerprint of the Avro specification when given the Parsing
+// Canonical Form of a schema.
+PyObject* fingerprint64(PyObject* self, PyObject* args) {
+    Py_buffer buffer;
+    uint64_t fp = CRC64_AVRO_EMPTY;
+    const unsigned char* data;
+    Py_ssize_t i;
+
+    if (!PyArg_ParseTuple(args, "s*", &buffer)) {
+        return NULL;
+    }
+    if (!crc64_initialized) {
+        crc64_init();
+    }
+    data = (const unsigned char*)buffer.buf;
+    for (i=0; i<buffer.len; i++) {
+        fp = (fp >> 8) ^ crc64_table[(fp ^ data[i]) & 0xff];
+    }
+    PyBuffer_Release(&buffer);
+    return PyLong_FromUnsignedLongLong(fp);
+}
+
+static void Schema_clear(Schema* self) {
+    if (self->iface != NULL) {
+        avro_value_iface_decref(self->iface);
+        self->iface = NULL;
+    }
+    if (self->plan != NULL) {
+        convert_plan_decref(self->plan);
+        self->plan = NULL;
+    }
+    if (self->schema != NULL) {
+        avro_schema_decref(self->schema);
+        self->schema = NULL;
+    }
+}
+
+static void Schema_dealloc(Schema* self) {
+    Schema_clear(self);
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static PyObject* Schema_new(PyTypeObject* type, PyObject* args, PyObject* kwds) {
+    Schema* self;
+
+    self = (Schema*)type->tp_alloc(type, 0);
+    if (self != NULL) {
+        self->schema = NULL;
+        self->iface = NULL;
+        self->plan = NULL;
+    }
+    return (PyObject*)self;
+}
+
+static int Schema_init(Schema* self, PyObject* args, PyObject* kwds) {
+    char* json_str;
+    avro_schema_error_t error;
+    avro_schema_t schema = NULL;
+
+    if (!PyArg_ParseTuple(args, "s", &json_str)) {
+        return -1;
+    }
+    Schema_clear(self);
+    if (avro_schema_from_json(json_str, 0, &schema, &error) != 0 || schema == NULL) {
+        PyErr_Format(SchemaError, "%s", avro_strerror());
+        return -1;
+    }
+    self->schema = schema;
+    self->plan = convert_plan_new(schema);
+    if (self->plan == NULL) {
+        Schema_clear(self);
+        return -1;
+    }
+    self->iface = avro_generic_class_from_schema(schema);
+    if (self->iface == NULL) {
+        Schema_clear(self);
+        PyErr_Format(SchemaError, "%s", avro_strerror());
+        return -1;
+    }
+    return 0;
+}
+
+PyTypeObject SchemaType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_quickavro.Schema",                            /* tp_name */
+    sizeof(Schema),                                 /* tp_basicsize */
+    0,                                              /* tp_itemsize */
+    (destructor)Schema_dealloc,                     /* tp_dealloc */
+    0,                                              /* tp_print */
+    0,                                              /* tp_getattr */
+    0,                                              /* tp_setattr */
+    0,                                              /* tp_compare */
+    0,                                              /* tp_repr */
+    0,                                              /* tp_as_number */
+    0,                                              /* tp_as_sequence */
+    0,                                              /* tp_as_mapping */
+    0,                                              /* tp_hash */
+    0,                                              /* tp_call */
+    0,                                              /* tp_str */
+    0,                                              /* tp_getattro */
+    0,                                              /* tp_setattro */
+    0,                                              /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE,       /* tp_flags */
+    "Schema objects",                               /* tp_doc */
+    0,                                              /* tp_traverse */
+    0,                                              /* tp_clear */
+    0,                                              /* tp_richcompare */
+    0,                                              /* tp_weaklistoffset */
+    0,                                              /* tp_iter */
+    0,                                              /* tp_iternext */
+    0,                                              /* tp_methods */
+    0,                                              /* tp_members */
+    0,                                              /* tp_getset */
+    0,                                              /* tp_base */
+    0,                                              /* tp_dict */
+    0,                                              /* tp_descr_get */
+    0,                                              /* tp_descr_set */
+    0,                                              /* tp_dictoffset */
+    (initproc)Schema_init,                          /* tp_init */
+    0,                                              /* tp_alloc */
+    Schema_new,                                     /* tp_new */
+};
@@ -0,0 +1,48 @@
+/*
+ * Copyright 2016 Chris Marshall
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#ifndef __SCHEMAOBJECT_H
+#define __SCHEMAOBJECT_H
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+#include <Python.h>
+#include <avro.h>
+
+#include "convert.h"
+
+
+// A parsed schema with its value interface and conversion plan. Schema
+// objects are immutable once initialized and may be shared by any number
+// of encoders, which take their own references to each member.
+typedef struct {
+    PyObject_HEAD
+    avro_schema_t       schema;
+    avro_value_iface_t* iface;
+    convert_plan*       plan;
+} Schema;
+
+extern PyTypeObject SchemaType;
+
+PyObject* fingerprint64(PyObject* self, PyObject* args);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif
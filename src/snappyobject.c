@@ -42,9 +42,13 @@ static PyObject* Snappy_compress(Snappy* self, PyObject* args) {
         Py_RETURN_NONE;
     }
 
+    snappy_status status;
     size_t output_length = snappy_max_compressed_length(buffer.len);
     char* output = (char*)malloc(output_length);
-    if (snappy_compress(buffer.buf, buffer.len, output, &output_length) == SNAPPY_OK) {
+    Py_BEGIN_ALLOW_THREADS
+    status = snappy_compress(buffer.buf, buffer.len, output, &output_length);
+    Py_END_ALLOW_THREADS
+    if (status == SNAPPY_OK) {
         result = PyBytes_FromStringAndSize(output, output_length);
     } else {
         Py_INCREF(Py_None);
@@ -62,12 +66,17 @@ static PyObject* Snappy_uncompress(Snappy* self, PyObject* args) {
     if (!PyArg_ParseTuple(args, "s*", &buffer)) {
         Py_RETURN_NONE;
     }
+    snappy_status status;
     size_t output_length;
     if (snappy_uncompressed_length(buffer.buf, buffer.len, &output_length) != SNAPPY_OK) {
+        PyBuffer_Release(&buffer);
         Py_RETURN_NONE;
     }
     char* output = (char*)malloc(output_length);
-    if (snappy_uncompress(buffer.buf, buffer.len, output, &output_length) == SNAPPY_OK) {
+    Py_BEGIN_ALLOW_THREADS
+    status = snappy_uncompress(buffer.buf, buffer.len, output, &output_length);
+    Py_END_ALLOW_THREADS
+    if (status == SNAPPY_OK) {
         result = PyBytes_FromStringAndSize(output, output_length);
     } else {
         Py_INCREF(Py_None);
@@ -0,0 +1,217 @@
+/*
+ * Copyright 2016 Chris Marshall
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *     http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+#include "zstdobject.h"
+#include "compat.h"
+#include <zstd.h>
+
+
+static void Zstd_dealloc(Zstd* self) {
+    Py_TYPE(self)->tp_free((PyObject*)self);
+}
+
+static PyObject* Zstd_new(PyTypeObject* type, PyObject* args, PyObject* kwds) {
+    Zstd* self;
+
+    self = (Zstd*)type->tp_alloc(type, 0);
+    return (PyObject*)self;
+}
+
+static int Zstd_init(Zstd* self, PyObject* args, PyObject* kwds) {
+    return 0;
+}
+
+static PyObject* Zstd_compress(Zstd* self, PyObject* args) {
+    Py_buffer buffer;
+    PyObject* result;
+    int level = ZSTD_CLEVEL_DEFAULT;
+
+    if (!PyArg_ParseTuple(args, "s*|i", &buffer, &level)) {
+        return NULL;
+    }
+    size_t output_length = ZSTD_compressBound(buffer.len);
+    char* output = (char*)malloc(output_length);
+    if (output == NULL) {
+        PyBuffer_Release(&buffer);
+        return PyErr_NoMemory();
+    }
+    Py_BEGIN_ALLOW_THREADS
+    output_length = ZSTD_compress(output, output_length, buffer.buf, buffer.len, level);
+    Py_END_ALLOW_THREADS
+    if (ZSTD_isError(output_length)) {
+        PyErr_Format(PyExc_ValueError, "Zstandard compression failed: %s", ZSTD_getErrorName(output_length));
+        result = NULL;
+    } else {
+        result = PyBytes_FromStringAndSize(output, output_length);
+    }
+    free(output);
+    PyBuffer_Release(&buffer);
+    return result;
+}
+
+/*
+ * Decompresses frames that do not record their content size, such as
+ * those written by streaming compressors, into a growing buffer.
+ */
+static PyObject* zstd_uncompress_stream(Py_buffer* buffer) {
+    size_t capacity = ZSTD_DStreamOutSize();
+    size_t status = 0;
+    int no_memory = 0;
+    char* output = (char*)malloc(capacity);
+    char* resized;
+    PyObject* result;
+    ZSTD_DStream* stream = ZSTD_createDStream();
+    ZSTD_inBuffer in = { buffer->buf, buffer->len, 0 };
+    ZSTD_outBuffer out = { output, capacity, 0 };
+
+    if (output == NULL || stream == NULL) {
+        free(output);
+        ZSTD_freeDStream(stream);
+        return PyErr_NoMemory();
+    }
+    ZSTD_initDStream(stream);
+    Py_BEGIN_ALLOW_THREADS
+    while (in.pos < in.size || (status != 0 && out.pos == out.size)) {
+        if (out.pos == out.size) {
+            resized = (char*)realloc(out.dst, out.size * 2);
+            if (resized == NULL) {
+                no_memory = 1;
+                break;
+            }
+            out.dst = resized;
+            out.size *= 2;
+        }
+        status = ZSTD_decompressStream(stream, &out, &in);
+        if (ZSTD_isError(status)) {
+            break;
+        }
+    }
+    Py_END_ALLOW_THREADS
+    ZSTD_freeDStream(stream);
+    if (no_memory) {
+        result = PyErr_NoMemory();
+    } else if (ZSTD_isError(status)) {
+        PyErr_Format(PyExc_ValueError, "Zstandard decompression failed: %s", ZSTD_getErrorName(status));
+        result = NULL;
+    } else {
+        result = PyBytes_FromStringAndSize(out.dst, out.pos);
+    }
+    free(out.dst);
+    return result;
+}
+
+static PyObject* Zstd_uncompress(Zstd* self, PyObject* args) {
+    Py_buffer buffer;
+    PyObject* result;
+
+    if (!PyArg_ParseTuple(args, "s*", &buffer)) {
+        return NULL;
+    }
+    unsigned long long content_size = ZSTD_getFrameContentSize(buffer.buf, buffer.len);
+    if (content_size == ZSTD_CONTENTSIZE_ERROR) {
+        PyBuffer_Release(&buffer);
+        PyErr_SetString(PyExc_ValueError, "Invalid Zstandard frame.");
+        return NULL;
+    }
+    if (content_size == ZSTD_CONTENTSIZE_UNKNOWN) {
+        result = zstd_uncompress_stream(&buffer);
+        PyBuffer_Release(&buffer);
+        return result;
+    }
+    result = PyBytes_FromStringAndSize(NULL, (Py_ssize_t)content_size);
+    if (result == NULL) {
+        PyBuffer_Release(&buffer);
+        return NULL;
+    }
+    size_t output_length;
+    Py_BEGIN_ALLOW_THREADS
+    output_length = ZSTD_decompress(PyBytes_AS_STRING(result), content_size, buffer.buf, buffer.len);
+    Py_END_ALLOW_THREADS
+    PyBuffer_Release(&buffer);
+    if (ZSTD_isError(output_length)) {
+        Py_DECREF(result);
+        PyErr_Format(PyExc_ValueError, "Zstandard decompression failed: %s", ZSTD_getErrorName(output_length));
+        return NULL;
+    }
+    return result;
+}
+
+static PyObject* Zstd_uncompressed_length(Zstd* self, PyObject* args) {
+    Py_buffer buffer;
+
+    if (!PyArg_ParseTuple(args, "s*", &buffer)) {
+        return NULL;
+    }
+    unsigned long long content_size = ZSTD_getFrameContentSize(buffer.buf, buffer.len);
+    PyBuffer_Release(&buffer);
+    if (content_size == ZSTD_CONTENTSIZE_ERROR || content_size == ZSTD_CONTENTSIZE_UNKNOWN) {
+        Py_RETURN_NONE;
+    }
+    return PyLong_FromUnsignedLongLong(content_size);
+}
+
+static PyObject* Zstd_levels(Zstd* self, PyObject* args) {
+    return Py_BuildValue("(ii)", ZSTD_minCLevel(), ZSTD_maxCLevel());
+}
+
+static PyMethodDef Zstd_methods[] = {
+    {"compress", (PyCFunction)Zstd_compress, METH_VARARGS|METH_CLASS, ""},
+    {"uncompress", (PyCFunction)Zstd_uncompress, METH_VARARGS|METH_CLASS, ""},
+    {"uncompressed_length", (PyCFunction)Zstd_uncompressed_length, METH_VARARGS|METH_CLASS, ""},
+    {"levels", (PyCFunction)Zstd_levels, METH_NOARGS|METH_CLASS, ""},
+    {NULL}  /* Sentinel */
+};
+
+PyTypeObject ZstdType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "_quickavro.Zstd",                            /* tp_name */
+    sizeof(Zstd),                                 /* tp_basicsize */
+    0,                                              /* tp_itemsize */
+    (destructor)Zstd_dealloc,                     /* tp_dealloc */
+    0,                                              /* tp_print */
+    0,                                              /* tp_getattr */
+    0,                                              /* tp_setattr */
+    0,                                              /* tp_compare */
+    0,                                              /* tp_repr */
+    0,                                              /* tp_as_number */
+    0,                                              /* tp_as_sequence */
+    0,                                              /* tp_as_mapping */
+    0,                                              /* tp_hash */
+    0,                                              /* tp_call */
+    0,                                              /* tp_str */
+    0,                                              /* tp_getattro */
+    0,                                              /* tp_setattro */
+    0,                                              /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE,       /* tp_flags */
+    "Zstd objects",                               /* tp_doc */
+    0,                                              /* tp_traverse */
+    0,                                              /* tp_clear */
+    0,                                              /* tp_richcompare */
+    0,                                              /* tp_weaklistoffset */
+    0,                                              /* tp_iter */
+    0,                                              /* tp_iternext */
+    Zstd_methods,                                 /* tp_methods */
+    0,                                              /* tp_members */
+    0,                                              /* tp_getset */
+    0,                                              /* tp_base */
+    0,                                              /* tp_dict */
+    0,                                              /* tp_descr_get */
+    0,                                              /* tp_descr_set */
+    0,                                              /* tp_dictoffset */
+    (initproc)Zstd_init,                          /* tp_init */
+    0,                                              /* tp_alloc */
+    Zstd_new,                                     /* tp_new */
+};
@@ -214,3 +214,324 @@ class TestEncoderOther(object):
                 }
                 result = encoder.write({"age": 8011.125})
                 assert result == b"\x08test"
+
+    def test_iter_read(self):
+        with quickavro.BinaryEncoder() as encoder:
+            encoder.schema = {
+                "type": "record",
+                "name": "test",
+                "fields": [
+                    {"name": "name", "type": "string"},
+                    {"name": "age", "type": "int"}
+                ]
+            }
+            records = [{"name": "Larry", "age": 21}, {"name": "Gary", "age": 34}]
+            data = b"".join(encoder.write(record) for record in records)
+            it = encoder.iter_read(data)
+            assert next(it) == records[0]
+            assert list(it) == records[1:]
+            assert list(it) == []
+            assert encoder.read(data) == records
+
+    def test_write_many(self):
+        with quickavro.BinaryEncoder() as encoder:
+            encoder.schema = {
+                "type": "record",
+                "name": "test",
+                "fields": [
+                    {"name": "name", "type": "string"},
+                    {"name": "age", "type": "int"}
+                ]
+            }
+            records = [{"name": "Larry", "age": 21}, {"name": "Gary", "age": 34}]
+            count, data = encoder.write_many(records)
+            assert count == 2
+            assert data == b"".join(encoder.write(record) for record in records)
+
+            # Stops once max_size bytes have been written, leaving the
+            # remaining records in the iterator
+            it = iter(records)
+            count, data = encoder.write_many(it, 1)
+            assert count == 1
+            assert data == encoder.write(records[0])
+            assert encoder.write_many(it) == (1, encoder.write(records[1]))
+            assert encoder.write_many(it) == (0, b"")
+
+            # Stops once max_count records have been written
+            it = iter(records)
+            assert encoder.write_many(it, 0, 1) == (1, encoder.write(records[0]))
+            assert encoder.write_many(it, 0, 1) == (1, encoder.write(records[1]))
+            assert encoder.write_many(it, 0, 1) == (0, b"")
+
+            # Generators can use the encoder while it pulls records
+            encoded = []
+
+            def generate():
+                for record in records:
+                    encoded.append(encoder.write(record))
+                    yield record
+
+            count, data = encoder.write_many(generate())
+            assert count == 2
+            assert data == b"".join(encoded)
+
+    def test_schema_reset(self):
+        with quickavro.BinaryEncoder() as encoder:
+            encoder.schema = {
+                "type": "record",
+                "name": "test",
+                "fields": [
+                    {"name": "names", "type": {"type": "array", "items": "string"}}
+                ]
+            }
+            assert encoder.write({"names": ["a", "b"]}) == b"\x04\x02a\x02b\x00"
+            # Arrays of the reused value must be cleared between records
+            assert encoder.write({"names": ["c"]}) == b"\x02\x02c\x00"
+            assert encoder.read_record(b"\x02\x02c\x00") == ({"names": ["c"]}, 4)
+
+            encoder.schema = {"type": "int"}
+            assert encoder.write(10000) == b"\xa0\x9c\x01"
+            assert encoder.read_record(b"\xa0\x9c\x01") == (10000, 3)
+
+    def test_recursive_schema(self):
+        with quickavro.BinaryEncoder() as encoder:
+            encoder.schema = {
+                "type": "record",
+                "name": "chainlink",
+                "fields": [
+                    {"name": "linkid", "type": "int"},
+                    {"name": "nextlink", "type": ["null", "chainlink"]}
+                ]
+            }
+            chain = {"linkid": 1, "nextlink": {"linkid": 2, "nextlink": None}}
+            result = encoder.write(chain)
+            assert encoder.read(result) == [chain]
+
+    def test_nullable_union(self):
+        with quickavro.BinaryEncoder() as encoder:
+            encoder.schema = {
+                "type": "record",
+                "name": "test",
+                "fields": [
+                    {"name": "name", "type": ["null", "string"]},
+                    {"name": "ages", "type": [{"type": "array", "items": "int"}, "null"]},
+                    {
+                        "name": "child",
+                        "type": ["null", {
+                            "type": "record",
+                            "name": "child",
+                            "fields": [{"name": "age", "type": "int"}]
+                        }]
+                    }
+                ]
+            }
+            record = {"name": "Larry", "ages": [1, 2], "child": {"age": 3}}
+            result = encoder.write(record)
+            assert result == b"\x02\nLarry\x00\x04\x02\x04\x00\x02\x06"
+            assert encoder.read(result) == [record]
+            result = encoder.write({"name": None, "ages": None, "child": None})
+            assert result == b"\x00\x02\x00"
+            with pytest.raises(quickavro.WriteError):
+                encoder.write({"name": 1})
+
+    def test_write_columns_range(self):
+        import array
+        with quickavro.BinaryEncoder() as encoder:
+            encoder.schema = {
+                "type": "record",
+                "name": "test",
+                "fields": [
+                    {"name": "age", "type": "int"},
+                    {"name": "id", "type": "long"},
+                    {"name": "suit", "type": {"type": "enum", "name": "suit", "symbols": ["A", "B"]}}
+                ]
+            }
+            count, data = encoder.write_columns({"age": [2**31 - 1], "id": [2**63 - 1], "suit": [1]})
+            assert encoder.read(data) == [{"age": 2**31 - 1, "id": 2**63 - 1, "suit": "B"}]
+            invalid = [
+                {"age": [2**31], "id": [0], "suit": [0]},
+                {"age": [-2**31 - 1], "id": [0], "suit": [0]},
+                {"age": [0], "id": [2**63], "suit": [0]},
+                {"age": [0], "id": [0], "suit": [2]},
+                {"age": [0], "id": [0], "suit": array.array("i", [-1])},
+            ]
+            if not quickavro._compat.PY2:
+                invalid.append({"age": array.array("q", [2**31]), "id": [0], "suit": [0]})
+                invalid.append({"age": [0], "id": array.array("Q", [2**63]), "suit": [0]})
+            for columns in invalid:
+                with pytest.raises(quickavro.WriteError):
+                    encoder.write_columns(columns)
+
+    def test_union_cache(self):
+        with quickavro.BinaryEncoder() as encoder:
+            encoder.schema = {"type": "array", "items": ["int", "string", "null", "double"]}
+            values = [1, "a", None, 1.5, 2, "b", None, 2.5]
+            result = encoder.write(values)
+            assert encoder.read(result) == [values]
+
+    def test_union_enum(self):
+        Gender = quickavro.Enum("Gender", "F M")
+        with quickavro.BinaryEncoder() as encoder:
+            encoder.schema = {
+                "type": "record",
+                "name": "test",
+                "fields": [{"name": "gender", "type": ["null", Gender.T]}]
+            }
+            result = encoder.write({"gender": Gender.M})
+            assert result == b"\x02\x02"
+            assert encoder.read(result) == [{"gender": "M"}]
+            assert encoder.write({"gender": "F"}) == b"\x02\x00"
+            assert encoder.write({"gender": 1}) == b"\x02\x02"
+            with pytest.raises(quickavro.WriteError):
+                encoder.write({"gender": 2})
+
+    def test_projection(self):
+        with quickavro.BinaryEncoder() as encoder:
+            encoder.schema = {
+                "type": "record",
+                "name": "test",
+                "fields": [
+                    {"name": "name", "type": "string"},
+                    {"name": "tags", "type": {"type": "map", "values": "string"}},
+                    {"name": "kind", "type": {"type": "enum", "name": "kind", "symbols": ["A", "B"]}},
+                    {"name": "other", "type": ["null", "kind"]},
+                    {"name": "age", "type": "int"}
+                ]
+            }
+            records = [
+                {"name": "Larry", "tags": {"a": "b"}, "kind": "A", "other": "B", "age": 21},
+                {"name": "Moe", "tags": {}, "kind": "B", "other": None, "age": 31}
+            ]
+            data = b"".join(encoder.write(record) for record in records)
+            assert encoder.read(data, fields=["age", "name"]) == [
+                {"name": "Larry", "age": 21},
+                {"name": "Moe", "age": 31}
+            ]
+            assert encoder.read(data, fields=["other"]) == [{"other": "B"}, {"other": None}]
+            # Projections only apply to the call they are given to
+            assert encoder.read(data) == records
+            assert encoder.reader_schema is None
+            with pytest.raises(quickavro.InvalidSchemaError):
+                encoder.read(data, fields=["missing"])
+
+    def test_schema_resolution(self):
+        with quickavro.BinaryEncoder() as encoder:
+            encoder.schema = {
+                "type": "record",
+                "name": "test",
+                "fields": [
+                    {"name": "name", "type": "string"},
+                    {"name": "removed", "type": "string"},
+                    {"name": "age", "type": "int"},
+                    {"name": "score", "type": "float"}
+                ]
+            }
+            data = encoder.write({"name": "Larry", "removed": "x", "age": 21, "score": 1.5})
+            encoder.reader_schema = {
+                "type": "record",
+                "name": "test",
+                "fields": [
+                    {"name": "score", "type": "double"},
+                    {"name": "age", "type": "long"},
+                    {"name": "tags", "type": {"type": "array", "items": "string"}, "default": ["a"]},
+                    {"name": "raw", "type": "bytes", "default": "ÿ"},
+                    {"name": "name", "type": "string"}
+                ]
+            }
+            records = encoder.read(data + data)
+            assert records == [{"name": "Larry", "age": 21, "score": 1.5, "tags": ["a"], "raw": b"\xff"}] * 2
+            assert records[0]["tags"] is not records[1]["tags"]
+            # Projections apply to the reader schema and leave it set
+            assert encoder.read(data, fields=["age", "tags"]) == [{"age": 21, "tags": ["a"]}]
+            assert encoder.read(data) == records[:1]
+            with pytest.raises(quickavro.InvalidSchemaError):
+                encoder.reader_schema = {
+                    "type": "record",
+                    "name": "test",
+                    "fields": [{"name": "missing", "type": "int"}]
+                }
+
+    def test_schema_cache(self):
+        from quickavro.schema import canonical_form, fingerprint, schema_cache
+        schema = {
+            "type": "record",
+            "name": "test",
+            "namespace": "quickavro",
+            "doc": "Ignored by the canonical form",
+            "fields": [
+                {"name": "name", "type": {"type": "string"}, "default": ""},
+                {"name": "kind", "type": {"type": "enum", "name": "kind", "symbols": ["A", "B"]}},
+                {"name": "other", "type": ["null", "kind"]}
+            ]
+        }
+        assert canonical_form(schema) == (
+            '{"name":"quickavro.test","type":"record","fields":['
+            '{"name":"name","type":"string"},'
+            '{"name":"kind","type":{"name":"quickavro.kind","type":"enum","symbols":["A","B"]}},'
+            '{"name":"other","type":["null","quickavro.kind"]}]}'
+        )
+        assert fingerprint("null") == 7195948357588979594
+        schema_cache.clear()
+        with quickavro.BinaryEncoder(schema) as first, quickavro.BinaryEncoder(dict(schema, doc="")) as second:
+            record = {"name": "Larry", "kind": "B", "other": None}
+            assert first.read(second.write(record)) == [record]
+        stats = schema_cache.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 1
+        for invalid in ({"name": "test"}, {"type": "record", "name": "test", "fields": [{"name": "a"}]}):
+            with pytest.raises(quickavro.SchemaError):
+                quickavro.BinaryEncoder(invalid)
+
+    def test_read_columnar(self):
+        with quickavro.BinaryEncoder() as encoder:
+            encoder.schema = {
+                "type": "record",
+                "name": "test",
+                "fields": [
+                    {"name": "name", "type": "string"},
+                    {"name": "age", "type": ["null", "int"]},
+                    {"name": "score", "type": "double"},
+                    {"name": "kind", "type": {"type": "enum", "name": "kind", "symbols": ["A", "B"]}},
+                    {"name": "tags", "type": {"type": "array", "items": "string"}}
+                ]
+            }
+            records = [
+                {"name": "Larry", "age": 21, "score": 1.5, "kind": "B", "tags": ["a"]},
+                {"name": "", "age": None, "score": -2.0, "kind": "A", "tags": []},
+                {"name": u"Moë", "age": 3, "score": 0.0, "kind": "B", "tags": ["b", "c"]}
+            ]
+            data = b"".join(encoder.write(record) for record in records)
+            columns = encoder.read_columnar(data, use_numpy=False)
+            assert list(columns) == ["name", "age", "score", "kind", "tags"]
+            for name, column in columns.items():
+                assert len(column) == len(records)
+                assert column.to_list() == [record[name] for record in records]
+            assert list(columns["score"].values) == [1.5, -2.0, 0.0]
+            assert list(columns["age"].validity) == [1, 0, 1]
+            assert list(columns["name"].offsets) == [0, 5, 5, 9]
+            assert list(encoder.read_columnar(data, fields=["age"])) == ["age"]
+
+    def test_codec_buffers(self):
+        import struct
+        import zlib
+        from quickavro.errors import SnappyChecksumError
+        from quickavro.utils import crc32
+
+        data = b"".join(quickavro.BinaryEncoder({"type": "long"}).write(i) for i in range(10000))
+        assert crc32(data) == struct.pack(">I", zlib.crc32(data) & 0xFFFFFFFF)
+        for codec in ("deflate", "snappy", "zstandard"):
+            with quickavro.BinaryEncoder(codec=codec) as encoder:
+                compressed = bytes(encoder.compress(data))
+                first = encoder.decompress(compressed)
+                # The buffer of a view still in use is never overwritten.
+                second = encoder.decompress(compressed)
+                assert first.obj is not second.obj
+                assert bytes(first) == bytes(second) == data
+                buffer_id = id(second.obj)
+                del first, second
+                assert id(encoder.decompress(compressed).obj) == buffer_id
+        with quickavro.BinaryEncoder(codec="snappy") as encoder:
+            compressed = bytearray(encoder.compress(data))
+            compressed[-1] ^= 0xFF
+            with pytest.raises(SnappyChecksumError):
+                encoder.decompress(compressed)
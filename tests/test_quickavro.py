@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import gzip
 import os
 import pytest
 
@@ -15,6 +16,29 @@ records = [
     {"name": "Larry", "age": None},
 ]
 
+schema = {
+  "type": "record",
+  "name": "Person",
+  "fields": [
+    {"name": "name", "type": "string"},
+    {"name": "age",  "type": ["int", "null"]}
+  ]
+}
+
+people = [{"name": "Person {0}".format(i), "age": i} for i in range(5000)]
+
+
+def write_people(tmpdir, name, records=people, **options):
+    """
+    Writes records with the Person schema into a file of tmpdir and
+    returns its path. Options are passed to :class:`quickavro.FileWriter`.
+    """
+    avro_file = os.path.join(str(tmpdir), name)
+    with quickavro.FileWriter(avro_file, **options) as writer:
+        writer.schema = schema
+        writer.write_records(records)
+    return avro_file
+
 
 @pytest.mark.usefixtures('tmpdir')
 class TestQuickAvro(object):
@@ -79,3 +103,355 @@ class TestQuickAvro(object):
             for record, expected_record in zip(reader.records(), records):
                 assert record.get('name') == expected_record.get('name')
                 assert record.get('age') == expected_record.get('age')
+
+    def test_nonseekable(self, tmpdir):
+        avro_file = os.path.join(str(tmpdir), "testfile1.avro")
+        gzip_file = os.path.join(str(tmpdir), "testfile1.avro.gz")
+        with open(avro_file, 'rb') as f:
+            data = f.read()
+        with gzip.open(gzip_file, 'wb') as f:
+            f.write(data)
+
+        class Stream(object):
+            def __init__(self, f):
+                self.f = f
+
+            def read(self, size):
+                return self.f.read(size)
+
+            def close(self):
+                self.f.close()
+
+        with quickavro.FileReader(Stream(gzip.open(gzip_file, 'rb')), buffer_size=7) as reader:
+            for record, expected_record in zip(reader.records(), records):
+                assert record.get('name') == expected_record.get('name')
+                assert record.get('age') == expected_record.get('age')
+
+    def test_mmap(self, tmpdir):
+        avro_file = os.path.join(str(tmpdir), "testfile1.avro")
+        with quickavro.FileReader(avro_file, mmap=True) as reader:
+            for record, expected_record in zip(reader.records(), records):
+                assert record.get('name') == expected_record.get('name')
+                assert record.get('age') == expected_record.get('age')
+
+    def test_threaded_read(self, tmpdir):
+        import threading
+
+        avro_file = os.path.join(str(tmpdir), "testfile1.avro")
+        results = []
+
+        def read():
+            with quickavro.FileReader(avro_file) as reader:
+                results.append(list(reader.records()))
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(results) == 4
+        for result in results:
+            assert [r.get('name') for r in result] == [r.get('name') for r in records]
+
+
+    def test_parallel(self, tmpdir):
+        from quickavro.parallel import read_records
+
+        avro_file = write_people(tmpdir, "testfile2.avro", codec="snappy")
+        assert list(read_records(avro_file, workers=2, split_size=1024)) == people
+        result = list(read_records(avro_file, workers=2, ordered=False, split_size=1024))
+        assert sorted(result, key=lambda r: r["age"]) == people
+        with quickavro.FileReader(avro_file) as reader:
+            # Parallel reads continue from the position of the reader
+            reader.seek_record(4321)
+            assert list(reader.records(workers=2)) == people[4321:]
+        with quickavro.FileReader(avro_file, record_type="tuple") as reader:
+            assert [(r.name, r.age) for r in reader.records(workers=2)] == [(r["name"], r["age"]) for r in people]
+
+    def test_compress_workers(self, tmpdir):
+        for codec in ("null", "deflate", "snappy"):
+            serial_file = os.path.join(str(tmpdir), "serial.avro")
+            pipelined_file = os.path.join(str(tmpdir), "pipelined.avro")
+            with quickavro.FileWriter(serial_file, codec=codec) as writer:
+                writer.schema = schema
+                sync_marker = writer.sync_marker
+                for record in people:
+                    writer.write_record(record)
+            with quickavro.FileWriter(pipelined_file, codec=codec, compress_workers=4) as writer:
+                writer.schema = schema
+                writer.sync_marker = sync_marker
+                for record in people:
+                    writer.write_record(record)
+            with open(serial_file, 'rb') as f1, open(pipelined_file, 'rb') as f2:
+                assert f1.read() == f2.read()
+
+    def test_write_records(self, tmpdir):
+        avro_file = os.path.join(str(tmpdir), "testfile3.avro")
+        with quickavro.FileWriter(avro_file) as writer:
+            writer.schema = schema
+            writer.write_record(people[0])
+            writer.write_records(people[1:])
+        with quickavro.FileReader(avro_file) as reader:
+            assert list(reader.records()) == people
+            assert reader.block_count > 1
+
+    def test_reader_schema(self, tmpdir):
+        avro_file = write_people(tmpdir, "testfile4.avro", people[:100])
+        reader_schema = {
+          "type": "record",
+          "name": "Person",
+          "fields": [{"name": "age",  "type": ["int", "null"]}]
+        }
+        with quickavro.FileReader(avro_file, reader_schema=reader_schema) as reader:
+            assert list(reader.records()) == [{"age": i} for i in range(100)]
+
+    def test_block_index(self, tmpdir):
+        avro_file = write_people(tmpdir, "testfile5.avro", codec="deflate")
+        with quickavro.FileReader(avro_file) as reader:
+            index = reader.block_index(sidecar=True)
+            assert len(index) > 1
+            assert len(reader) == len(people)
+            assert index[1].first_record == index[0].count
+            reader.seek_record(4321)
+            assert next(reader.records()) == people[4321]
+            reader.seek_block(1)
+            assert next(reader.records()) == people[index[1].first_record]
+            with pytest.raises(IndexError):
+                reader.seek_record(len(people))
+        assert os.path.exists(avro_file + ".idx")
+        with quickavro.FileReader(avro_file) as reader:
+            assert list(reader.block_index(sidecar=True)) == list(index)
+            reader.seek_record(4321)
+            assert next(reader.records()) == people[4321]
+
+    def test_count(self, tmpdir):
+        avro_file = write_people(tmpdir, "testfile6.avro", codec="snappy")
+        with quickavro.FileReader(avro_file) as reader:
+            assert reader.count() == len(people)
+            stats = reader.stats()
+            assert stats["codec"] == "snappy"
+            assert stats["records"] == len(people)
+            assert stats["blocks"] > 1
+            assert stats["uncompressed_size"] == sum(len(reader.write(record)) for record in people)
+
+    def test_splits(self, tmpdir):
+        from quickavro.parallel import splits
+        avro_file = write_people(tmpdir, "testfile7.avro")
+        records = []
+        for start, end in splits(avro_file, 7):
+            with quickavro.FileReader(avro_file, start=start, end=end) as reader:
+                records.extend(reader.records())
+        assert records == people
+
+        # Parallel reads and nested splits stay within the split
+        records = []
+        for start, end in splits(avro_file, 3):
+            for nested_start, nested_end in splits(avro_file, 2, start, end):
+                assert start <= nested_start < nested_end <= end
+            with quickavro.FileReader(avro_file, start=start, end=end) as reader:
+                records.extend(reader.records(workers=2))
+        assert records == people
+
+    def test_write_columns(self, tmpdir):
+        import array
+        avro_file = os.path.join(str(tmpdir), "testfile8.avro")
+        names = [person["name"] for person in people]
+        ages = [i if i % 3 else None for i in range(5000)]
+        with quickavro.FileWriter(avro_file) as writer:
+            writer.schema = dict(schema, fields=schema["fields"] + [{"name": "score", "type": "double"}])
+            writer.write_columns({
+                "name": names,
+                "age": ages,
+                "score": array.array("d", range(5000))
+            })
+        with quickavro.FileReader(avro_file) as reader:
+            assert list(reader.records()) == [
+                {"name": name, "age": age, "score": float(i)}
+                for i, (name, age) in enumerate(zip(names, ages))
+            ]
+            assert reader.block_count > 1
+
+        # Schemas without a columnar representation are written row by
+        # row, continuing from the previous block.
+        from quickavro.flush import CountPolicy
+        with quickavro.FileWriter(avro_file, flush_policy=CountPolicy(100)) as writer:
+            writer.schema = dict(schema, fields=[
+                {"name": "name", "type": "string"},
+                {"name": "tags", "type": {"type": "array", "items": "int"}}
+            ])
+            writer.write_columns({
+                "name": (name for name in names),
+                "tags": [[i] for i in range(5000)]
+            })
+        with quickavro.FileReader(avro_file) as reader:
+            assert list(reader.records()) == [
+                {"name": name, "tags": [i]} for i, name in enumerate(names)
+            ]
+            assert reader.stats()["blocks"] == 50
+
+    def test_arrow(self, tmpdir):
+        pa = pytest.importorskip("pyarrow")
+        from quickavro import arrow
+        avro_file = os.path.join(str(tmpdir), "testfile9.avro")
+        expected = [
+            {"name": person["name"], "age": i if i % 3 else None, "tags": {"a": [i]}}
+            for i, person in enumerate(people)
+        ]
+        with quickavro.FileWriter(avro_file) as writer:
+            writer.schema = dict(schema, fields=schema["fields"] + [
+                {"name": "tags", "type": {"type": "map", "values": {"type": "array", "items": "long"}}}
+            ])
+            writer.write_records(expected)
+        table = arrow.read_table(avro_file)
+        assert table.num_rows == len(expected)
+        assert table.column("name").to_pylist() == [record["name"] for record in expected]
+        assert table.column("age").null_count == len(expected) // 3 + 1
+        copy_file = os.path.join(str(tmpdir), "testfile10.avro")
+        arrow.write_table(table, copy_file, codec="deflate")
+        with quickavro.FileReader(copy_file) as reader:
+            assert list(reader.records()) == expected
+
+    def test_record_type(self, tmpdir):
+        avro_file = os.path.join(str(tmpdir), "testfile11.avro")
+        expected = [dict(person, child={"age": person["age"]}) for person in people[:100]]
+        with quickavro.FileWriter(avro_file) as writer:
+            writer.schema = dict(schema, fields=schema["fields"] + [
+                {"name": "child", "type": {"type": "record", "name": "Child", "fields": [{"name": "age", "type": "int"}]}}
+            ])
+            writer.write_records(expected)
+        with quickavro.FileReader(avro_file, record_type="tuple") as reader:
+            records = list(reader.records())
+            assert records[1] == ("Person 1", 1, (1,))
+            assert records[1].child.age == 1
+            assert [record._asdict()["name"] for record in records] == [record["name"] for record in expected]
+        reader_schema = {
+          "type": "record",
+          "name": "Person",
+          "fields": [
+            {"name": "age",  "type": ["int", "null"]},
+            {"name": "country", "type": "string", "default": "US"}
+          ]
+        }
+        with quickavro.FileReader(avro_file, record_type="slots", reader_schema=reader_schema) as reader:
+            records = list(reader.records())
+            assert not hasattr(records[0], "__dict__")
+            assert [(record.age, record.country) for record in records] == [(i, "US") for i in range(100)]
+            reader.record_type = "dict"
+            reader.seek_record(0)
+            assert next(reader.records()) == {"age": 0, "country": "US"}
+
+    def test_codecs(self, tmpdir):
+        from quickavro.compression import supported_codecs
+
+        for codec in supported_codecs():
+            for level in (None, 1):
+                avro_file = write_people(tmpdir, "{0}-{1}.avro".format(codec, level), codec=codec, level=level)
+                with quickavro.FileReader(avro_file) as reader:
+                    assert reader.codec == codec
+                    assert list(reader.records()) == people
+                    assert reader.stats(exact=True)["uncompressed_size"] == sum(len(reader.write(r)) for r in people)
+        with pytest.raises(quickavro.CodecNotSupported):
+            quickavro.FileWriter(os.path.join(str(tmpdir), "lz4.avro"), codec="lz4")
+        with pytest.raises(ValueError):
+            quickavro.BinaryEncoder(codec="deflate", level=10)
+
+    def test_prefetch(self, tmpdir):
+        avro_file = write_people(tmpdir, "testfile12.avro", codec="deflate")
+        for decompress in (True, False):
+            with quickavro.FileReader(avro_file, prefetch_blocks=2, prefetch_bytes=1024,
+                                      prefetch_decompress=decompress) as reader:
+                assert list(reader.records()) == people
+        with quickavro.FileReader(avro_file, prefetch_blocks=4) as reader:
+            records = reader.records()
+            assert [next(records) for i in range(10)] == people[:10]
+            # Blocks read ahead are given back to scans and seeks.
+            assert reader.count() == len(people)
+            assert list(records) == people[10:]
+            reader.seek_record(4321)
+            assert list(reader.records()) == people[4321:]
+        with open(avro_file, 'rb') as f:
+            data = f.read()
+        gzip_file = os.path.join(str(tmpdir), "testfile12.avro.gz")
+        with gzip.open(gzip_file, 'wb') as f:
+            f.write(data)
+        with quickavro.FileReader(gzip.open(gzip_file, 'rb'), prefetch_blocks=2) as reader:
+            assert list(reader.records()) == people
+
+        # Closing does not wait on a read stalled in the readahead thread.
+        # The file is closed by the thread once the read returns.
+        import time
+        from quickavro.flush import CountPolicy
+        avro_file = write_people(tmpdir, "testfile12.avro", people[:1000], flush_policy=CountPolicy(100))
+        with open(avro_file, 'rb') as f:
+            data = f.read()
+        r, w = os.pipe()
+        os.write(w, data)
+        f = os.fdopen(r, 'rb')
+        reader = quickavro.FileReader(f, buffer_size=len(data), prefetch_blocks=2)
+        records = reader.records()
+        # Once the last block is queued the thread waits for more data
+        assert [next(records) for i in range(950)] == people[:950]
+        prefetcher = reader._prefetcher
+        start = time.time()
+        reader.close()
+        assert time.time() - start < 2 * quickavro.constants.PREFETCH_CLOSE_TIMEOUT
+        assert not f.closed
+        os.close(w)
+        prefetcher.thread.join(10)
+        assert f.closed
+
+    def test_aio(self, tmpdir):
+        aio = pytest.importorskip("quickavro.aio")
+        import asyncio
+
+        avro_file = os.path.join(str(tmpdir), "testfile13.avro")
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        writer = aio.AsyncFileWriter(avro_file, codec="deflate", offload=True)
+        writer.schema = schema
+        for record in people[:10]:
+            loop.run_until_complete(writer.write_record(record))
+        loop.run_until_complete(writer.write_records(people[10:]))
+        loop.run_until_complete(writer.close())
+        for offload in (False, True):
+            stream = asyncio.StreamReader()
+            with open(avro_file, 'rb') as f:
+                stream.feed_data(f.read())
+            stream.feed_eof()
+            reader = aio.AsyncFileReader(stream, buffer_size=1024, offload=offload)
+            assert loop.run_until_complete(reader.read_all()) == people
+            assert reader.codec == "deflate"
+        asyncio.set_event_loop(None)
+        loop.close()
+
+    def test_flush_policies(self, tmpdir):
+        from quickavro.flush import AgePolicy, BytesPolicy, CompressedSizePolicy, CountPolicy
+
+        def write(name, policy, codec="null", compress_workers=0):
+            avro_file = os.path.join(str(tmpdir), name)
+            with quickavro.FileWriter(avro_file, codec=codec, compress_workers=compress_workers,
+                                      flush_policy=policy) as writer:
+                writer.schema = schema
+                writer.write_records(people[:10])
+                for record in people[10:20]:
+                    writer.write_record(record)
+                writer.write_columns({
+                    "name": [r["name"] for r in people[20:]],
+                    "age": [r["age"] for r in people[20:]],
+                })
+            with quickavro.FileReader(avro_file) as reader:
+                return reader.stats()
+
+        assert write("count.avro", CountPolicy(100))["blocks"] == 50
+        assert write("count-workers.avro", CountPolicy(100), "deflate", 2)["blocks"] == 50
+        assert write("bytes.avro", BytesPolicy(1024 * 1024))["blocks"] == 1
+        assert write("any.avro", [CountPolicy(1000), BytesPolicy(1024 * 1024)])["blocks"] == 5
+        assert write("age.avro", AgePolicy(60 * 1000))["blocks"] == 1
+
+        policy = CompressedSizePolicy(8 * 1024)
+        stats = write("adaptive.avro", policy, "deflate")
+        assert stats["blocks"] > 1
+        assert policy.ratio < 0.5
+
+        with pytest.raises(TypeError):
+            quickavro.FileWriter(os.path.join(str(tmpdir), "invalid.avro"), flush_policy=100)